@@ -0,0 +1,29 @@
+"""
+Single-query aggregates for crop summaries.
+"""
+from django.db.models import Count, Sum
+
+from .models import Farm, CropSeason
+
+
+ACTIVE_STATUSES = ['planned', 'planted']
+
+
+def farm_totals():
+    """Number of farms and total acreage in one query"""
+    totals = Farm.objects.aggregate(
+        farms=Count('id'),
+        acres=Sum('size_acres'),
+    )
+    return {
+        'farms': totals['farms'],
+        'acres': totals['acres'] or 0,
+    }
+
+
+def season_counts():
+    """Active (planned or planted) seasons"""
+    # Status in WHERE rather than FILTER so the status index is used
+    return CropSeason.objects.filter(status__in=ACTIVE_STATUSES).aggregate(
+        active=Count('id'),
+    )
@@ -0,0 +1,17 @@
+# Generated by Django 5.0.1 on 2026-10-16 20:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crops', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='cropseason',
+            index=models.Index(fields=['status', 'expected_harvest_date'], name='crops_crops_status_ca525d_idx'),
+        ),
+    ]
@@ -57,6 +57,9 @@ class CropSeason(models.Model):
     
     class Meta:
         ordering = ['-planting_date']
+        indexes = [
+            models.Index(fields=['status', 'expected_harvest_date']),
+        ]
     
     def __str__(self):
         return f"{self.get_crop_type_display()} - {self.farm.name} ({self.planting_date.year})"
@@ -1,3 +1,44 @@
 from django.test import TestCase
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.urls import reverse
+from datetime import date, timedelta
+from decimal import Decimal
 
-# Create your tests here.
+from .models import Farm, CropSeason
+from .aggregates import farm_totals, season_counts
+
+
+class AggregateTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        farm = Farm.objects.create(name='North', size_acres=Decimal('4.5'))
+        Farm.objects.create(name='South', size_acres=Decimal('2'))
+        today = date.today()
+        for status in ['planned', 'planted', 'harvested']:
+            CropSeason.objects.create(
+                farm=farm, crop_type='maize', planting_date=today,
+                expected_harvest_date=today + timedelta(days=90),
+                area_planted_acres=1, status=status,
+            )
+
+    def test_farm_totals(self):
+        with self.assertNumQueries(1):
+            totals = farm_totals()
+        self.assertEqual(totals, {'farms': 2, 'acres': Decimal('6.5')})
+
+    def test_season_counts(self):
+        self.assertEqual(season_counts()['active'], 2)
+
+
+class CropsHomeTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        user = get_user_model().objects.create_user('farmer', password='pass')
+        self.client.force_login(user)
+
+    def test_query_count(self):
+        # session + user, farm and season aggregates, harvest lists
+        with self.assertNumQueries(6):
+            response = self.client.get(reverse('crops:home'))
+        self.assertEqual(response.status_code, 200)
@@ -1,10 +1,11 @@
+from django.conf import settings
 from django.urls import path
 from . import views
 
 app_name = 'crops'
 
 urlpatterns = [
-    path('', views.crops_home, name='home'),
+    path('', views.crops_home_async if settings.ASYNC_HOME_VIEWS else views.crops_home, name='home'),
     
     path('farms/', views.farm_list, name='farm_list'),
     path('farms/add/', views.farm_add, name='farm_add'),
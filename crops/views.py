@@ -2,39 +2,62 @@ from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.db.models import Sum
+from django.utils import timezone
+from asgiref.sync import sync_to_async
 from datetime import date, timedelta
 from .models import Farm, CropSeason, CropInput, CropSale
+from .aggregates import ACTIVE_STATUSES, farm_totals, season_counts
+from dashboard.cache import cache_home_page
+from dashboard.concurrency import agather_sections, async_login_required, gather_sections
+
+
+def summary_section(today):
+    """Farm acreage and active season counts"""
+    farms = farm_totals()
+    return {
+        'total_farms': farms['farms'],
+        'total_acres': farms['acres'],
+        'active_seasons': season_counts()['active'],
+    }
 
 
-@login_required
-def crops_home(request):
-    """Crops management overview"""
-    farms = Farm.objects.all()
+def harvest_section(today):
+    """Harvests due in the next 14 days and those made in the last 30"""
+    harvest_due = CropSeason.objects.filter(
+        status__in=ACTIVE_STATUSES,
+        expected_harvest_date__lte=today + timedelta(days=14)
+    ).select_related('farm')
     
-    # Active seasons
-    active_seasons = CropSeason.objects.filter(status__in=['planned', 'planted'])
-    
-    # Harvest due soon (next 14 days)
-    harvest_due = active_seasons.filter(
-        expected_harvest_date__lte=date.today() + timedelta(days=14)
-    )
-    
-    # Recent harvests (last 30 days)
     recent_harvests = CropSeason.objects.filter(
         status='harvested',
-        actual_harvest_date__gte=date.today() - timedelta(days=30)
+        actual_harvest_date__gte=today - timedelta(days=30)
     )
     
-    context = {
-        'total_farms': farms.count(),
-        'total_acres': farms.aggregate(Sum('size_acres'))['size_acres__sum'] or 0,
-        'active_seasons': active_seasons.count(),
-        'harvest_due': harvest_due,
-        'recent_harvests': recent_harvests,
+    return {
+        'harvest_due': list(harvest_due),
+        'recent_harvests': list(recent_harvests),
     }
+
+
+HOME_SECTIONS = [summary_section, harvest_section]
+
+
+@login_required
+@cache_home_page('crops')
+def crops_home(request):
+    """Crops management overview"""
+    context = gather_sections(HOME_SECTIONS, timezone.localdate())
     return render(request, 'crops/home.html', context)
 
 
+@async_login_required
+@cache_home_page('crops')
+async def crops_home_async(request):
+    """Crops overview for ASGI - sections run concurrently"""
+    context = await agather_sections(HOME_SECTIONS, timezone.localdate())
+    return await sync_to_async(render)(request, 'crops/home.html', context)
+
+
 @login_required
 def farm_list(request):
     """List all farms"""
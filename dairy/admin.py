@@ -1,5 +1,7 @@
 from django.contrib import admin
-from .models import Animal, MilkProduction, HealthRecord, Pregnancy, FeedRecord
+from .models import (
+    Animal, MilkProduction, HealthRecord, HealthCampaign, HealthProtocol, HealthEvent, Pregnancy, FeedRecord, MilkAlert,
+)
 
 
 @admin.register(Animal)
@@ -26,6 +28,30 @@ class HealthRecordAdmin(admin.ModelAdmin):
     date_hierarchy = 'date'
 
 
+@admin.register(HealthCampaign)
+class HealthCampaignAdmin(admin.ModelAdmin):
+    list_display = ['date', 'record_type', 'description', 'animal_count', 'total_cost']
+    list_filter = ['record_type', 'date']
+    search_fields = ['description', 'veterinarian']
+    date_hierarchy = 'date'
+
+
+@admin.register(HealthProtocol)
+class HealthProtocolAdmin(admin.ModelAdmin):
+    list_display = ['name', 'animal_type', 'record_type', 'keyword', 'interval_months', 'min_age_months', 'active']
+    list_filter = ['animal_type', 'record_type', 'active']
+    search_fields = ['name', 'keyword']
+
+
+@admin.register(HealthEvent)
+class HealthEventAdmin(admin.ModelAdmin):
+    list_display = ['animal', 'title', 'due_date', 'status', 'protocol']
+    list_filter = ['status', 'record_type', 'protocol']
+    search_fields = ['animal__tag_number', 'title']
+    date_hierarchy = 'due_date'
+    raw_id_fields = ['animal', 'source', 'completed_by']
+
+
 @admin.register(Pregnancy)
 class PregnancyAdmin(admin.ModelAdmin):
     list_display = ['animal', 'breeding_date', 'expected_delivery', 'status', 'offspring_count']
@@ -39,4 +65,12 @@ class FeedRecordAdmin(admin.ModelAdmin):
     list_display = ['date', 'feed_type', 'quantity_kg', 'cost', 'supplier']
     list_filter = ['feed_type', 'date']
     search_fields = ['feed_type', 'supplier']
-    date_hierarchy = 'date'
\ No newline at end of file
+    date_hierarchy = 'date'
+
+@admin.register(MilkAlert)
+class MilkAlertAdmin(admin.ModelAdmin):
+    list_display = ['animal', 'date', 'liters', 'baseline', 'z_score', 'resolved']
+    list_filter = ['resolved', 'date']
+    list_editable = ['resolved']
+    search_fields = ['animal__tag_number']
+    date_hierarchy = 'date'
@@ -0,0 +1,34 @@
+"""
+Single-query aggregates for dairy summaries.
+
+Each helper collapses a group of related counts/sums into one
+conditional-aggregate query so the home pages don't fan out into a
+query per figure.
+"""
+from django.db.models import Count, F, Q, Sum
+from datetime import timedelta
+
+from .models import Animal, MilkProduction
+
+
+def herd_counts():
+    """Active cows, sheep and total animals in one query"""
+    return Animal.objects.filter(status='active').aggregate(
+        cows=Count('id', filter=Q(animal_type='cow')),
+        sheep=Count('id', filter=Q(animal_type='sheep')),
+        total=Count('id'),
+    )
+
+
+def milk_totals(today, days=7):
+    """Liters produced today and over the last `days` days in one query"""
+    since = today - timedelta(days=days)
+    liters = F('morning_liters') + F('evening_liters')
+    totals = MilkProduction.objects.filter(date__gte=since).aggregate(
+        today=Sum(liters, filter=Q(date=today)),
+        recent=Sum(liters),
+    )
+    return {
+        'today': totals['today'] or 0,
+        'recent': totals['recent'] or 0,
+    }
@@ -0,0 +1,139 @@
+"""
+Flag days when a cow gives much less milk than usual.
+
+Each record is compared with the median of the same cow's previous
+WINDOW records. The spread is the median absolute deviation (scaled to
+match a standard deviation), so one bad day doesn't hide the next. A
+record is flagged when its robust z-score is Z_THRESHOLD or lower and it
+is at least MIN_DROP below the baseline.
+
+The whole herd is scored in one pass over columnar arrays: records are
+sorted by cow and date, and the window before record i is the slice
+i-WINDOW..i-1, valid when it belongs to the same cow. Runs are
+incremental: each scan starts a few days before the previous run's
+`through` date (milk is often entered late) and reads only enough
+history for the baselines.
+"""
+from datetime import date, timedelta
+
+import numpy as np
+from django.db import transaction as db_transaction
+from django.utils import timezone
+from numpy.lib.stride_tricks import sliding_window_view
+
+from dashboard.cache import bump_version
+from .models import MilkAlert, MilkAnomalyScan, MilkProduction
+
+
+WINDOW = 14
+
+# A baseline spread over more days than this is stale (e.g. a dry period)
+MAX_WINDOW_DAYS = 45
+
+# History read before the first day scored on an incremental run
+HISTORY_DAYS = 90
+
+# Days before the last run's end that are scored again
+RESCAN_DAYS = 3
+
+Z_THRESHOLD = -3.0
+
+MIN_DROP = 0.15
+
+# Floor for the spread so a perfectly steady cow isn't flagged for 0.1L
+MIN_SPREAD_LITERS = 0.5
+
+# Records scored per block, to bound the window copy's memory
+BLOCK_SIZE = 100000
+
+
+def _columns(start, end):
+    rows = MilkProduction.objects.filter(date__lte=end)
+    if start:
+        rows = rows.filter(date__gte=start)
+    rows = list(
+        rows.order_by('animal_id', 'date')
+        .values_list('animal_id', 'date', 'morning_liters', 'evening_liters')
+    )
+    if not rows:
+        return None
+    ids, days, morning, evening = zip(*rows)
+    return (
+        np.fromiter(ids, dtype=np.int64, count=len(rows)),
+        np.fromiter((d.toordinal() for d in days), dtype=np.int64, count=len(rows)),
+        np.fromiter(morning, dtype=np.float64, count=len(rows))
+        + np.fromiter(evening, dtype=np.float64, count=len(rows)),
+    )
+
+
+def score(ids, days, liters, first_day):
+    """
+    (record positions, baselines, z-scores) for records on or after
+    `first_day` (an ordinal) that have a full, recent baseline window.
+    """
+    if len(ids) <= WINDOW:
+        empty = np.array([], dtype=np.float64)
+        return np.array([], dtype=np.int64), empty, empty
+    positions = np.arange(WINDOW, len(ids))
+    before = positions - WINDOW
+    scored = (
+        (ids[before] == ids[positions])
+        & (days[positions] - days[before] <= MAX_WINDOW_DAYS)
+        & (days[positions] >= first_day)
+    )
+    positions = positions[scored]
+
+    windows = sliding_window_view(liters, WINDOW)
+    baselines = np.empty(len(positions))
+    spreads = np.empty(len(positions))
+    for offset in range(0, len(positions), BLOCK_SIZE):
+        block = slice(offset, offset + BLOCK_SIZE)
+        window = windows[positions[block] - WINDOW]
+        median = np.median(window, axis=1)
+        baselines[block] = median
+        spreads[block] = 1.4826 * np.median(np.abs(window - median[:, None]), axis=1)
+    spreads = np.maximum(spreads, np.maximum(0.05 * baselines, MIN_SPREAD_LITERS))
+    return positions, baselines, (liters[positions] - baselines) / spreads
+
+
+def scan(through=None, full=False):
+    """
+    Score records up to `through` (default today) and store alerts.
+
+    Continues from the last scan unless `full`. Unresolved alerts in the
+    re-scored days are replaced; resolved ones are kept. Returns the
+    MilkAnomalyScan row.
+    """
+    through = through or timezone.localdate()
+    last = None if full else MilkAnomalyScan.objects.first()
+    first_day = last.through - timedelta(days=RESCAN_DAYS - 1) if last else None
+
+    columns = _columns(first_day - timedelta(days=HISTORY_DAYS) if first_day else None, through)
+    alerts = []
+    positions = []
+    if columns:
+        ids, days, liters = columns
+        positions, baselines, z = score(ids, days, liters, first_day.toordinal() if first_day else 0)
+        flagged = (z <= Z_THRESHOLD) & (liters[positions] <= baselines * (1 - MIN_DROP))
+        alerts = [
+            MilkAlert(
+                animal_id=int(ids[p]),
+                date=date.fromordinal(int(days[p])),
+                liters=round(float(liters[p]), 2),
+                baseline=round(float(b), 2),
+                z_score=round(max(float(s), -9999), 2),
+            )
+            for p, b, s in zip(positions[flagged], baselines[flagged], z[flagged])
+        ]
+
+    with db_transaction.atomic():
+        stale = MilkAlert.objects.filter(resolved=False, date__lte=through)
+        if first_day:
+            stale = stale.filter(date__gte=first_day)
+        stale.delete()
+        MilkAlert.objects.bulk_create(alerts, batch_size=1000, ignore_conflicts=True)
+        run = MilkAnomalyScan.objects.create(through=through, records=len(positions), flagged=len(alerts))
+
+    bump_version('dairy')
+    bump_version('dashboard')
+    return run
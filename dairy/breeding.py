@@ -0,0 +1,126 @@
+"""
+Breeding calendar: heats, pregnancy checks, dry-off and calvings.
+
+Everything is worked out from one query over Pregnancy joined to Animal
+(active females only):
+
+- heat: for a female not carrying, every HEAT_CYCLE_DAYS from her last
+  failed breeding, or from POSTPARTUM_DAYS after her last calving
+- return: HEAT_CYCLE_DAYS after a breeding not yet confirmed, when she
+  would come back into heat if it didn't take
+- dry_off: DRY_OFF_DAYS before a cow's expected calving
+- delivery: expected calving or lambing
+
+Females with no breeding or calving on record have nothing to predict
+from and are left off. A month's events are cached until a pregnancy or
+animal changes.
+"""
+import calendar
+from collections import defaultdict
+from datetime import date, timedelta
+
+from django.core.cache import cache
+
+from dashboard.cache import app_versions
+from .models import Animal, Pregnancy
+
+
+# Version label bumped by dairy.signals when pregnancies or animals change
+CACHE_LABEL = 'breeding'
+
+# Days after giving birth before heats are expected again
+POSTPARTUM_DAYS = {'cow': 45, 'sheep': 35}
+
+# Days before calving that a cow stops being milked
+DRY_OFF_DAYS = 60
+
+EVENT_TYPES = (
+    ('heat', 'Heat expected'),
+    ('return', 'Check for return to heat'),
+    ('dry_off', 'Dry off'),
+    ('delivery', 'Delivery due'),
+)
+
+CACHE_TIMEOUT = 60 * 60 * 24
+
+
+def _latest_pregnancies():
+    """Each active female's latest pregnancy, with the animal loaded"""
+    pregnancies = (
+        Pregnancy.objects.filter(animal__status='active', animal__gender='female')
+        .select_related('animal')
+        .order_by('animal_id', 'breeding_date', 'pk')
+    )
+    latest = {}
+    for pregnancy in pregnancies:
+        latest[pregnancy.animal_id] = pregnancy
+    return latest.values()
+
+
+def heat_anchor(pregnancy):
+    """Day heats restart from after `pregnancy`, or None while carrying"""
+    animal_type = pregnancy.animal.animal_type
+    if pregnancy.status == 'failed':
+        return pregnancy.breeding_date
+    if pregnancy.status == 'delivered':
+        calved = pregnancy.actual_delivery or pregnancy.expected_delivery
+        if calved:
+            return calved + timedelta(days=POSTPARTUM_DAYS.get(animal_type, 0))
+    return None
+
+
+def next_heat(pregnancy, today):
+    """First predicted heat on or after `today` following `pregnancy`"""
+    anchor = heat_anchor(pregnancy)
+    cycle = Animal.HEAT_CYCLE_DAYS.get(pregnancy.animal.animal_type)
+    if anchor is None or not cycle:
+        return None
+    skip = max(0, -(-(today - anchor).days // cycle))
+    return anchor + timedelta(days=skip * cycle)
+
+
+def events_between(start, end, pregnancies=None):
+    """[(day, event type, pregnancy)] from `start` to `end` inclusive, by day"""
+    if pregnancies is None:
+        pregnancies = _latest_pregnancies()
+    events = []
+    for pregnancy in pregnancies:
+        animal_type = pregnancy.animal.animal_type
+        cycle = Animal.HEAT_CYCLE_DAYS.get(animal_type)
+        if pregnancy.status in Pregnancy.ONGOING:
+            if pregnancy.status == 'bred' and cycle:
+                events.append((pregnancy.breeding_date + timedelta(days=cycle), 'return', pregnancy))
+            due = pregnancy.expected_delivery
+            if due:
+                events.append((due, 'delivery', pregnancy))
+                if animal_type == 'cow':
+                    events.append((due - timedelta(days=DRY_OFF_DAYS), 'dry_off', pregnancy))
+            continue
+        day = next_heat(pregnancy, start)
+        while day and day <= end:
+            events.append((day, 'heat', pregnancy))
+            day += timedelta(days=cycle)
+    events = [event for event in events if start <= event[0] <= end]
+    events.sort(key=lambda event: (event[0], event[1], event[2].animal.tag_number))
+    return events
+
+
+def month_events(year, month):
+    """
+    {day: [(event type, animal id, tag number, name)]} for one month.
+
+    Cached per month until a pregnancy or animal changes.
+    """
+    version = app_versions([CACHE_LABEL])[0]
+    key = f'breeding:{year}-{month:02}:{version}'
+    days = cache.get(key)
+    if days is None:
+        start = date(year, month, 1)
+        end = start.replace(day=calendar.monthrange(year, month)[1])
+        days = defaultdict(list)
+        for day, event_type, pregnancy in events_between(start, end):
+            animal = pregnancy.animal
+            days[day].append((event_type, animal.pk, animal.tag_number, animal.name))
+        days = dict(days)
+        cache.set(key, days, CACHE_TIMEOUT)
+    return days
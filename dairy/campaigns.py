@@ -0,0 +1,75 @@
+"""
+Recording one treatment for many animals at once.
+
+The animals are picked with a single query, their HealthRecords are
+written with one bulk_create and the cost goes to the ledger as one
+expense for the whole HealthCampaign (finance.posting skips the cost of
+records that belong to a campaign). bulk_create skips the model signals,
+so the health calendar and home-page caches are updated here.
+"""
+from decimal import Decimal, ROUND_DOWN
+
+from django.db import transaction as db_transaction
+
+from dashboard.cache import bump_version
+from .models import HealthCampaign, HealthRecord
+from . import health
+
+
+CENT = Decimal('0.01')
+
+
+def split_cost(cost, count, split='total'):
+    """
+    Per-animal costs for `count` animals, to the cent.
+
+    'total' shares `cost` equally, the odd cents going to the first
+    animals so the shares add up exactly; 'each' charges `cost` to every
+    animal.
+    """
+    if split == 'each':
+        return [cost] * count
+    share = (cost / count).quantize(CENT, rounding=ROUND_DOWN)
+    extra = int((cost - share * count) / CENT)
+    return [share + CENT] * extra + [share] * (count - extra)
+
+
+def record_campaign(animals, record_type, description, day, cost=Decimal('0'), split='total',
+                    next_due_date=None, veterinarian='', notes=''):
+    """
+    Write a HealthRecord for each of `animals` under a new HealthCampaign.
+
+    `animals` need only pk, tag_number and animal_type loaded. Returns the
+    campaign.
+    """
+    animals = list(animals)
+    costs = split_cost(cost, len(animals), split)
+    with db_transaction.atomic():
+        campaign = HealthCampaign.objects.create(
+            record_type=record_type,
+            date=day,
+            description=description,
+            veterinarian=veterinarian,
+            total_cost=sum(costs, Decimal('0')),
+            animal_count=len(animals),
+            next_due_date=next_due_date,
+            notes=notes,
+        )
+        records = HealthRecord.objects.bulk_create([
+            HealthRecord(
+                animal=animal,
+                campaign=campaign,
+                record_type=record_type,
+                date=day,
+                description=description,
+                veterinarian=veterinarian,
+                cost=animal_cost,
+                next_due_date=next_due_date,
+                notes=notes,
+            )
+            for animal, animal_cost in zip(animals, costs)
+        ], batch_size=1000)
+        health.records_created(records)
+    bump_version('dairy')
+    bump_version('dashboard')
+    return campaign
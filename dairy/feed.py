@@ -0,0 +1,220 @@
+"""
+Feed cost per liter of milk: by day, by cow and by month.
+
+FeedRecords are not tied to animals, so each one is shared out:
+
+- over time: a record feeds the herd from its date until the next record
+  of the same feed type, for at most FEED_DAYS days, the same amount
+  each day
+- over the herd: each day's feed goes to the animals on the farm that
+  day by animal-days, or with `weighted` by FEED_WEIGHTS (a cow being
+  milked eats more than a dry cow, a sheep far less)
+
+The herd is the active animals from the day they were acquired, plus
+sold or deceased animals up to their last milk record in the range (the
+herd has no exit dates). Feed, milk and animals are read as columns
+over the date range and combined as NumPy animal x day arrays; there is
+no Python loop over records.
+
+Figures are cached per month until feed, milk or animal records change.
+A closed month no longer gains days and is kept for CLOSED_MONTH_TIMEOUT;
+the current month only until midnight.
+"""
+import calendar
+from datetime import date, timedelta
+
+import numpy as np
+from django.core.cache import cache
+from django.utils import timezone
+
+from dashboard.cache import app_versions, seconds_until_midnight
+from .models import Animal, FeedRecord, MilkProduction
+
+
+# Version label bumped by dairy.signals when feed, milk or animals change
+CACHE_LABEL = 'feed_costs'
+
+# Longest a feed record is assumed to last
+FEED_DAYS = 30
+
+# Relative daily intake for weighted allocation, roughly dry matter: a
+# cow in milk about 20 kg, a dry cow or young stock 12, a sheep 2
+FEED_WEIGHTS = {'cow': 0.6, 'sheep': 0.1}
+MILKING_WEIGHT = 1.0
+
+CLOSED_MONTH_TIMEOUT = 60 * 60 * 24 * 30
+
+
+def _ordinals(dates):
+    return np.fromiter((d.toordinal() for d in dates), dtype=np.int64, count=len(dates))
+
+
+def _decimals(values):
+    return np.fromiter(values, dtype=np.float64, count=len(values))
+
+
+def _milk(start, end):
+    """(animal ids, day ordinals, daily liters) recorded from `start` to `end`"""
+    rows = list(
+        MilkProduction.objects.filter(date__range=(start, end))
+        .values_list('animal_id', 'date', 'morning_liters', 'evening_liters')
+    )
+    if not rows:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64), np.zeros(0)
+    ids, days, morning, evening = zip(*rows)
+    return np.array(ids, dtype=np.int64), _ordinals(days), _decimals(morning) + _decimals(evening)
+
+
+def _herd(milked_ids):
+    """[(id, tag number, name, animal type, date acquired, status)] by id"""
+    fields = ('pk', 'tag_number', 'name', 'animal_type', 'date_acquired', 'status')
+    rows = list(Animal.objects.filter(status='active').values_list(*fields))
+    missing = set(milked_ids) - {row[0] for row in rows}
+    if missing:
+        # Sold or deceased since, but milked in the range
+        rows += Animal.objects.filter(pk__in=missing).values_list(*fields)
+    rows.sort()
+    return rows
+
+
+def _daily_feed(start, end):
+    """(cost, kg) arrays of feed eaten on each day from `start` to `end`"""
+    first, count = start.toordinal(), (end - start).days + 1
+    # Earlier records have run out by `start`; later ones can cut a span short
+    rows = list(
+        FeedRecord.objects.filter(
+            date__range=(start - timedelta(days=FEED_DAYS - 1), end + timedelta(days=FEED_DAYS - 1))
+        ).values_list('feed_type', 'date', 'cost', 'quantity_kg')
+    )
+    if not rows:
+        return np.zeros(count), np.zeros(count)
+    feed_types, dates, costs, kgs = zip(*rows)
+    _, kind = np.unique([t.strip().lower() for t in feed_types], return_inverse=True)
+    days = _ordinals(dates)
+    order = np.lexsort((days, kind))
+    kind, days = kind[order], days[order]
+    costs, kgs = _decimals(costs)[order], _decimals(kgs)[order]
+
+    # Each record lasts until the next later record of its feed type
+    keys = kind * (days.max() + 1) + days
+    following = np.searchsorted(keys, keys, side='right')
+    has_next = following < len(keys)
+    following = np.where(has_next, following, 0)
+    has_next &= kind[following] == kind
+    stop = np.where(has_next, np.minimum(days[following], days + FEED_DAYS), days + FEED_DAYS)
+    lasts = stop - days
+
+    # Spread evenly over the span with a difference array per day
+    begin = np.clip(days - first, 0, count)
+    stop = np.clip(stop - first, 0, count)
+    spans = []
+    for amounts in (costs, kgs):
+        diff = np.zeros(count + 1)
+        np.add.at(diff, begin, amounts / lasts)
+        np.add.at(diff, stop, -amounts / lasts)
+        spans.append(np.cumsum(diff)[:count])
+    return spans[0], spans[1]
+
+
+def _money(value):
+    return round(float(value), 2)
+
+
+def _per_liter(cost, liters):
+    return round(float(cost / liters), 2) if liters > 0 else None
+
+
+def allocate(start, end, weighted=False):
+    """
+    Feed cost and milk from `start` to `end` inclusive.
+
+    Returns the totals with cost_per_liter (None without milk), the feed
+    no animal was on the farm to eat as unallocated, and lists of days
+    and of animals that gave milk, each with their own cost_per_liter.
+    """
+    first, count = start.toordinal(), (end - start).days + 1
+    milk_ids, milk_days, liters = _milk(start, end)
+    herd = _herd(np.unique(milk_ids).tolist())
+    ids = np.array([row[0] for row in herd], dtype=np.int64)
+    columns = np.arange(count)
+
+    milk = np.zeros((len(herd), count))
+    rows = np.searchsorted(ids, milk_ids)
+    np.add.at(milk, (rows, milk_days - first), liters)
+    milked = milk > 0
+
+    # Active animals stay to the end; others leave after their last milking
+    joined = _ordinals([row[4] for row in herd]) - first
+    active = np.array([row[5] == 'active' for row in herd], dtype=bool)
+    last_milked = np.full(len(herd), -1)
+    np.maximum.at(last_milked, rows, milk_days - first)
+    leaves = np.where(active, count - 1, last_milked)
+    present = ((columns >= joined[:, None]) & (columns <= leaves[:, None])) | milked
+
+    if weighted:
+        types = [row[3] for row in herd]
+        base = np.array([FEED_WEIGHTS.get(t, 1.0) for t in types])
+        cows = np.array([t == 'cow' for t in types], dtype=bool)
+        weights = np.where(milked & cows[:, None], MILKING_WEIGHT, base[:, None]) * present
+    else:
+        weights = present.astype(np.float64)
+
+    feed_cost, feed_kg = _daily_feed(start, end)
+    eaters = weights.sum(axis=0)
+    share = np.divide(feed_cost, eaters, out=np.zeros(count), where=eaters > 0)
+    animal_cost = (weights * share).sum(axis=1)
+    animal_liters = milk.sum(axis=1)
+    day_liters = milk.sum(axis=0)
+
+    days = [
+        {
+            'date': date.fromordinal(first + i),
+            'feed_cost': _money(feed_cost[i]),
+            'feed_kg': round(float(feed_kg[i]), 1),
+            'liters': _money(day_liters[i]),
+            'animals': int(present[:, i].sum()),
+            'cost_per_liter': _per_liter(feed_cost[i], day_liters[i]),
+        }
+        for i in range(count)
+    ]
+    animals = [
+        {
+            'animal_id': herd[i][0],
+            'tag_number': herd[i][1],
+            'name': herd[i][2],
+            'feed_cost': _money(animal_cost[i]),
+            'liters': _money(animal_liters[i]),
+            'cost_per_liter': _per_liter(animal_cost[i], animal_liters[i]),
+        }
+        for i in np.nonzero(animal_liters > 0)[0]
+    ]
+    animals.sort(key=lambda animal: animal['cost_per_liter'])
+    return {
+        'start': start,
+        'end': end,
+        'weighted': weighted,
+        'feed_cost': _money(feed_cost.sum()),
+        'feed_kg': round(float(feed_kg.sum()), 1),
+        'liters': _money(day_liters.sum()),
+        'cost_per_liter': _per_liter(feed_cost.sum(), day_liters.sum()),
+        'unallocated': _money(feed_cost[eaters == 0].sum()),
+        'days': days,
+        'animals': animals,
+    }
+
+
+def month_costs(year, month, weighted=False, today=None):
+    """allocate() for one month up to `today`, cached"""
+    today = today or timezone.localdate()
+    start = date(year, month, 1)
+    end = start.replace(day=calendar.monthrange(year, month)[1])
+    closed = end < today
+    if not closed:
+        end = today
+    version = app_versions([CACHE_LABEL])[0]
+    key = f'feed-costs:{start}:{end}:{int(weighted)}:{version}'
+    costs = cache.get(key)
+    if costs is None:
+        costs = allocate(start, end, weighted)
+        cache.set(key, costs, CLOSED_MONTH_TIMEOUT if closed else seconds_until_midnight())
+    return costs
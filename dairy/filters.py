@@ -0,0 +1,101 @@
+"""
+Validated filters for the animal list, and the herd health event form.
+"""
+import re
+from decimal import Decimal
+
+from django import forms
+
+from .models import Animal, HealthCampaign, HealthRecord
+
+
+class AnimalFilterForm(forms.Form):
+    """GET filters for animal_list; invalid fields are reported and ignored"""
+    type = forms.ChoiceField(choices=(('', 'All Animals'),) + Animal.ANIMAL_TYPES, required=False)
+    status = forms.ChoiceField(choices=(('', 'Any Status'),) + Animal.STATUS_CHOICES, required=False)
+    gender = forms.ChoiceField(choices=(('', 'Any Gender'),) + Animal.GENDER_CHOICES, required=False)
+    maturity = forms.ChoiceField(
+        choices=(('', 'Any Age'), ('mature', 'Breeding Age'), ('immature', 'Too Young')), required=False
+    )
+    min_age = forms.IntegerField(min_value=0, max_value=600, required=False, help_text="Months")
+    max_age = forms.IntegerField(min_value=0, max_value=600, required=False, help_text="Months")
+    born_after = forms.DateField(required=False)
+    born_before = forms.DateField(required=False)
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        for field in self.fields.values():
+            field.widget.attrs['class'] = 'form-control'
+
+    def clean(self):
+        cleaned = super().clean()
+        low, high = cleaned.get('min_age'), cleaned.get('max_age')
+        if low is not None and high is not None and low > high:
+            self.add_error('max_age', 'Must not be less than the minimum age.')
+        start, end = cleaned.get('born_after'), cleaned.get('born_before')
+        if start and end and start > end:
+            self.add_error('born_before', 'Must not be before the other date.')
+        return cleaned
+
+    def filter(self, queryset, today=None):
+        """Apply every valid filter to `queryset`"""
+        # cleaned_data only holds the fields that validated
+        self.is_valid()
+        data = self.cleaned_data
+        if data.get('type'):
+            queryset = queryset.filter(animal_type=data['type'])
+        if data.get('status'):
+            queryset = queryset.filter(status=data['status'])
+        if data.get('gender'):
+            queryset = queryset.filter(gender=data['gender'])
+        if data.get('maturity') == 'mature':
+            queryset = queryset.mature(today)
+        elif data.get('maturity') == 'immature':
+            queryset = queryset.immature(today)
+        if data.get('min_age') is not None or data.get('max_age') is not None:
+            queryset = queryset.age_between(data.get('min_age'), data.get('max_age'), today)
+        if data.get('born_after') or data.get('born_before'):
+            queryset = queryset.born_between(data.get('born_after'), data.get('born_before'))
+        return queryset
+
+
+class AnimalSelectionForm(AnimalFilterForm):
+    """AnimalFilterForm plus a list of tags, for picking animals to treat"""
+    tags = forms.CharField(
+        required=False, widget=forms.Textarea(attrs={'rows': 3}),
+        help_text="Tag numbers separated by commas, spaces or new lines",
+    )
+
+    def clean_tags(self):
+        return [tag for tag in re.split(r'[\s,;]+', self.cleaned_data['tags']) if tag]
+
+    def filter(self, queryset, today=None):
+        queryset = super().filter(queryset, today)
+        if self.cleaned_data.get('tags'):
+            queryset = queryset.filter(tag_number__in=self.cleaned_data['tags'])
+        return queryset
+
+
+class HealthCampaignForm(forms.Form):
+    """What was done on a herd health day and what it cost"""
+    record_type = forms.ChoiceField(choices=HealthRecord.RECORD_TYPES, initial='vaccination')
+    date = forms.DateField()
+    description = forms.CharField(widget=forms.Textarea(attrs={'rows': 2}))
+    veterinarian = forms.CharField(max_length=100, required=False)
+    cost = forms.DecimalField(min_value=0, max_digits=12, decimal_places=2, required=False)
+    cost_split = forms.ChoiceField(choices=HealthCampaign.COST_SPLITS, initial='total')
+    next_due_date = forms.DateField(required=False)
+    notes = forms.CharField(widget=forms.Textarea(attrs={'rows': 2}), required=False)
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        for field in self.fields.values():
+            field.widget.attrs['class'] = 'form-control'
+
+    def clean(self):
+        cleaned = super().clean()
+        cleaned['cost'] = cleaned.get('cost') or Decimal('0')
+        day, next_due = cleaned.get('date'), cleaned.get('next_due_date')
+        if day and next_due and next_due <= day:
+            self.add_error('next_due_date', 'Must be after the treatment date.')
+        return cleaned
@@ -0,0 +1,231 @@
+"""
+Herd health calendar.
+
+Each active HealthProtocol is expanded into HealthEvent rows for every
+active animal of its type, from the animal's last matching health record
+(or, if it has none, the later of the protocol's start date and the day
+it reaches min_age_months) out to HORIZON_MONTHS ahead. Only the first
+missed date is kept when an animal is behind; the rest of its schedule
+keeps the cadence counted from that missed date.
+
+Open events are derived data: materialize() deletes the open events in
+its scope and writes the fresh set with one bulk_create, so it is safe
+to re-run and cheap to run for one animal. Saving a matching
+HealthRecord closes the open event it fulfils and re-plans that
+animal's schedule; a record's next_due_date becomes a one-off event
+closed by the next record of the same type. Deleting a record reopens
+what it closed.
+"""
+from django.db import transaction as db_transaction
+from django.db.models import Max
+from django.utils import timezone
+from dateutil.relativedelta import relativedelta
+
+from dashboard.cache import bump_version
+from .models import Animal, HealthEvent, HealthProtocol, HealthRecord
+
+
+HORIZON_MONTHS = 12
+
+# Due-soon lists look this far ahead
+DUE_SOON_DAYS = 7
+
+
+def _last_treated(protocol, animal_ids=None):
+    """{animal id: date of the latest record matching `protocol`}"""
+    records = HealthRecord.objects.filter(
+        record_type=protocol.record_type,
+        animal__animal_type=protocol.animal_type,
+    )
+    if protocol.keyword:
+        records = records.filter(description__icontains=protocol.keyword)
+    if animal_ids is not None:
+        records = records.filter(animal_id__in=animal_ids)
+    return dict(records.values('animal_id').annotate(last=Max('date')).values_list('animal_id', 'last'))
+
+
+def due_dates(first, interval_months, today, until):
+    """`first`, then every interval after it that falls between today and `until`"""
+    dates = []
+    if first <= until:
+        dates.append(first)
+    step = 1
+    while True:
+        due = first + relativedelta(months=interval_months * step)
+        step += 1
+        if due > until:
+            return dates
+        if due >= today:
+            dates.append(due)
+
+
+def plan(protocol, animals, last_treated, today, until):
+    """Unsaved open HealthEvents for `animals` (id, date_of_birth pairs)"""
+    interval = relativedelta(months=protocol.interval_months)
+    events = []
+    for animal_id, born in animals:
+        if animal_id in last_treated:
+            first = last_treated[animal_id] + interval
+        else:
+            first = protocol.start_date
+            if born:
+                first = max(first, born + relativedelta(months=protocol.min_age_months))
+        events.extend(
+            HealthEvent(
+                animal_id=animal_id,
+                protocol=protocol,
+                record_type=protocol.record_type,
+                title=protocol.name,
+                due_date=due,
+            )
+            for due in due_dates(first, protocol.interval_months, today, until)
+        )
+    return events
+
+
+def materialize(animal_ids=None, protocols=None, today=None, horizon_months=HORIZON_MONTHS):
+    """
+    Rewrite the open protocol events for `animal_ids` under `protocols`
+    (default: all of each). Returns the number of events written.
+    """
+    today = today or timezone.localdate()
+    until = today + relativedelta(months=horizon_months)
+    if protocols is None:
+        protocols = list(HealthProtocol.objects.all())
+    if not protocols:
+        return 0
+
+    animals = Animal.objects.filter(status='active')
+    if animal_ids is not None:
+        animals = animals.filter(pk__in=animal_ids)
+    by_type = {}
+    for animal_id, animal_type, born in animals.values_list('pk', 'animal_type', 'date_of_birth'):
+        by_type.setdefault(animal_type, []).append((animal_id, born))
+
+    events = []
+    for protocol in protocols:
+        herd = by_type.get(protocol.animal_type, [])
+        if protocol.active and herd:
+            last_treated = _last_treated(protocol, animal_ids)
+            events.extend(plan(protocol, herd, last_treated, today, until))
+
+    with db_transaction.atomic():
+        stale = HealthEvent.objects.filter(status='open', protocol__in=protocols)
+        if animal_ids is not None:
+            stale = stale.filter(animal_id__in=animal_ids)
+        stale.delete()
+        HealthEvent.objects.bulk_create(events, batch_size=1000)
+    bump_version('dairy')
+    bump_version('dashboard')
+    return len(events)
+
+
+def _clean_dates(record):
+    """(date, next_due_date) of a record, normalising raw form strings"""
+    field = HealthRecord._meta.get_field
+    return field('date').to_python(record.date), field('next_due_date').to_python(record.next_due_date)
+
+
+def records_created(records, reminders=True):
+    """
+    Close what new `records` fulfil and re-plan their animals' schedules.
+
+    A protocol event counts as done by a record up to one interval
+    early; only the earliest open one is closed. One-off events of the
+    same type set by earlier records are closed too, and each record's
+    next_due_date becomes one (unless `reminders` is False or a protocol
+    matched the record). Works in a
+    fixed number of queries per protocol, so records written with
+    bulk_create can be passed all at once.
+    """
+    if not records:
+        return
+    dates = {id(record): _clean_dates(record) for record in records}
+    by_animal = {record.animal_id: record for record in records}
+    protocols = HealthProtocol.objects.filter(
+        active=True,
+        animal_type__in={record.animal.animal_type for record in records},
+        record_type__in={record.record_type for record in records},
+    )
+    matched = {}
+    for protocol in protocols:
+        matching = {r.animal_id: r for r in records if protocol.matches(r)}
+        if matching:
+            matched[protocol] = matching
+
+    closed = []
+    with db_transaction.atomic():
+        for protocol, matching in matched.items():
+            interval = relativedelta(months=protocol.interval_months)
+            latest = max(dates[id(r)][0] for r in matching.values())
+            candidates = HealthEvent.objects.filter(
+                protocol=protocol, status='open', animal_id__in=matching, due_date__lt=latest + interval,
+            ).order_by('animal_id', 'due_date')
+            seen = set()
+            for event in candidates:
+                record = matching[event.animal_id]
+                if event.animal_id in seen or event.due_date >= dates[id(record)][0] + interval:
+                    continue
+                seen.add(event.animal_id)
+                event.status, event.completed_by = 'done', record
+                closed.append(event)
+
+        superseded = (
+            HealthEvent.objects.filter(
+                protocol__isnull=True, status='open', animal_id__in=by_animal,
+                record_type__in={record.record_type for record in records},
+            )
+            .exclude(source__in=[record.pk for record in records])
+            .select_related('source')
+        )
+        for event in superseded:
+            record = by_animal[event.animal_id]
+            if event.record_type == record.record_type and event.source.date <= dates[id(record)][0]:
+                event.status, event.completed_by = 'done', record
+                closed.append(event)
+        HealthEvent.objects.bulk_update(closed, ['status', 'completed_by'], batch_size=1000)
+
+        if reminders:
+            HealthEvent.objects.bulk_create([
+                HealthEvent(
+                    animal_id=record.animal_id,
+                    record_type=record.record_type,
+                    title=record.description[:100],
+                    due_date=dates[id(record)][1],
+                    source=record,
+                )
+                for record in records
+                # A protocol already plans the next treatment
+                if dates[id(record)][1] and not any(record.animal_id in m for m in matched.values())
+            ], batch_size=1000)
+
+    if matched:
+        materialize(list(by_animal), list(matched))
+
+
+def record_saved(record):
+    """records_created() for one record that may be an edit"""
+    own = HealthEvent.objects.filter(source=record)
+    # A reminder already closed by a later record stays closed
+    superseded = own.filter(status='done').exists()
+    own.filter(status='open').delete()
+    records_created([record], reminders=not superseded)
+
+
+def record_deleted(record):
+    """Reopen what a deleted record had closed and re-plan its animal"""
+    # completed_by is already nulled (SET_NULL) by the time post_delete runs
+    HealthEvent.objects.filter(
+        animal_id=record.animal_id, status='done', completed_by__isnull=True,
+    ).update(status='open')
+    materialize([record.animal_id])
+
+
+def due_soon(today=None, days=DUE_SOON_DAYS):
+    """Open events due within `days`, including overdue ones"""
+    today = today or timezone.localdate()
+    return (
+        HealthEvent.objects.filter(status='open', due_date__lte=today + relativedelta(days=days))
+        .select_related('animal')
+        .order_by('due_date')
+    )
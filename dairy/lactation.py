@@ -0,0 +1,225 @@
+"""
+Lactation curve metrics for every milking cow at once.
+
+Milk history and calving dates are read as columns with values_list and
+processed as NumPy arrays for the whole herd: no per-cow queries and no
+Python loop over records. A cow's current lactation starts at her latest
+calving (Pregnancy.actual_delivery) or, when calvings were not recorded,
+after the last gap of DRY_GAP_DAYS or more in her milk records.
+
+For each cow in milk:
+
+- days_in_milk: days since the lactation started
+- peak_yield / peak_day: highest daily yield and its day in milk
+- persistency: average of the last 30 recorded days as % of peak
+- projected_305: recorded milk plus Wood's curve (y = a t^b e^-ct),
+  fitted per cow by least squares on log yield, for the rest of 305 days
+- percentile: share of the herd with a projected_305 no higher
+
+Results are cached per cow until milk or calving records change (or the
+day rolls over, since days in milk move with it).
+"""
+from datetime import date
+
+import numpy as np
+from django.core.cache import cache
+from django.utils import timezone
+
+from dashboard.cache import app_versions, seconds_until_midnight
+from .models import MilkProduction, Pregnancy
+from .milk import milking_cows
+
+
+# Version label bumped by dairy.signals when milk or calvings change
+CACHE_LABEL = 'lactation'
+
+DRY_GAP_DAYS = 60
+
+LACTATION_DAYS = 305
+
+RECENT_DAYS = 30
+
+# Fewer recorded days than this and the curve is not fitted
+MIN_FIT_DAYS = 5
+
+
+def _columns():
+    """(animal ids, day ordinals, daily liters) for milking cows, by cow then date"""
+    rows = (
+        MilkProduction.objects.filter(animal__in=milking_cows())
+        .order_by('animal_id', 'date')
+        .values_list('animal_id', 'date', 'morning_liters', 'evening_liters')
+    )
+    rows = list(rows)
+    if not rows:
+        return None
+    ids, days, morning, evening = zip(*rows)
+    ids = np.fromiter(ids, dtype=np.int64, count=len(rows))
+    days = np.fromiter((d.toordinal() for d in days), dtype=np.int64, count=len(rows))
+    liters = (
+        np.fromiter(morning, dtype=np.float64, count=len(rows))
+        + np.fromiter(evening, dtype=np.float64, count=len(rows))
+    )
+    return ids, days, liters
+
+
+def _calvings():
+    """(animal ids, day ordinals) of recorded calvings, sorted"""
+    rows = list(
+        Pregnancy.objects.filter(actual_delivery__isnull=False)
+        .order_by('animal_id', 'actual_delivery')
+        .values_list('animal_id', 'actual_delivery')
+    )
+    ids = np.array([r[0] for r in rows], dtype=np.int64)
+    days = np.array([r[1].toordinal() for r in rows], dtype=np.int64)
+    return ids, days
+
+
+def _lactation_starts(ids, days, calving_ids, calving_days):
+    """Start day of the lactation each record belongs to"""
+    # Records after a dry gap (or a cow's first record) open a lactation
+    first = np.ones(len(ids), dtype=bool)
+    first[1:] = ids[1:] != ids[:-1]
+    dry = np.zeros(len(ids), dtype=bool)
+    dry[1:] = ~first[1:] & (days[1:] - days[:-1] >= DRY_GAP_DAYS)
+    opened_at = np.maximum.accumulate(np.where(first | dry, np.arange(len(ids)), 0))
+    starts = days[opened_at]
+
+    if len(calving_ids):
+        # Latest calving on or before each record, matched on (cow, day)
+        span = days.max() + 1
+        calving_keys = calving_ids * span + calving_days
+        positions = np.searchsorted(calving_keys, ids * span + days, side='right') - 1
+        found = positions >= 0
+        positions = np.where(found, positions, 0)
+        calved = calving_days[positions]
+        # The calving wins unless a dry gap well after it started a later lactation
+        later_gap = dry[opened_at] & (starts > calved + DRY_GAP_DAYS)
+        use_calving = found & (calving_ids[positions] == ids) & ~later_gap
+        starts = np.where(use_calving, calved, starts)
+    return starts
+
+
+def _wood_fit(cow, dim, liters, count):
+    """
+    Per-cow (ln a, b, c) for ln y = ln a + b ln t - c t, or NaN rows.
+
+    The 3x3 normal equations of every cow are summed with bincount and
+    solved together.
+    """
+    positive = liters > 0
+    cow, t, z = cow[positive], np.maximum(dim[positive], 1).astype(np.float64), np.log(liters[positive])
+    columns = [np.ones_like(t), np.log(t), -t]
+
+    xtx = np.empty((count, 3, 3))
+    xtz = np.empty((count, 3))
+    for i in range(3):
+        xtz[:, i] = np.bincount(cow, columns[i] * z, minlength=count)
+        for j in range(i, 3):
+            xtx[:, i, j] = xtx[:, j, i] = np.bincount(cow, columns[i] * columns[j], minlength=count)
+
+    coefficients = np.full((count, 3), np.nan)
+    enough = xtx[:, 0, 0] >= MIN_FIT_DAYS
+    solvable = enough & (np.abs(np.linalg.det(xtx)) > 1e-9)
+    if solvable.any():
+        coefficients[solvable] = np.linalg.solve(xtx[solvable], xtz[solvable][..., None])[..., 0]
+    return coefficients
+
+
+def compute(today=None):
+    """Metrics for every milking cow with records, keyed by animal id"""
+    today = today or timezone.localdate()
+    columns = _columns()
+    if columns is None:
+        return {}
+    ids, days, liters = columns
+    starts = _lactation_starts(ids, days, *_calvings())
+
+    # Keep each cow's current (latest) lactation only
+    animals, cow = np.unique(ids, return_inverse=True)
+    count = len(animals)
+    last_index = np.r_[np.nonzero(np.diff(cow))[0], len(cow) - 1]
+    current_start = starts[last_index]
+    current = starts == current_start[cow]
+    cow, days, liters = cow[current], days[current], liters[current]
+    dim = days - current_start[cow]
+
+    peak = np.zeros(count)
+    np.maximum.at(peak, cow, liters)
+    peak_day = np.full(count, np.iinfo(np.int64).max)
+    at_peak = liters == peak[cow]
+    np.minimum.at(peak_day, cow[at_peak], dim[at_peak])
+
+    last_day = np.zeros(count, dtype=np.int64)
+    np.maximum.at(last_day, cow, days)
+    recent = days > last_day[cow] - RECENT_DAYS
+    recent_mean = (
+        np.bincount(cow[recent], liters[recent], minlength=count)
+        / np.maximum(np.bincount(cow[recent], minlength=count), 1)
+    )
+    persistency = np.divide(recent_mean * 100, peak, out=np.zeros(count), where=peak > 0)
+
+    # Recorded milk inside 305 days, then the fitted curve for the days left
+    in_window = dim <= LACTATION_DAYS
+    recorded = np.bincount(cow[in_window], liters[in_window], minlength=count)
+    last_dim = last_day - current_start
+    t = np.arange(1, LACTATION_DAYS + 1, dtype=np.float64)
+    remaining = t[None, :] > last_dim[:, None]
+
+    coefficients = _wood_fit(cow, dim, liters, count)
+    fitted = ~np.isnan(coefficients[:, 0])
+    with np.errstate(over='ignore', invalid='ignore'):
+        curve = np.exp(
+            coefficients[:, 0:1] + coefficients[:, 1:2] * np.log(t)[None, :] - coefficients[:, 2:3] * t[None, :]
+        )
+    # A fit from a few early days can run away; it never beats the peak
+    curve = np.clip(np.nan_to_num(curve), 0, peak[:, None])
+    curve[~fitted] = recent_mean[~fitted, None]
+    projected = recorded + (curve * remaining).sum(axis=1)
+
+    ranked = np.sort(projected)
+    percentile = np.searchsorted(ranked, projected, side='right') * 100 / count
+
+    today_ordinal = today.toordinal()
+    return {
+        int(animal): {
+            'lactation_start': date.fromordinal(int(current_start[i])),
+            'days_in_milk': int(today_ordinal - current_start[i]),
+            'peak_yield': round(float(peak[i]), 1),
+            'peak_day': int(peak_day[i]),
+            'persistency': round(float(persistency[i]), 1),
+            'projected_305': round(float(projected[i]), 0),
+            'fitted': bool(fitted[i]),
+            'percentile': round(float(percentile[i]), 0),
+        }
+        for i, animal in enumerate(animals)
+    }
+
+
+def _key(version, today, animal_id):
+    return f'lactation:{today}:{version}:{animal_id}'
+
+
+def herd_metrics(today=None):
+    """compute() for the whole herd, cached until milk or calvings change"""
+    today = today or timezone.localdate()
+    version = app_versions([CACHE_LABEL])[0]
+    metrics = cache.get(_key(version, today, 'herd'))
+    if metrics is None:
+        metrics = compute(today)
+        timeout = seconds_until_midnight()
+        # Per-cow entries let the animal page skip the herd-wide result
+        entries = {_key(version, today, animal): value for animal, value in metrics.items()}
+        entries[_key(version, today, 'herd')] = metrics
+        cache.set_many(entries, timeout)
+    return metrics
+
+
+def animal_metrics(animal_id, today=None):
+    """One cow's metrics, or None if she has no milk records"""
+    today = today or timezone.localdate()
+    version = app_versions([CACHE_LABEL])[0]
+    metrics = cache.get(_key(version, today, animal_id))
+    if metrics is None:
+        metrics = herd_metrics(today).get(animal_id)
+    return metrics
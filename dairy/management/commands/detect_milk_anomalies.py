@@ -0,0 +1,29 @@
+import time
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from dairy.anomalies import scan
+
+
+def parse_date(value):
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').date()
+    except ValueError:
+        raise CommandError(f'Invalid date "{value}", expected YYYY-MM-DD')
+
+
+class Command(BaseCommand):
+    help = 'Flag milk records well below each cow\'s recent baseline (run nightly)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--through', type=parse_date, help='Last day to score (default: today)')
+        parser.add_argument('--full', action='store_true', help='Score all history, not just days since the last run')
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        run = scan(options['through'], full=options['full'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Scored {run.records} record(s) through {run.through}, '
+            f'{run.flagged} flagged in {time.monotonic() - started:.1f}s'
+        ))
@@ -0,0 +1,45 @@
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from django.core.management.base import BaseCommand, CommandError
+
+from dairy.models import Animal
+from dairy.thumbnails import discard, render, store
+
+
+class Command(BaseCommand):
+    help = 'Create resized copies of animal photos that do not have them yet'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=4, help='Photos rendered in parallel (default: 4)')
+        parser.add_argument('--all', action='store_true', help='Re-create copies for every photo')
+
+    def handle(self, *args, **options):
+        if options['workers'] < 1:
+            raise CommandError('--workers must be at least 1')
+        started = time.monotonic()
+        animals = Animal.objects.exclude(photo='').exclude(photo__isnull=True)
+        if not options['all']:
+            animals = animals.filter(photo_variants=[])
+        photos = list(animals.values_list('pk', 'photo', 'photo_variants'))
+
+        done = failed = 0
+        # Workers only touch files; the rows are updated from this thread
+        with ThreadPoolExecutor(max_workers=options['workers']) as pool:
+            jobs = {pool.submit(render, name): (pk, name, old) for pk, name, old in photos}
+            for job in as_completed(jobs):
+                pk, name, old = jobs[job]
+                try:
+                    variants = job.result()
+                except Exception as e:
+                    failed += 1
+                    self.stderr.write(f'{name}: {e}')
+                    continue
+                if store(pk, name, variants):
+                    # With --all the previous copies are replaced
+                    discard(old)
+                done += 1
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Created thumbnails for {done} photo(s), {failed} failed, in {time.monotonic() - started:.1f}s'
+        ))
@@ -0,0 +1,25 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from dairy.health import HORIZON_MONTHS, materialize
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the open health calendar events from the health protocols (run monthly)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--months', type=int, default=HORIZON_MONTHS,
+            help=f'Months ahead to schedule (default: {HORIZON_MONTHS})',
+        )
+
+    def handle(self, *args, **options):
+        if options['months'] < 1:
+            raise CommandError('--months must be at least 1')
+        started = time.monotonic()
+        count = materialize(horizon_months=options['months'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Scheduled {count} health event(s) over {options["months"]} months '
+            f'in {time.monotonic() - started:.1f}s'
+        ))
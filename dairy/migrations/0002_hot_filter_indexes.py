@@ -0,0 +1,33 @@
+# Generated by Django 5.0.1 on 2026-10-16 20:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dairy', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='animal',
+            index=models.Index(fields=['animal_type', 'gender', 'status'], name='dairy_anima_animal__da89f5_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='animal',
+            index=models.Index(fields=['status', 'animal_type'], name='dairy_anima_status_fe8e18_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='healthrecord',
+            index=models.Index(fields=['next_due_date'], name='dairy_healt_next_du_ddfea1_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='milkproduction',
+            index=models.Index(fields=['date', 'created_at'], name='dairy_milkp_date_169910_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pregnancy',
+            index=models.Index(fields=['status', 'expected_delivery'], name='dairy_pregn_status_e0d138_idx'),
+        ),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 5.0.1 on 2026-10-16 22:21
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dairy', '0002_hot_filter_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MilkAnomalyScan',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('through', models.DateField()),
+                ('records', models.IntegerField(default=0)),
+                ('flagged', models.IntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'ordering': ['-through', '-created_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='MilkAlert',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('liters', models.DecimalField(decimal_places=2, max_digits=6)),
+                ('baseline', models.DecimalField(decimal_places=2, help_text='Median of the previous records', max_digits=6)),
+                ('z_score', models.DecimalField(decimal_places=2, max_digits=6)),
+                ('resolved', models.BooleanField(default=False)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('animal', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='milk_alerts', to='dairy.animal')),
+            ],
+            options={
+                'ordering': ['-date', 'z_score'],
+                'indexes': [models.Index(fields=['resolved', 'date'], name='dairy_milka_resolve_58209e_idx')],
+                'unique_together': {('animal', 'date')},
+            },
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.0.1 on 2026-10-16 22:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dairy', '0003_milk_alerts'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='animal',
+            index=models.Index(fields=['animal_type', 'date_of_birth'], name='dairy_anima_animal__13978b_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.1 on 2026-10-16 22:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dairy', '0004_animal_age_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='animal',
+            name='photo_variants',
+            field=models.JSONField(blank=True, default=list, editable=False),
+        ),
+    ]
@@ -0,0 +1,73 @@
+# Generated by Django 5.0.1 on 2026-10-16 22:31
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def reminders_from_records(apps, schema_editor):
+    """Open one-off events for next_due_date reminders not yet superseded"""
+    HealthRecord = apps.get_model('dairy', 'HealthRecord')
+    HealthEvent = apps.get_model('dairy', 'HealthEvent')
+    latest = {}
+    records = HealthRecord.objects.order_by('date', 'created_at').values_list(
+        'pk', 'animal_id', 'record_type', 'description', 'next_due_date',
+    )
+    for pk, animal_id, record_type, description, next_due in records:
+        latest[animal_id, record_type] = (pk, description, next_due)
+    today = django.utils.timezone.localdate()
+    HealthEvent.objects.bulk_create([
+        HealthEvent(
+            animal_id=animal_id, record_type=record_type, title=description[:100],
+            due_date=next_due, source_id=pk,
+        )
+        for (animal_id, record_type), (pk, description, next_due) in latest.items()
+        if next_due and next_due >= today
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dairy', '0005_animal_photo_variants'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='HealthProtocol',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100)),
+                ('animal_type', models.CharField(choices=[('cow', 'Cow'), ('sheep', 'Sheep')], max_length=10)),
+                ('record_type', models.CharField(choices=[('vaccination', 'Vaccination'), ('treatment', 'Treatment'), ('checkup', 'Checkup'), ('injury', 'Injury'), ('other', 'Other')], default='vaccination', max_length=20)),
+                ('keyword', models.CharField(blank=True, help_text='Health records of this type whose description contains this count as done (blank: any)', max_length=50)),
+                ('interval_months', models.PositiveSmallIntegerField(help_text='Months between treatments')),
+                ('min_age_months', models.PositiveSmallIntegerField(default=0, help_text='First treatment at this age')),
+                ('start_date', models.DateField(default=django.utils.timezone.now, help_text='Animals never treated are due from this date')),
+                ('active', models.BooleanField(default=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'ordering': ['animal_type', 'name'],
+            },
+        ),
+        migrations.CreateModel(
+            name='HealthEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('record_type', models.CharField(choices=[('vaccination', 'Vaccination'), ('treatment', 'Treatment'), ('checkup', 'Checkup'), ('injury', 'Injury'), ('other', 'Other')], max_length=20)),
+                ('title', models.CharField(max_length=100)),
+                ('due_date', models.DateField()),
+                ('status', models.CharField(choices=[('open', 'Open'), ('done', 'Done')], default='open', max_length=10)),
+                ('animal', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='health_events', to='dairy.animal')),
+                ('completed_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='completed_events', to='dairy.healthrecord')),
+                ('source', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='reminders', to='dairy.healthrecord')),
+                ('protocol', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='events', to='dairy.healthprotocol')),
+            ],
+            options={
+                'ordering': ['due_date', 'animal'],
+                'indexes': [models.Index(fields=['status', 'due_date'], name='dairy_healt_status_c7d719_idx'), models.Index(fields=['animal', 'status'], name='dairy_healt_animal__ebb041_idx')],
+            },
+        ),
+        migrations.RunPython(reminders_from_records, migrations.RunPython.noop),
+    ]
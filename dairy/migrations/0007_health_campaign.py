@@ -0,0 +1,38 @@
+# Generated by Django 5.0.1 on 2026-10-16 22:35
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dairy', '0006_health_schedule'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='HealthCampaign',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('record_type', models.CharField(choices=[('vaccination', 'Vaccination'), ('treatment', 'Treatment'), ('checkup', 'Checkup'), ('injury', 'Injury'), ('other', 'Other')], max_length=20)),
+                ('date', models.DateField(default=django.utils.timezone.now)),
+                ('description', models.TextField(help_text='What was done')),
+                ('veterinarian', models.CharField(blank=True, max_length=100)),
+                ('total_cost', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('animal_count', models.PositiveIntegerField(default=0)),
+                ('next_due_date', models.DateField(blank=True, null=True)),
+                ('notes', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'ordering': ['-date', '-created_at'],
+            },
+        ),
+        migrations.AddField(
+            model_name='healthrecord',
+            name='campaign',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='records', to='dairy.healthcampaign'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.0.1 on 2026-10-16 22:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dairy', '0007_health_campaign'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='feedrecord',
+            index=models.Index(fields=['date'], name='dairy_feedr_date_231ec3_idx'),
+        ),
+    ]
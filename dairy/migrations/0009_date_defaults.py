@@ -0,0 +1,24 @@
+# Generated by Django 5.0.1 on 2026-10-16 22:59
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dairy', '0008_feed_date_index'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='healthcampaign',
+            name='date',
+            field=models.DateField(default=django.utils.timezone.localdate),
+        ),
+        migrations.AlterField(
+            model_name='healthprotocol',
+            name='start_date',
+            field=models.DateField(default=django.utils.timezone.localdate, help_text='Animals never treated are due from this date'),
+        ),
+    ]
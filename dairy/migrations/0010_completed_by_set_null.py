@@ -0,0 +1,19 @@
+# Generated by Django 5.0.1 on 2026-10-16 23:11
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dairy', '0009_date_defaults'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='healthevent',
+            name='completed_by',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='completed_events', to='dairy.healthrecord'),
+        ),
+    ]
@@ -0,0 +1,84 @@
+"""
+Recording a day's milk for many cows at once.
+
+Rows are written with a single INSERT ... ON CONFLICT (animal, date) DO
+UPDATE, so two people saving the same cow and day at the same moment
+both succeed (the later one wins) instead of one failing on the
+unique_together check. bulk_create skips the model signals, so the
+day's snapshot and the home-page caches are refreshed here.
+"""
+from decimal import Decimal, InvalidOperation
+
+from django.db import transaction as db_transaction
+
+from dashboard.cache import bump_version
+from dashboard.snapshots import refresh_flows
+from .models import Animal, MilkProduction
+
+
+def milking_cows():
+    return Animal.objects.filter(animal_type='cow', gender='female', status='active')
+
+
+def _liters(value):
+    """Liters from a form field; blank is None"""
+    value = (value or '').strip()
+    if not value:
+        return None
+    try:
+        liters = Decimal(value)
+    except InvalidOperation:
+        raise ValueError(f'"{value}" is not a number')
+    if liters < 0 or liters >= 10000:
+        raise ValueError('must be between 0 and 9999')
+    return liters.quantize(Decimal('0.01'))
+
+
+def parse_grid(data, cows):
+    """
+    (rows, errors) from the grid's morning_<pk> / evening_<pk> fields.
+
+    Cows with both fields blank are left out; one blank milking counts
+    as 0. errors maps a cow's tag number to what was wrong.
+    """
+    rows, errors = [], {}
+    for cow in cows:
+        try:
+            morning = _liters(data.get(f'morning_{cow.pk}'))
+            evening = _liters(data.get(f'evening_{cow.pk}'))
+        except ValueError as e:
+            errors[cow.tag_number] = str(e)
+            continue
+        if morning is None and evening is None:
+            continue
+        rows.append({
+            'animal_id': cow.pk,
+            'morning_liters': morning or 0,
+            'evening_liters': evening or 0,
+        })
+    return rows, errors
+
+
+def record_milk(day, rows, fields=('morning_liters', 'evening_liters')):
+    """
+    Insert or update one MilkProduction per row for `day` in one statement.
+
+    Each row holds animal_id and `fields`; only `fields` are overwritten
+    on an existing record. Returns the number of rows written.
+    """
+    if not rows:
+        return 0
+    records = [MilkProduction(date=day, **row) for row in rows]
+    with db_transaction.atomic():
+        MilkProduction.objects.bulk_create(
+            records,
+            update_conflicts=True,
+            unique_fields=['animal', 'date'],
+            update_fields=list(fields),
+        )
+        refresh_flows(day)
+    bump_version('dairy')
+    bump_version('dashboard')
+    bump_version('lactation')
+    bump_version('feed_costs')
+    return len(records)
@@ -1,6 +1,68 @@
 from django.db import models
+from django.db.models.functions import ExtractMonth, ExtractYear, Greatest
 from django.utils import timezone
 from datetime import date, timedelta
+from dateutil.relativedelta import relativedelta
+
+
+def born_before_age(months, today=None):
+    """
+    Animals born before this date are at least `months` old.
+
+    Ages count calendar months like Animal.age_in_months(): a calf born
+    any day in January is one month old for all of February.
+    """
+    today = today or date.today()
+    return today.replace(day=1) - relativedelta(months=months - 1)
+
+
+class AnimalQuerySet(models.QuerySet):
+    """Age and maturity in SQL, as plain date_of_birth comparisons"""
+    
+    def with_age(self, today=None):
+        """Annotate age_in_months and is_mature (both null without a birth date)"""
+        today = today or date.today()
+        months = (today.year - ExtractYear('date_of_birth')) * 12 + today.month - ExtractMonth('date_of_birth')
+        return self.annotate(
+            age_months=Greatest(months, 0),
+            mature=models.Case(
+                models.When(date_of_birth__isnull=True, then=None),
+                models.When(self._mature_q(today), then=True),
+                default=False,
+                output_field=models.BooleanField(null=True),
+            ),
+        )
+    
+    def _mature_q(self, today):
+        q = models.Q(pk__in=[])
+        for animal_type, months in Animal.MATURITY_MONTHS.items():
+            q |= models.Q(animal_type=animal_type, date_of_birth__lt=born_before_age(months, today))
+        return q
+    
+    def mature(self, today=None):
+        """Old enough to breed; animals without a birth date are excluded"""
+        return self.filter(self._mature_q(today or date.today()))
+    
+    def immature(self, today=None):
+        return self.filter(date_of_birth__isnull=False).exclude(self._mature_q(today or date.today()))
+    
+    def age_between(self, low=None, high=None, today=None):
+        """Aged `low` to `high` months inclusive (either may be None)"""
+        today = today or date.today()
+        animals = self.filter(date_of_birth__isnull=False)
+        if low is not None:
+            animals = animals.filter(date_of_birth__lt=born_before_age(low, today))
+        if high is not None:
+            animals = animals.filter(date_of_birth__gte=born_before_age(high + 1, today))
+        return animals
+    
+    def born_between(self, start=None, end=None):
+        animals = self
+        if start:
+            animals = animals.filter(date_of_birth__gte=start)
+        if end:
+            animals = animals.filter(date_of_birth__lte=end)
+        return animals
 
 
 class Animal(models.Model):
@@ -21,6 +83,12 @@ class Animal(models.Model):
         ('deceased', 'Deceased'),
     )
     
+    # Breeding age in months
+    MATURITY_MONTHS = {'cow': 15, 'sheep': 7}
+    
+    # Days between heats (oestrous cycle)
+    HEAT_CYCLE_DAYS = {'cow': 21, 'sheep': 17}
+    
     animal_type = models.CharField(max_length=10, choices=ANIMAL_TYPES)
     tag_number = models.CharField(max_length=50, unique=True, help_text="Unique ID/Tag")
     name = models.CharField(max_length=100, blank=True, help_text="Optional name")
@@ -32,6 +100,8 @@ class Animal(models.Model):
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='active')
     notes = models.TextField(blank=True)
     photo = models.ImageField(upload_to='animals/', blank=True, null=True)
+    # Resized copies of photo, filled in the background by dairy.thumbnails
+    photo_variants = models.JSONField(default=list, blank=True, editable=False)
     
     # Breeding information
     mother_tag = models.CharField(max_length=50, blank=True, help_text="Mother's tag number")
@@ -40,8 +110,18 @@ class Animal(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    objects = AnimalQuerySet.as_manager()
+    
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Milking cows (cow, female, active) and type filters
+            models.Index(fields=['animal_type', 'gender', 'status']),
+            # Herd counts and the status-filtered animal list
+            models.Index(fields=['status', 'animal_type']),
+            # Age and maturity filters
+            models.Index(fields=['animal_type', 'date_of_birth']),
+        ]
     
     def __str__(self):
         return f"{self.get_animal_type_display()} - {self.tag_number} ({self.name or 'Unnamed'})"
@@ -58,13 +138,33 @@ class Animal(models.Model):
     def is_mature(self):
         """Check if animal is mature for breeding (cows: 15+ months, sheep: 7+ months)"""
         age = self.age_in_months()
-        if age is None:
+        if age is None or self.animal_type not in self.MATURITY_MONTHS:
             return False
-        if self.animal_type == 'cow':
-            return age >= 15
-        elif self.animal_type == 'sheep':
-            return age >= 7
-        return False
+        return age >= self.MATURITY_MONTHS[self.animal_type]
+    
+    def _photo_srcset(self, extension):
+        storage = self.photo.storage
+        return ', '.join(
+            f"{storage.url(variant[extension])} {variant['width']}w"
+            for variant in self.photo_variants
+        )
+    
+    @property
+    def photo_srcset_webp(self):
+        """srcset of the WebP photo variants ('' until they are made)"""
+        return self._photo_srcset('webp')
+    
+    @property
+    def photo_srcset_jpeg(self):
+        """srcset of the JPEG photo variants ('' until they are made)"""
+        return self._photo_srcset('jpeg')
+    
+    @property
+    def photo_thumbnail_url(self):
+        """Smallest photo variant, or the original until variants exist"""
+        if self.photo_variants:
+            return self.photo.storage.url(self.photo_variants[0]['jpeg'])
+        return self.photo.url if self.photo else ''
 
 
 class MilkProduction(models.Model):
@@ -79,6 +179,9 @@ class MilkProduction(models.Model):
     class Meta:
         ordering = ['-date', '-created_at']
         unique_together = ['animal', 'date']
+        indexes = [
+            models.Index(fields=['date', 'created_at']),
+        ]
     
     def __str__(self):
         return f"{self.animal.tag_number} - {self.date} - {self.total_liters}L"
@@ -107,10 +210,17 @@ class HealthRecord(models.Model):
     cost = models.DecimalField(max_digits=10, decimal_places=2, default=0)
     next_due_date = models.DateField(null=True, blank=True, help_text="Next vaccination/checkup date")
     notes = models.TextField(blank=True)
+    # Set when recorded for many animals at once; the campaign posts the cost
+    campaign = models.ForeignKey(
+        'HealthCampaign', on_delete=models.CASCADE, null=True, blank=True, related_name='records',
+    )
     created_at = models.DateTimeField(auto_now_add=True)
     
     class Meta:
         ordering = ['-date', '-created_at']
+        indexes = [
+            models.Index(fields=['next_due_date']),
+        ]
     
     def __str__(self):
         return f"{self.animal.tag_number} - {self.get_record_type_display()} - {self.date}"
@@ -122,6 +232,119 @@ class HealthRecord(models.Model):
         return False
 
 
+class HealthCampaign(models.Model):
+    """One treatment given to many animals at once, e.g. a vaccination day"""
+    COST_SPLITS = (
+        ('total', 'Total cost shared equally'),
+        ('each', 'Cost per animal'),
+    )
+    
+    record_type = models.CharField(max_length=20, choices=HealthRecord.RECORD_TYPES)
+    date = models.DateField(default=timezone.localdate)
+    description = models.TextField(help_text="What was done")
+    veterinarian = models.CharField(max_length=100, blank=True)
+    total_cost = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    animal_count = models.PositiveIntegerField(default=0)
+    next_due_date = models.DateField(null=True, blank=True)
+    notes = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        ordering = ['-date', '-created_at']
+    
+    def __str__(self):
+        return f"{self.description[:50]} - {self.date} ({self.animal_count} animals)"
+
+
+class HealthProtocol(models.Model):
+    """A treatment repeated on a schedule, e.g. FMD vaccine every 6 months for cows"""
+    name = models.CharField(max_length=100)
+    animal_type = models.CharField(max_length=10, choices=Animal.ANIMAL_TYPES)
+    record_type = models.CharField(max_length=20, choices=HealthRecord.RECORD_TYPES, default='vaccination')
+    keyword = models.CharField(
+        max_length=50, blank=True,
+        help_text="Health records of this type whose description contains this count as done (blank: any)",
+    )
+    interval_months = models.PositiveSmallIntegerField(help_text="Months between treatments")
+    min_age_months = models.PositiveSmallIntegerField(default=0, help_text="First treatment at this age")
+    start_date = models.DateField(default=timezone.localdate, help_text="Animals never treated are due from this date")
+    active = models.BooleanField(default=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        ordering = ['animal_type', 'name']
+    
+    def __str__(self):
+        return f"{self.name} ({self.get_animal_type_display()}, every {self.interval_months} months)"
+    
+    def matches(self, record):
+        """Whether `record` counts as a treatment under this protocol"""
+        return (
+            record.record_type == self.record_type
+            and record.animal.animal_type == self.animal_type
+            and self.keyword.lower() in record.description.lower()
+        )
+
+
+class HealthEvent(models.Model):
+    """
+    A treatment due for one animal (see dairy.health).
+
+    Open events come from a protocol's schedule or from a health record's
+    next_due_date; a later matching record closes them.
+    """
+    STATUS_CHOICES = (
+        ('open', 'Open'),
+        ('done', 'Done'),
+    )
+    
+    animal = models.ForeignKey(Animal, on_delete=models.CASCADE, related_name='health_events')
+    protocol = models.ForeignKey(HealthProtocol, on_delete=models.CASCADE, null=True, blank=True, related_name='events')
+    record_type = models.CharField(max_length=20, choices=HealthRecord.RECORD_TYPES)
+    title = models.CharField(max_length=100)
+    due_date = models.DateField()
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='open')
+    # The record whose next_due_date set this event, for one-off reminders
+    source = models.ForeignKey(
+        HealthRecord, on_delete=models.CASCADE, null=True, blank=True, related_name='reminders',
+    )
+    # Deleting it reopens the event (dairy.health.record_deleted)
+    completed_by = models.ForeignKey(
+        HealthRecord, on_delete=models.SET_NULL, null=True, blank=True, related_name='completed_events',
+    )
+    
+    class Meta:
+        ordering = ['due_date', 'animal']
+        indexes = [
+            # Due-soon and calendar lists read open events by date
+            models.Index(fields=['status', 'due_date']),
+            models.Index(fields=['animal', 'status']),
+        ]
+    
+    def __str__(self):
+        return f"{self.animal.tag_number} - {self.title} - due {self.due_date}"
+    
+    def is_overdue(self):
+        return self.status == 'open' and self.due_date < timezone.localdate()
+
+
+class PregnancyQuerySet(models.QuerySet):
+    def bulk_create(self, objs, *args, **kwargs):
+        """
+        bulk_create that fills in expected_delivery like save() does and,
+        as the signals are skipped, invalidates the caches they would.
+        """
+        from dashboard.cache import bump_version
+        from . import breeding, lactation
+        
+        objs = list(objs)
+        Pregnancy.set_expected_deliveries(objs)
+        created = super().bulk_create(objs, *args, **kwargs)
+        for label in (breeding.CACHE_LABEL, lactation.CACHE_LABEL, 'dairy', 'dashboard'):
+            bump_version(label)
+        return created
+
+
 class Pregnancy(models.Model):
     """Track breeding and pregnancy cycles"""
     STATUS_CHOICES = (
@@ -132,6 +355,11 @@ class Pregnancy(models.Model):
         ('failed', 'Failed/Aborted'),
     )
     
+    # Still carrying
+    ONGOING = ('bred', 'confirmed', 'due_soon')
+    
+    GESTATION_DAYS = {'cow': 283, 'sheep': 150}
+    
     animal = models.ForeignKey(Animal, on_delete=models.CASCADE, related_name='pregnancies')
     breeding_date = models.DateField(default=timezone.now)
     bull_tag = models.CharField(max_length=50, blank=True, help_text="Bull/Ram tag number")
@@ -142,22 +370,51 @@ class Pregnancy(models.Model):
     notes = models.TextField(blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     
+    objects = PregnancyQuerySet.as_manager()
+    
     class Meta:
         ordering = ['-breeding_date']
+        indexes = [
+            models.Index(fields=['status', 'expected_delivery']),
+        ]
     
     def __str__(self):
         return f"{self.animal.tag_number} - Bred: {self.breeding_date}"
     
     def save(self, *args, **kwargs):
         """Auto-calculate expected delivery date"""
-        if self.breeding_date and not self.expected_delivery:
-            # Cows: 283 days, Sheep: 150 days
-            if self.animal.animal_type == 'cow':
-                self.expected_delivery = self.breeding_date + timedelta(days=283)
-            elif self.animal.animal_type == 'sheep':
-                self.expected_delivery = self.breeding_date + timedelta(days=150)
+        Pregnancy.set_expected_deliveries([self])
         super().save(*args, **kwargs)
     
+    @classmethod
+    def set_expected_deliveries(cls, pregnancies):
+        """
+        Fill in expected_delivery where it is missing.
+        
+        Animals already loaded on a pregnancy are used as they are; the
+        types of the rest are read with one query for the whole batch.
+        """
+        breeding_date = cls._meta.get_field('breeding_date')
+        missing = []
+        for pregnancy in pregnancies:
+            if pregnancy.breeding_date and not pregnancy.expected_delivery:
+                # Form views assign raw POST strings
+                pregnancy.breeding_date = breeding_date.to_python(pregnancy.breeding_date)
+                missing.append(pregnancy)
+        unloaded = {p.animal_id for p in missing if not cls.animal.is_cached(p)}
+        types = {}
+        if unloaded:
+            types = dict(Animal.objects.filter(pk__in=unloaded).values_list('pk', 'animal_type'))
+        for pregnancy in missing:
+            if cls.animal.is_cached(pregnancy):
+                animal_type = pregnancy.animal.animal_type
+            else:
+                animal_type = types.get(pregnancy.animal_id)
+            if animal_type in cls.GESTATION_DAYS:
+                pregnancy.expected_delivery = (
+                    pregnancy.breeding_date + timedelta(days=cls.GESTATION_DAYS[animal_type])
+                )
+    
     def is_due_within_week(self):
         """Check if delivery is expected within 7 days"""
         if self.expected_delivery and self.status in ['bred', 'confirmed', 'due_soon']:
@@ -177,6 +434,44 @@ class FeedRecord(models.Model):
     
     class Meta:
         ordering = ['-date', '-created_at']
+        indexes = [
+            # Date ranges read by dairy.feed
+            models.Index(fields=['date']),
+        ]
+    
+    def __str__(self):
+        return f"{self.feed_type} - {self.date} - {self.quantity_kg}kg"
+
+class MilkAlert(models.Model):
+    """A day's yield well below the cow's recent baseline (see dairy.anomalies)"""
+    animal = models.ForeignKey(Animal, on_delete=models.CASCADE, related_name='milk_alerts')
+    date = models.DateField()
+    liters = models.DecimalField(max_digits=6, decimal_places=2)
+    baseline = models.DecimalField(max_digits=6, decimal_places=2, help_text="Median of the previous records")
+    z_score = models.DecimalField(max_digits=6, decimal_places=2)
+    resolved = models.BooleanField(default=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        ordering = ['-date', 'z_score']
+        unique_together = ['animal', 'date']
+        indexes = [
+            models.Index(fields=['resolved', 'date']),
+        ]
+    
+    def __str__(self):
+        return f"{self.animal.tag_number} - {self.date} - {self.liters}L (usual {self.baseline}L)"
+
+
+class MilkAnomalyScan(models.Model):
+    """One run of the anomaly job; the latest `through` is where the next run starts"""
+    through = models.DateField()
+    records = models.IntegerField(default=0)
+    flagged = models.IntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        ordering = ['-through', '-created_at']
     
     def __str__(self):
-        return f"{self.feed_type} - {self.date} - {self.quantity_kg}kg"
\ No newline at end of file
+        return f"Scan through {self.through}: {self.flagged} flagged"
@@ -0,0 +1,204 @@
+"""
+Pedigree lookups over Animal.mother_tag / father_tag.
+
+The whole registry is read with one values_list query into an index of
+parents and offspring by tag. The index is kept per process and rebuilt
+when the 'pedigree' version changes (dairy.signals bumps it whenever an
+Animal is saved or deleted), so lookups after the first cost no queries.
+
+Parents named by tag but not in the registry (e.g. AI bulls) are
+pedigree members with unknown parents. Relationships use the tabular
+method: animals are put in birth order (parents first), and
+
+    a(i, i) = 1 + a(sire, dam) / 2
+    a(i, j) = (a(sire_i, j) + a(dam_i, j)) / 2   where i is younger than j
+
+with unknown parents counting 0. Wright's inbreeding coefficient of an
+animal is a(sire, dam) / 2. Entries are memoised for the index's lifetime.
+"""
+import threading
+from collections import deque
+
+from dashboard.cache import app_versions
+from .models import Animal
+
+
+# Version label bumped by dairy.signals when animals change
+CACHE_LABEL = 'pedigree'
+
+# Offspring inbreeding at or above these is flagged by mating_check()
+CAUTION_INBREEDING = 0.0625
+AVOID_INBREEDING = 0.125
+
+
+def _tag(tag):
+    """A tag as stored in the index: typed by hand, so stray spaces are common"""
+    return (tag or '').strip() or None
+
+
+class Pedigree:
+    """Parent/offspring index with memoised additive relationships"""
+
+    def __init__(self, rows):
+        """`rows` are (tag, mother_tag, father_tag) tuples"""
+        self.parents = {}
+        self.offspring = {}
+        for tag, dam, sire in rows:
+            self.parents[_tag(tag)] = (_tag(sire), _tag(dam))
+        for tag, (sire, dam) in list(self.parents.items()):
+            for parent in (sire, dam):
+                if parent:
+                    self.parents.setdefault(parent, (None, None))
+                    self.offspring.setdefault(parent, []).append(tag)
+        self.order = self._birth_order()
+        self._relationship = {}
+
+    def _birth_order(self):
+        """Position of each tag with every parent before its offspring"""
+        order = {}
+        for start in self.parents:
+            if start in order:
+                continue
+            stack = [(start, False)]
+            visiting = set()
+            while stack:
+                tag, expanded = stack.pop()
+                if tag in order:
+                    continue
+                if expanded:
+                    visiting.discard(tag)
+                    order[tag] = len(order)
+                    continue
+                visiting.add(tag)
+                stack.append((tag, True))
+                for parent in self.parents[tag]:
+                    # A tag that is its own ancestor is a data error; cut the loop
+                    if parent and parent not in order and parent not in visiting:
+                        stack.append((parent, False))
+        return order
+
+    def __contains__(self, tag):
+        return _tag(tag) in self.parents
+
+    def _parents(self, tag):
+        """Known parents, dropping any that would loop back (bad data)"""
+        position = self.order[tag]
+        return tuple(
+            parent if parent and self.order[parent] < position else None
+            for parent in self.parents[tag]
+        )
+
+    def relationship(self, a, b):
+        """Additive relationship between two tags (0 if either is unknown)"""
+        a, b = _tag(a), _tag(b)
+        if not a or not b or a not in self.parents or b not in self.parents:
+            return 0.0
+        memo = self._relationship
+        # Iterative to stay clear of the recursion limit in deep pedigrees
+        stack = [(a, b)]
+        while stack:
+            i, j = stack[-1]
+            if self.order[i] < self.order[j]:
+                i, j = j, i
+            key = (i, j)
+            if key in memo:
+                stack.pop()
+                continue
+            sire, dam = self._parents(i)
+            needed = [(sire, dam)] if i == j else [(sire, j), (dam, j)]
+            missing = [
+                pair for pair in needed
+                if pair[0] and pair[1] and self._key(*pair) not in memo
+            ]
+            if missing:
+                stack.extend(missing)
+                continue
+            stack.pop()
+            if i == j:
+                memo[key] = 1 + self._memo(sire, dam) / 2
+            else:
+                memo[key] = (self._memo(sire, j) + self._memo(dam, j)) / 2
+        return memo[self._key(a, b)]
+
+    def _key(self, a, b):
+        return (a, b) if self.order[a] >= self.order[b] else (b, a)
+
+    def _memo(self, a, b):
+        if not a or not b:
+            return 0.0
+        return self._relationship[self._key(a, b)]
+
+    def inbreeding(self, tag):
+        """Wright's inbreeding coefficient F"""
+        tag = _tag(tag)
+        if tag not in self.parents:
+            return 0.0
+        sire, dam = self._parents(tag)
+        return self.relationship(sire, dam) / 2
+
+    def ancestors(self, tag, generations=None):
+        """{ancestor tag: generations back}, nearest path first"""
+        return self._walk(tag, lambda t: [p for p in self.parents.get(t, ()) if p], generations)
+
+    def descendants(self, tag, generations=None):
+        """{descendant tag: generations down}"""
+        return self._walk(tag, lambda t: self.offspring.get(t, []), generations)
+
+    def _walk(self, tag, step, generations):
+        tag = _tag(tag)
+        found = {}
+        queue = deque([(tag, 0)])
+        while queue:
+            current, depth = queue.popleft()
+            if generations is not None and depth >= generations:
+                continue
+            for relative in step(current):
+                if relative not in found and relative != tag:
+                    found[relative] = depth + 1
+                    queue.append((relative, depth + 1))
+        return found
+
+    def mating_check(self, dam, sire):
+        """
+        Score a proposed mating before it happens.
+
+        Returns the inbreeding coefficient the offspring would have, the
+        shared ancestors (with generations back on each side) and a
+        'ok' / 'caution' / 'avoid' verdict.
+        """
+        dam, sire = _tag(dam), _tag(sire)
+        offspring_f = self.relationship(dam, sire) / 2
+        dam_side = self.ancestors(dam)
+        dam_side[dam] = 0
+        sire_side = self.ancestors(sire)
+        sire_side[sire] = 0
+        common = sorted(
+            ((tag, dam_side[tag], sire_side[tag]) for tag in dam_side.keys() & sire_side.keys()),
+            key=lambda row: (row[1] + row[2], row[0]),
+        )
+        if offspring_f >= AVOID_INBREEDING:
+            verdict = 'avoid'
+        elif offspring_f >= CAUTION_INBREEDING:
+            verdict = 'caution'
+        else:
+            verdict = 'ok'
+        return {
+            'inbreeding': offspring_f,
+            'common_ancestors': common,
+            'verdict': verdict,
+        }
+
+
+_index = {'version': None, 'pedigree': None}
+_lock = threading.Lock()
+
+
+def pedigree():
+    """The current registry's Pedigree, rebuilt after any Animal change"""
+    version = app_versions([CACHE_LABEL])[0]
+    with _lock:
+        if _index['version'] != version:
+            rows = Animal.objects.values_list('tag_number', 'mother_tag', 'father_tag')
+            _index['pedigree'] = Pedigree(rows)
+            _index['version'] = version
+        return _index['pedigree']
@@ -0,0 +1,68 @@
+"""
+Invalidate cached lactation metrics when milk or calving records change,
+the pedigree index when animals change, the breeding calendar when
+either changes and feed costs when feed, milk or animals change. Keep
+the health calendar in step with animals, health records and protocols.
+
+bulk_create() bypasses these handlers; dairy.milk.record_milk and
+Pregnancy.objects.bulk_create bump the versions themselves.
+"""
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from dashboard.cache import bump_version
+from .models import Animal, FeedRecord, HealthProtocol, HealthRecord, MilkProduction, Pregnancy
+from . import breeding, feed, health, lactation, pedigree
+
+
+@receiver(post_save, sender=MilkProduction)
+@receiver(post_delete, sender=MilkProduction)
+@receiver(post_save, sender=Pregnancy)
+@receiver(post_delete, sender=Pregnancy)
+def bump_lactation_version(sender, **kwargs):
+    bump_version(lactation.CACHE_LABEL)
+
+
+@receiver(post_save, sender=Animal)
+@receiver(post_delete, sender=Animal)
+def bump_pedigree_version(sender, **kwargs):
+    bump_version(pedigree.CACHE_LABEL)
+
+
+@receiver(post_save, sender=Pregnancy)
+@receiver(post_delete, sender=Pregnancy)
+@receiver(post_save, sender=Animal)
+@receiver(post_delete, sender=Animal)
+def bump_breeding_version(sender, **kwargs):
+    bump_version(breeding.CACHE_LABEL)
+
+
+@receiver(post_save, sender=FeedRecord)
+@receiver(post_delete, sender=FeedRecord)
+@receiver(post_save, sender=MilkProduction)
+@receiver(post_delete, sender=MilkProduction)
+@receiver(post_save, sender=Animal)
+@receiver(post_delete, sender=Animal)
+def bump_feed_version(sender, **kwargs):
+    bump_version(feed.CACHE_LABEL)
+
+
+@receiver(post_save, sender=Animal)
+def plan_animal_health(sender, instance, **kwargs):
+    # New animals join the calendar; sold or deceased ones leave it
+    health.materialize([instance.pk])
+
+
+@receiver(post_save, sender=HealthRecord)
+def close_health_events(sender, instance, **kwargs):
+    health.record_saved(instance)
+
+
+@receiver(post_delete, sender=HealthRecord)
+def replan_health_events(sender, instance, **kwargs):
+    health.record_deleted(instance)
+
+
+@receiver(post_save, sender=HealthProtocol)
+def plan_protocol(sender, instance, **kwargs):
+    health.materialize(protocols=[instance])
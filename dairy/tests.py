@@ -1,3 +1,869 @@
 from django.test import TestCase
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.urls import reverse
+from datetime import date, timedelta
+from decimal import Decimal
+from dateutil.relativedelta import relativedelta
+from io import StringIO
+from collections import Counter
+from unittest import mock
+import io
+import math
+import shutil
+import tempfile
+import time
 
-# Create your tests here.
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from PIL import Image
+
+from .models import (
+    Animal, FeedRecord, HealthCampaign, HealthEvent, HealthProtocol, HealthRecord, MilkAlert, MilkProduction,
+    Pregnancy,
+)
+from . import anomalies, breeding, feed, health, lactation, pedigree, thumbnails
+from .aggregates import herd_counts, milk_totals
+from .campaigns import split_cost
+from .milk import record_milk
+from dashboard.cache import app_versions
+from dashboard.models import DailyFarmSnapshot
+from finance.models import Transaction
+
+
+class AggregateTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cow = Animal.objects.create(animal_type='cow', tag_number='C1', gender='female')
+        Animal.objects.create(animal_type='cow', tag_number='C2', gender='male')
+        Animal.objects.create(animal_type='sheep', tag_number='S1', gender='female')
+        Animal.objects.create(animal_type='sheep', tag_number='S2', gender='female', status='deceased')
+        cls.today = date(2025, 3, 10)
+        MilkProduction.objects.create(animal=cow, date=cls.today, morning_liters=5, evening_liters=4)
+        MilkProduction.objects.create(
+            animal=cow, date=cls.today - timedelta(days=2), morning_liters=3, evening_liters=3
+        )
+        MilkProduction.objects.create(
+            animal=cow, date=cls.today - timedelta(days=20), morning_liters=10, evening_liters=10
+        )
+
+    def test_herd_counts(self):
+        with self.assertNumQueries(1):
+            herd = herd_counts()
+        self.assertEqual(herd, {'cows': 2, 'sheep': 1, 'total': 3})
+
+    def test_milk_totals(self):
+        with self.assertNumQueries(1):
+            milk = milk_totals(self.today, days=7)
+        self.assertEqual(milk['today'], Decimal('9'))
+        self.assertEqual(milk['recent'], Decimal('15'))
+
+
+class DairyHomeTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        user = get_user_model().objects.create_user('farmer', password='pass')
+        self.client.force_login(user)
+
+    def test_query_count(self):
+        # session + user, herd and milk aggregates, health and pregnancy lists
+        with self.assertNumQueries(6):
+            response = self.client.get(reverse('dairy:home'))
+        self.assertEqual(response.status_code, 200)
+
+
+class MilkGridTests(TestCase):
+    def setUp(self):
+        user = get_user_model().objects.create_user('farmer', password='pass')
+        self.client.force_login(user)
+        self.cows = [
+            Animal.objects.create(animal_type='cow', tag_number=f'C{n}', gender='female')
+            for n in range(3)
+        ]
+        Animal.objects.create(animal_type='cow', tag_number='B1', gender='male')
+        self.day = date(2025, 3, 10)
+        MilkProduction.objects.create(
+            animal=self.cows[0], date=self.day, morning_liters=1, evening_liters=1, notes='sore hoof'
+        )
+
+    def test_upsert_in_one_statement(self):
+        rows = [
+            {'animal_id': cow.pk, 'morning_liters': 5, 'evening_liters': 4} for cow in self.cows
+        ]
+        # savepoint, one upsert, the day's snapshot refresh (3), release
+        with self.assertNumQueries(6):
+            self.assertEqual(record_milk(self.day, rows), 3)
+        # Saving the same day again updates rather than failing on unique_together
+        record_milk(self.day, rows)
+        records = MilkProduction.objects.filter(date=self.day)
+        self.assertEqual(records.count(), 3)
+        self.assertEqual(records.get(animal=self.cows[0]).notes, 'sore hoof')
+        self.assertEqual(DailyFarmSnapshot.objects.get(date=self.day).milk_liters, 27)
+
+    def test_grid(self):
+        url = reverse('dairy:milk_grid')
+        response = self.client.get(url, {'date': '2025-03-10'})
+        self.assertEqual([c.tag_number for c in response.context['cows']], ['C0', 'C1', 'C2'])
+        self.assertEqual(response.context['cows'][0].morning, 1)
+
+        data = {
+            'date': '2025-03-10',
+            f'morning_{self.cows[0].pk}': '6', f'evening_{self.cows[0].pk}': '5.5',
+            f'morning_{self.cows[1].pk}': '7',
+        }
+        response = self.client.post(url, {**data, f'evening_{self.cows[2].pk}': 'lots'})
+        self.assertEqual(response.context['cows'][2].error, '"lots" is not a number')
+        self.assertEqual(MilkProduction.objects.get(animal=self.cows[0]).morning_liters, 1)
+
+        self.client.post(url, data)
+        totals = {r.animal_id: r.total_liters for r in MilkProduction.objects.filter(date=self.day)}
+        self.assertEqual(totals, {self.cows[0].pk: Decimal('11.5'), self.cows[1].pk: Decimal('7')})
+
+    def test_single_add_updates_existing(self):
+        self.client.post(reverse('dairy:milk_add'), {
+            'animal': self.cows[0].pk, 'date': '2025-03-10',
+            'morning_liters': '3', 'evening_liters': '2', 'notes': '',
+        })
+        record = MilkProduction.objects.get(animal=self.cows[0], date=self.day)
+        self.assertEqual((record.total_liters, record.notes), (5, ''))
+
+
+class LactationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.today = date(2025, 6, 30)
+        self.calving = date(2025, 1, 1)
+        self.best = Animal.objects.create(animal_type='cow', tag_number='C1', gender='female')
+        self.other = Animal.objects.create(animal_type='cow', tag_number='C2', gender='female')
+        Pregnancy.objects.create(
+            animal=self.best, breeding_date=date(2024, 3, 25),
+            actual_delivery=self.calving, status='delivered',
+        )
+        # Wood's curve, recorded for the first 120 days
+        self.curve = {t: 20 * t ** 0.2 * math.exp(-0.004 * t) for t in range(1, 306)}
+        records = [
+            MilkProduction(
+                animal=self.best, date=self.calving + timedelta(days=t),
+                morning_liters=round(Decimal(self.curve[t] / 2), 2), evening_liters=round(Decimal(self.curve[t] / 2), 2),
+            )
+            for t in range(1, 121)
+        ]
+        # A previous lactation, then a dry gap: no calving recorded
+        records += [
+            MilkProduction(animal=self.other, date=date(2024, 6, 1) + timedelta(days=n), morning_liters=9)
+            for n in range(30)
+        ]
+        records += [
+            MilkProduction(animal=self.other, date=date(2025, 5, 1) + timedelta(days=n), morning_liters=5)
+            for n in range(3)
+        ]
+        MilkProduction.objects.bulk_create(records)
+
+    def test_metrics(self):
+        with self.assertNumQueries(2):
+            metrics = lactation.compute(self.today)
+        best = metrics[self.best.pk]
+        self.assertEqual(best['lactation_start'], self.calving)
+        self.assertEqual(best['days_in_milk'], 180)
+        # Rounded to 0.01L the top of the curve is flat for a few days
+        self.assertAlmostEqual(best['peak_day'], 50, delta=5)
+        self.assertAlmostEqual(best['peak_yield'], max(self.curve.values()), delta=0.1)
+        self.assertTrue(best['fitted'])
+        self.assertAlmostEqual(best['projected_305'], sum(self.curve.values()), delta=50)
+        self.assertEqual(best['percentile'], 100)
+
+        other = metrics[self.other.pk]
+        self.assertEqual(other['lactation_start'], date(2025, 5, 1))
+        self.assertEqual((other['peak_yield'], other['persistency']), (5, 100))
+        self.assertFalse(other['fitted'])
+        # Too few days to fit: the recent average fills days 3-305
+        self.assertEqual(other['projected_305'], 15 + 5 * 303)
+        self.assertEqual(other['percentile'], 50)
+
+    def test_cached_until_milk_changes(self):
+        first = lactation.animal_metrics(self.other.pk, self.today)
+        with self.assertNumQueries(0):
+            self.assertEqual(lactation.animal_metrics(self.other.pk, self.today), first)
+        MilkProduction.objects.create(animal=self.other, date=date(2025, 5, 4), morning_liters=8)
+        self.assertEqual(lactation.animal_metrics(self.other.pk, self.today)['peak_yield'], 8)
+
+    def test_views(self):
+        user = get_user_model().objects.create_user('farmer', password='pass')
+        self.client.force_login(user)
+        response = self.client.get(reverse('dairy:lactation_ranking'))
+        self.assertEqual([c.tag_number for c in response.context['cows']], ['C1', 'C2'])
+        response = self.client.get(reverse('dairy:animal_detail', args=[self.best.pk]))
+        self.assertEqual(response.context['lactation']['lactation_start'], self.calving)
+
+
+class AnomalyTests(TestCase):
+    def setUp(self):
+        self.cows = [
+            Animal.objects.create(animal_type='cow', tag_number=f'C{n}', gender='female')
+            for n in range(3)
+        ]
+        self.start = date(2025, 3, 1)
+        records = []
+        for n in range(40):
+            day = self.start + timedelta(days=n)
+            records.append(MilkProduction(animal=self.cows[0], date=day, morning_liters=10 + n % 3))
+            # Drops to half on day 30
+            records.append(MilkProduction(
+                animal=self.cows[1], date=day, morning_liters=6 if n == 30 else 12 + n % 2,
+            ))
+        # Too little history for a baseline
+        records.append(MilkProduction(animal=self.cows[2], date=self.start, morning_liters=1))
+        MilkProduction.objects.bulk_create(records)
+
+    def test_flags_drop_once_and_runs_incrementally(self):
+        run = anomalies.scan(self.start + timedelta(days=39))
+        self.assertEqual((run.records, run.flagged), (2 * 26, 1))
+        alert = MilkAlert.objects.get()
+        self.assertEqual((alert.animal, alert.date), (self.cows[1], self.start + timedelta(days=30)))
+        self.assertEqual(alert.baseline, Decimal('12.5'))
+        self.assertLess(alert.z_score, -3)
+
+        # Next night only the re-scanned days and the new one are scored
+        MilkProduction.objects.create(animal=self.cows[0], date=self.start + timedelta(days=40), morning_liters=2)
+        alert.resolved = True
+        alert.save()
+        run = anomalies.scan(self.start + timedelta(days=40))
+        self.assertEqual((run.records, run.flagged), (anomalies.RESCAN_DAYS * 2 + 1, 1))
+        self.assertEqual(MilkAlert.objects.count(), 2)
+        self.assertTrue(MilkAlert.objects.get(animal=self.cows[1]).resolved)
+
+    def test_command_and_dashboard(self):
+        out = StringIO()
+        call_command('detect_milk_anomalies', '--through', '2025-04-09', stdout=out)
+        self.assertIn('1 flagged', out.getvalue())
+
+        user = get_user_model().objects.create_user('farmer', password='pass')
+        self.client.force_login(user)
+        with mock.patch('django.utils.timezone.localdate', return_value=date(2025, 4, 3)):
+            response = self.client.get(reverse('dashboard:home'))
+        self.assertEqual([a.animal for a in response.context['milk_drops']], [self.cows[1]])
+
+
+class PedigreeTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        # S and D are full siblings (parents A, B); H is a half sibling via A
+        for tag, mother, father in [
+            ('A', '', ''), ('B', '', ''), ('C', '', ''),
+            ('S', 'B', 'A'), ('D', 'B', 'A'), ('H', 'C', 'A'),
+            ('X', 'D', 'S'), ('Y', 'H', 'S'),
+        ]:
+            Animal.objects.create(
+                animal_type='cow', tag_number=tag, gender='female',
+                mother_tag=mother, father_tag=f' {father} ' if father else '',
+            )
+
+    def test_relationships(self):
+        lineage = pedigree.pedigree()
+        self.assertEqual(lineage.inbreeding('S'), 0)
+        self.assertEqual(lineage.inbreeding('X'), 0.25)
+        self.assertEqual(lineage.inbreeding('Y'), 0.125)
+        self.assertEqual(lineage.relationship('S', 'D'), 0.5)
+        self.assertEqual(lineage.ancestors('X'), {'D': 1, 'S': 1, 'A': 2, 'B': 2})
+        self.assertEqual(lineage.descendants('A', generations=1), {'S': 1, 'D': 1, 'H': 1})
+
+        check = lineage.mating_check('D', 'S')
+        self.assertEqual((check['inbreeding'], check['verdict']), (0.25, 'avoid'))
+        self.assertEqual([row[0] for row in check['common_ancestors']], ['A', 'B'])
+        self.assertEqual(lineage.mating_check('H', 'C')['verdict'], 'avoid')
+        self.assertEqual(lineage.mating_check('D', 'AI-BULL-7')['verdict'], 'ok')
+
+    def test_padded_tags(self):
+        # Tags straight off an Animal or a form may carry stray spaces
+        lineage = pedigree.pedigree()
+        self.assertEqual(lineage.inbreeding(' X '), 0.25)
+        self.assertEqual(lineage.ancestors('X ', generations=1), {'D': 1, 'S': 1})
+        self.assertEqual(lineage.descendants(' A', generations=1), {'S': 1, 'D': 1, 'H': 1})
+        check = lineage.mating_check(' D', 'S ')
+        self.assertEqual((check['inbreeding'], check['verdict']), (0.25, 'avoid'))
+        self.assertEqual([row[0] for row in check['common_ancestors']], ['A', 'B'])
+        self.assertIn(' H ', lineage)
+
+    def test_index_cached_until_animal_saved(self):
+        first = pedigree.pedigree()
+        with self.assertNumQueries(0):
+            self.assertIs(pedigree.pedigree(), first)
+        Animal.objects.create(animal_type='cow', tag_number='Z', gender='male', mother_tag='X', father_tag='S')
+        self.assertGreater(pedigree.pedigree().inbreeding('Z'), 0.25)
+
+    def test_large_registry(self):
+        # 2,000 animals over 20 generations of close matings
+        rows = [('G0-0', '', ''), ('G0-1', '', '')]
+        for generation in range(1, 20):
+            for n in range(100):
+                rows.append((
+                    f'G{generation}-{n}',
+                    f'G{generation - 1}-{n}',
+                    f'G{generation - 1}-{(n + 1) % (100 if generation > 1 else 2)}',
+                ))
+        lineage = pedigree.Pedigree(rows)
+        started = time.monotonic()
+        values = [lineage.inbreeding(f'G19-{n}') for n in range(100)]
+        self.assertLess(time.monotonic() - started, 1)
+        self.assertTrue(all(0 <= f < 1 for f in values))
+
+    def test_pregnancy_form_check(self):
+        user = get_user_model().objects.create_user('farmer', password='pass')
+        self.client.force_login(user)
+        cow = Animal.objects.get(tag_number='D')
+        response = self.client.get(reverse('dairy:pregnancy_add', args=[cow.pk]), {'bull_tag': 'S'})
+        self.assertEqual(response.context['mating']['verdict'], 'avoid')
+        response = self.client.get(reverse('dairy:animal_detail', args=[Animal.objects.get(tag_number='X').pk]))
+        self.assertEqual(response.context['inbreeding_percent'], 25)
+
+
+class AnimalAgeQueryTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        today = date.today()
+        animals = []
+        for n, days in enumerate(range(0, 1000, 13)):
+            for animal_type in ('cow', 'sheep'):
+                animals.append(Animal(
+                    animal_type=animal_type, tag_number=f'{animal_type}-{n}', gender='female',
+                    date_of_birth=today - timedelta(days=days),
+                ))
+        animals.append(Animal(animal_type='cow', tag_number='unknown', gender='female'))
+        Animal.objects.bulk_create(animals)
+
+    def test_matches_python_methods(self):
+        animals = list(Animal.objects.with_age())
+        for animal in animals:
+            self.assertEqual(animal.age_months, animal.age_in_months(), animal.date_of_birth)
+            if animal.date_of_birth:
+                self.assertEqual(animal.mature, animal.is_mature(), animal.date_of_birth)
+            else:
+                self.assertIsNone(animal.mature)
+
+        mature = set(Animal.objects.mature().values_list('tag_number', flat=True))
+        self.assertEqual(mature, {a.tag_number for a in animals if a.is_mature()})
+        immature = set(Animal.objects.immature().values_list('tag_number', flat=True))
+        self.assertEqual(immature, {a.tag_number for a in animals if a.date_of_birth and not a.is_mature()})
+
+        between = set(Animal.objects.age_between(6, 12).values_list('tag_number', flat=True))
+        self.assertEqual(between, {
+            a.tag_number for a in animals if a.date_of_birth and 6 <= a.age_in_months() <= 12
+        })
+
+    def test_born_between(self):
+        start, end = date.today() - timedelta(days=100), date.today() - timedelta(days=50)
+        self.assertEqual(
+            Animal.objects.born_between(start, end).count(),
+            sum(1 for a in Animal.objects.all() if a.date_of_birth and start <= a.date_of_birth <= end),
+        )
+
+    def test_list_filters_and_pages(self):
+        user = get_user_model().objects.create_user('farmer', password='pass')
+        self.client.force_login(user)
+        url = reverse('dairy:animal_list')
+        response = self.client.get(url, {'type': 'cow', 'maturity': 'mature'})
+        expected = Animal.objects.filter(animal_type='cow').mature().count()
+        self.assertEqual(response.context['page'].paginator.count, expected)
+        self.assertTrue(all(a.mature for a in response.context['animals']))
+
+        # Past the end falls back to the last page
+        response = self.client.get(url, {'page': 99})
+        self.assertEqual(len(response.context['animals']), Animal.objects.count() % 50)
+        self.assertIn('status=active', response.context['query'])
+
+        response = self.client.get(url, {'min_age': 'x', 'max_age': 2})
+        self.assertIn('min_age', response.context['form'].errors)
+        self.assertTrue(all(a.age_months <= 2 for a in response.context['animals']))
+
+
+def photo_upload(size=(2000, 1500), orientation=None):
+    """A JPEG upload carrying EXIF like a phone photo"""
+    exif = Image.Exif()
+    exif[0x010F] = 'PhoneMaker'
+    if orientation:
+        exif[0x0112] = orientation
+    buffer = io.BytesIO()
+    Image.new('RGB', size, (120, 160, 90)).save(buffer, 'JPEG', exif=exif)
+    return SimpleUploadedFile('cow.jpg', buffer.getvalue(), content_type='image/jpeg')
+
+
+class ThumbnailTests(TestCase):
+    def setUp(self):
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media, ignore_errors=True)
+        settings = override_settings(MEDIA_ROOT=media)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def open(self, name):
+        from django.core.files.storage import default_storage
+        with default_storage.open(name, 'rb') as f:
+            image = Image.open(f)
+            image.load()
+        return image
+
+    def test_render_sizes_and_strips_exif(self):
+        animal = Animal.objects.create(animal_type='cow', tag_number='C1', gender='female')
+        # Rotated 90 degrees: the stored pixels are landscape, the photo portrait
+        animal.photo = photo_upload(orientation=6)
+        animal.save()
+
+        variants = thumbnails.render(animal.photo.name)
+        self.assertEqual([v['width'] for v in variants], list(thumbnails.WIDTHS))
+        for variant in variants:
+            for extension, format in (('webp', 'WEBP'), ('jpeg', 'JPEG')):
+                image = self.open(variant[extension])
+                self.assertEqual(image.format, format)
+                self.assertEqual(image.width, variant['width'])
+                self.assertEqual(image.height, round(variant['width'] * 2000 / 1500))
+                self.assertEqual(len(image.getexif()), 0)
+
+        small = Animal.objects.create(
+            animal_type='cow', tag_number='C2', gender='female', photo=photo_upload(size=(500, 400)),
+        )
+        self.assertEqual([v['width'] for v in thumbnails.render(small.photo.name)], [320])
+
+    def test_upload_schedules_after_commit(self):
+        user = get_user_model().objects.create_user('farmer', password='pass')
+        self.client.force_login(user)
+        with mock.patch.object(thumbnails, 'executor') as executor:
+            with self.captureOnCommitCallbacks(execute=True) as callbacks:
+                self.client.post(reverse('dairy:animal_add'), {
+                    'animal_type': 'cow', 'tag_number': 'C3', 'gender': 'female',
+                    'acquisition_cost': 0, 'photo': photo_upload(),
+                })
+        self.assertEqual(len(callbacks), 1)
+        animal = Animal.objects.get(tag_number='C3')
+        executor().submit.assert_called_once_with(thumbnails._background, animal.pk, animal.photo.name, None)
+        self.assertEqual(animal.photo_variants, [])
+
+        # Run the job here, as the pool would
+        thumbnails.generate(animal.pk, animal.photo.name)
+        animal.refresh_from_db()
+        self.assertEqual(len(animal.photo_variants), len(thumbnails.WIDTHS))
+        self.assertIn(' 320w', animal.photo_srcset_webp)
+        self.assertTrue(animal.photo_thumbnail_url.endswith('-320.jpeg'))
+
+        # A replacement photo clears the variants and hands the old ones to the job
+        old = animal.photo_variants
+        with mock.patch.object(thumbnails, 'executor') as executor:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.client.post(reverse('dairy:animal_edit', args=[animal.pk]), {
+                    'tag_number': 'C3', 'gender': 'female', 'status': 'active', 'photo': photo_upload(),
+                })
+        animal.refresh_from_db()
+        self.assertEqual(animal.photo_variants, [])
+        executor().submit.assert_called_once_with(thumbnails._background, animal.pk, animal.photo.name, old)
+
+    def test_stale_render_is_discarded(self):
+        animal = Animal.objects.create(
+            animal_type='cow', tag_number='C4', gender='female', photo=photo_upload(size=(400, 300)),
+        )
+        variants = thumbnails.render(animal.photo.name)
+        self.assertFalse(thumbnails.store(animal.pk, 'animals/replaced.jpg', variants))
+        from django.core.files.storage import default_storage
+        self.assertFalse(default_storage.exists(variants[0]['jpeg']))
+
+    def test_backfill_command(self):
+        for n in range(3):
+            Animal.objects.create(
+                animal_type='cow', tag_number=f'B{n}', gender='female', photo=photo_upload(size=(700, 500)),
+            )
+        Animal.objects.create(animal_type='cow', tag_number='none', gender='female')
+        out = StringIO()
+        call_command('generate_thumbnails', '--workers', 2, stdout=out)
+        self.assertIn('Created thumbnails for 3 photo(s), 0 failed', out.getvalue())
+        self.assertTrue(all(
+            [v['width'] for v in a.photo_variants] == [320, 640]
+            for a in Animal.objects.exclude(tag_number='none')
+        ))
+
+        out = StringIO()
+        call_command('generate_thumbnails', stdout=out)
+        self.assertIn('for 0 photo(s)', out.getvalue())
+
+
+class HealthScheduleTests(TestCase):
+    def setUp(self):
+        self.today = date(2025, 3, 10)
+        patcher = mock.patch('dairy.health.timezone.localdate', return_value=self.today)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.cow = Animal.objects.create(
+            animal_type='cow', tag_number='C1', gender='female', date_of_birth=date(2020, 1, 1),
+        )
+        self.calf = Animal.objects.create(
+            animal_type='cow', tag_number='C2', gender='female', date_of_birth=date(2025, 1, 15),
+        )
+        self.sheep = Animal.objects.create(animal_type='sheep', tag_number='S1', gender='female')
+        self.fmd = HealthProtocol.objects.create(
+            name='FMD vaccine', animal_type='cow', keyword='fmd', interval_months=6,
+            min_age_months=4, start_date=date(2025, 1, 1),
+        )
+
+    def due(self, animal, **filters):
+        return list(
+            HealthEvent.objects.filter(animal=animal, status='open', **filters)
+            .values_list('due_date', flat=True)
+        )
+
+    def test_protocol_expands_per_animal(self):
+        # Never treated: due from the start date, or once old enough
+        self.assertEqual(self.due(self.cow), [date(2025, 1, 1), date(2025, 7, 1), date(2026, 1, 1)])
+        self.assertEqual(self.due(self.calf), [date(2025, 5, 15), date(2025, 11, 15)])
+        self.assertEqual(self.due(self.sheep), [])
+
+        # Long overdue: only the first missed date, then on at its cadence
+        HealthRecord.objects.create(
+            animal=self.cow, record_type='vaccination', date=date(2023, 2, 1), description='FMD booster',
+        )
+        self.assertEqual(self.due(self.cow), [date(2023, 8, 1), date(2025, 8, 1), date(2026, 2, 1)])
+
+    def test_start_date_defaults_to_today(self):
+        # Planned straight away on save, which needs a date, not a datetime
+        protocol = HealthProtocol.objects.create(name='Deworming', animal_type='cow', interval_months=3)
+        self.assertEqual(type(protocol.start_date), date)
+        self.assertEqual(type(HealthCampaign().date), date)
+
+    def test_matching_record_closes_and_advances(self):
+        record = HealthRecord.objects.create(
+            animal=self.cow, record_type='vaccination', date=date(2025, 3, 5), description='fmd shot',
+        )
+        done = HealthEvent.objects.get(animal=self.cow, status='done')
+        self.assertEqual((done.due_date, done.completed_by), (date(2025, 1, 1), record))
+        self.assertEqual(self.due(self.cow), [date(2025, 9, 5), date(2026, 3, 5)])
+
+        # Other treatments leave the schedule alone
+        HealthRecord.objects.create(
+            animal=self.cow, record_type='vaccination', date=date(2025, 3, 6), description='Anthrax',
+        )
+        self.assertEqual(self.due(self.cow), [date(2025, 9, 5), date(2026, 3, 5)])
+
+        # Deleting the record reopens the schedule
+        record.delete()
+        self.assertEqual(self.due(self.cow)[0], date(2025, 1, 1))
+
+        self.cow.status = 'sold'
+        self.cow.save()
+        self.assertEqual(self.due(self.cow), [])
+
+    def test_next_due_date_reminders(self):
+        HealthRecord.objects.create(
+            animal=self.sheep, record_type='treatment', date=date(2025, 3, 1),
+            description='Foot rot', next_due_date=date(2025, 3, 14),
+        )
+        self.assertEqual(self.due(self.sheep), [date(2025, 3, 14)])
+        # The follow-up supersedes the earlier reminder
+        HealthRecord.objects.create(
+            animal=self.sheep, record_type='treatment', date=date(2025, 3, 14),
+            description='Foot rot check', next_due_date=date(2025, 4, 1),
+        )
+        self.assertEqual(self.due(self.sheep), [date(2025, 4, 1)])
+        self.assertEqual(
+            [e.animal for e in health.due_soon(self.today, days=7)],
+            [self.cow],
+        )
+        self.assertTrue(health.due_soon(self.today).first().is_overdue())
+        self.assertFalse(HealthEvent.objects.get(animal=self.sheep, status='open').is_overdue())
+
+        # Deleting the follow-up drops its reminder and reopens the one it closed
+        HealthRecord.objects.get(description='Foot rot check').delete()
+        self.assertEqual(self.due(self.sheep), [date(2025, 3, 14)])
+
+    def test_herd_calendar_in_one_pass(self):
+        Animal.objects.bulk_create([
+            Animal(animal_type='cow', tag_number=f'H{n}', gender='female', date_of_birth=date(2022, 1, 1))
+            for n in range(1000)
+        ])
+        HealthProtocol.objects.bulk_create([
+            HealthProtocol(
+                name='Deworming', animal_type='cow', record_type='treatment', interval_months=3,
+                start_date=date(2025, 1, 1),
+            ),
+        ])
+        with CaptureQueriesContext(connection) as captured:
+            count = health.materialize()
+        # Protocols, animals, one aggregate per protocol and the stale events;
+        # nothing per animal besides the batched INSERTs
+        selects = [q for q in captured.captured_queries if q['sql'].startswith('SELECT')]
+        self.assertEqual(len(selects), 5)
+        self.assertEqual(count, HealthEvent.objects.filter(status='open').count())
+        self.assertEqual(HealthEvent.objects.filter(animal__tag_number='H1').count(), 3 + 5)
+
+        out = StringIO()
+        call_command('schedule_health', '--months', 6, stdout=out)
+        self.assertIn('Scheduled', out.getvalue())
+
+    def test_calendar_page(self):
+        user = get_user_model().objects.create_user('farmer', password='pass')
+        self.client.force_login(user)
+        with mock.patch('dairy.views.timezone.localdate', return_value=self.today):
+            response = self.client.get(reverse('dairy:health_calendar'), {'month': '2025-05'})
+        self.assertEqual(response.context['overdue_count'], 1)
+        self.assertEqual([e.animal for e in response.context['events']], [self.calf])
+
+
+class HealthCampaignTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user('farmer', password='pass')
+        today = date.today()
+        Animal.objects.bulk_create(
+            [
+                Animal(animal_type='cow', tag_number=f'C{n:03}', gender='female',
+                       date_of_birth=today - timedelta(days=400 + n))
+                for n in range(300)
+            ]
+            + [Animal(animal_type='cow', tag_number='SOLD', gender='female', status='sold')]
+            + [Animal(animal_type='sheep', tag_number=f'S{n}', gender='female') for n in range(5)]
+        )
+
+    def setUp(self):
+        self.client.force_login(self.user)
+        self.url = reverse('dairy:health_campaign_add')
+
+    def test_split_cost(self):
+        self.assertEqual(split_cost(Decimal('100'), 3), [Decimal('33.34'), Decimal('33.33'), Decimal('33.33')])
+        self.assertEqual(sum(split_cost(Decimal('1000'), 7)), Decimal('1000'))
+        self.assertEqual(split_cost(Decimal('50'), 2, 'each'), [Decimal('50'), Decimal('50')])
+
+    def test_whole_herd_in_one_request(self):
+        HealthProtocol.objects.create(
+            name='FMD', animal_type='cow', keyword='fmd', interval_months=6, start_date=date.today(),
+        )
+        statements = Counter()
+        
+        def count(execute, sql, params, many, context):
+            statements[sql.split(' WHERE ')[0].split(' VALUES ')[0]] += 1
+            return execute(sql, params, many, context)
+        
+        with connection.execute_wrapper(count):
+            response = self.client.post(self.url, {
+                'type': 'cow', 'record_type': 'vaccination', 'date': date.today(),
+                'description': 'FMD vaccine', 'cost': '10000', 'cost_split': 'total',
+            })
+        self.assertRedirects(response, reverse('dairy:health_calendar'))
+        # Nothing is read per animal; only the bulk writes repeat, in
+        # batches (SQLite caps the rows per statement)
+        batched = (
+            'INSERT INTO "dairy_healthrecord"', 'INSERT INTO "dairy_healthevent"', 'DELETE FROM "dairy_healthevent"',
+            'SAVEPOINT', 'RELEASE SAVEPOINT',
+        )
+        self.assertTrue(all(
+            n <= 3 for sql, n in statements.items() if sql.startswith('SELECT')
+        ), statements)
+        self.assertLess(sum(n for sql, n in statements.items() if not sql.startswith(batched)), 32)
+
+        campaign = HealthCampaign.objects.get()
+        self.assertEqual((campaign.animal_count, campaign.total_cost), (300, Decimal('10000')))
+        self.assertEqual(campaign.records.count(), 300)
+        self.assertEqual(sum(campaign.records.values_list('cost', flat=True)), Decimal('10000'))
+        # One aggregated expense; the records themselves post nothing
+        posted = Transaction.objects.get()
+        self.assertEqual((posted.source_type, posted.amount), ('health_campaign', Decimal('10000')))
+
+        # The protocol's due events were closed and moved on
+        self.assertEqual(HealthEvent.objects.filter(status='done').count(), 300)
+        self.assertEqual(
+            HealthEvent.objects.filter(status='open', animal__tag_number='C000').first().due_date,
+            date.today() + relativedelta(months=6),
+        )
+
+    def test_tags_and_age(self):
+        response = self.client.post(self.url, {
+            'tags': 'C001, C002\nS1 NOPE', 'min_age': 13, 'record_type': 'treatment',
+            'date': date.today(), 'description': 'Deworming', 'cost': '150', 'cost_split': 'each',
+            'next_due_date': date.today() + timedelta(days=90),
+        }, follow=True)
+        campaign = HealthCampaign.objects.get()
+        # S1 has no birth date, so the age filter leaves it out
+        self.assertEqual(
+            sorted(campaign.records.values_list('animal__tag_number', flat=True)), ['C001', 'C002'],
+        )
+        self.assertEqual(campaign.total_cost, Decimal('300'))
+        self.assertContains(response, 'Not matched: NOPE, S1')
+        self.assertEqual(HealthEvent.objects.filter(status='open', source__campaign=campaign).count(), 2)
+
+    def test_invalid_and_empty_selection(self):
+        response = self.client.post(self.url, {
+            'record_type': 'vaccination', 'date': date.today(), 'description': 'x',
+            'cost_split': 'total', 'tags': 'NOPE',
+        })
+        self.assertContains(response, 'No animals match the selection.')
+        response = self.client.post(self.url, {'record_type': 'vaccination', 'cost_split': 'total'})
+        self.assertTrue(response.context['form'].errors)
+        self.assertFalse(HealthCampaign.objects.exists())
+
+
+class BreedingCalendarTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user('farmer', password='pass')
+        cls.open_cow = Animal.objects.create(animal_type='cow', tag_number='OPEN', gender='female')
+        cls.bred_cow = Animal.objects.create(animal_type='cow', tag_number='BRED', gender='female')
+        cls.ewe = Animal.objects.create(animal_type='sheep', tag_number='EWE', gender='female')
+        Pregnancy.objects.create(animal=cls.open_cow, breeding_date=date(2025, 3, 1), status='failed')
+        Pregnancy.objects.create(animal=cls.bred_cow, breeding_date=date(2025, 3, 5))
+        Pregnancy.objects.create(
+            animal=cls.ewe, breeding_date=date(2024, 8, 1), status='delivered',
+            actual_delivery=date(2025, 1, 10),
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def test_bulk_create_sets_expected_delivery_in_one_lookup(self):
+        self.assertNotIn(date(2025, 5, 31), breeding.month_events(2025, 5))
+        lactation_version = app_versions([lactation.CACHE_LABEL])
+        pregnancies = [
+            Pregnancy(animal_id=animal.pk, breeding_date=date(2025, 1, 1))
+            for animal in (self.open_cow, self.ewe) * 20
+        ]
+        # One query for the animal types, one INSERT
+        with self.assertNumQueries(2):
+            Pregnancy.objects.bulk_create(pregnancies)
+        self.assertEqual(
+            {p.animal_id: p.expected_delivery for p in pregnancies},
+            {self.open_cow.pk: date(2025, 10, 11), self.ewe.pk: date(2025, 5, 31)},
+        )
+        # The signals are skipped, so the caches are invalidated directly
+        self.assertEqual(
+            breeding.month_events(2025, 5).get(date(2025, 5, 31)),
+            [('delivery', self.ewe.pk, 'EWE', '')],
+        )
+        self.assertNotEqual(app_versions([lactation.CACHE_LABEL]), lactation_version)
+        # A loaded animal needs no lookup at all
+        with self.assertNumQueries(1):
+            Pregnancy.objects.bulk_create([Pregnancy(animal=self.ewe, breeding_date=date(2025, 2, 1))])
+
+    def test_form_dates_are_parsed(self):
+        self.client.force_login(self.user)
+        self.client.post(reverse('dairy:pregnancy_add', args=[self.bred_cow.pk]), {'breeding_date': '2025-06-01'})
+        self.assertEqual(
+            Pregnancy.objects.get(animal=self.bred_cow, breeding_date=date(2025, 6, 1)).expected_delivery,
+            date(2026, 3, 11),
+        )
+
+    def test_events(self):
+        events = {
+            (day, kind, p.animal.tag_number)
+            for day, kind, p in breeding.events_between(date(2025, 3, 1), date(2025, 12, 31))
+        }
+        # Failed breeding: back in heat every 21 days
+        self.assertIn((date(2025, 3, 22), 'heat', 'OPEN'), events)
+        self.assertIn((date(2025, 4, 12), 'heat', 'OPEN'), events)
+        # Bred, not confirmed: watch for a return, then dry off and calve
+        self.assertIn((date(2025, 3, 26), 'return', 'BRED'), events)
+        self.assertIn((date(2025, 12, 13), 'delivery', 'BRED'), events)
+        self.assertIn((date(2025, 10, 14), 'dry_off', 'BRED'), events)
+        self.assertFalse({e for e in events if e[2] == 'BRED' and e[1] == 'heat'})
+        # Lambed on 10 Jan: heats from 14 Feb (35 days later), every 17 days
+        self.assertIn((date(2025, 3, 3), 'heat', 'EWE'), events)
+        self.assertIn((date(2025, 3, 20), 'heat', 'EWE'), events)
+        self.assertEqual(
+            breeding.next_heat(self.ewe.pregnancies.get(), date(2025, 3, 8)), date(2025, 3, 20),
+        )
+
+    def test_month_view_is_one_query_and_cached(self):
+        self.client.force_login(self.user)
+        url = reverse('dairy:breeding_calendar')
+        # Session, user and the pregnancies joined to their animals
+        with self.assertNumQueries(3):
+            response = self.client.get(url, {'month': '2025-03'})
+        days = {day['date']: day['events'] for week in response.context['weeks'] for day in week}
+        self.assertEqual([e['tag'] for e in days[date(2025, 3, 22)]], ['OPEN'])
+        with self.assertNumQueries(2):
+            self.client.get(url, {'month': '2025-03'})
+
+        Pregnancy.objects.filter(animal=self.open_cow).get().delete()
+        response = self.client.get(url, {'month': '2025-03'})
+        days = {day['date']: day['events'] for week in response.context['weeks'] for day in week}
+        self.assertEqual(days[date(2025, 3, 22)], [])
+
+
+class FeedCostTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user('farmer', password='pass')
+        joined = date(2025, 1, 1)
+        cls.high = Animal.objects.create(animal_type='cow', tag_number='HIGH', gender='female', date_acquired=joined)
+        cls.low = Animal.objects.create(animal_type='cow', tag_number='LOW', gender='female', date_acquired=joined)
+        Animal.objects.create(animal_type='sheep', tag_number='EWE', gender='female', date_acquired=joined)
+        # Hay bought on 1 and 11 March: 30/day for ten days, then 10/day
+        FeedRecord.objects.create(date=date(2025, 3, 1), feed_type='Hay', quantity_kg=600, cost=300)
+        FeedRecord.objects.create(date=date(2025, 3, 11), feed_type=' hay', quantity_kg=300, cost=300)
+        MilkProduction.objects.bulk_create(
+            MilkProduction(animal=cow, date=date(2025, 3, day), morning_liters=liters, evening_liters=liters)
+            for day in range(1, 11)
+            for cow, liters in ((cls.high, 5), (cls.low, Decimal('2.5')))
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def test_shared_by_animal_days(self):
+        costs = feed.allocate(date(2025, 3, 1), date(2025, 3, 10))
+        self.assertEqual((costs['feed_cost'], costs['feed_kg'], costs['liters']), (300, 600, 150))
+        self.assertEqual(costs['cost_per_liter'], 2.0)
+        self.assertEqual(
+            costs['days'][0],
+            {'date': date(2025, 3, 1), 'feed_cost': 30, 'feed_kg': 60, 'liters': 15, 'animals': 3,
+             'cost_per_liter': 2.0},
+        )
+        # The ewe eats a third of the feed but gives no milk
+        self.assertEqual(
+            [(a['tag_number'], a['feed_cost'], a['cost_per_liter']) for a in costs['animals']],
+            [('HIGH', 100, 1.0), ('LOW', 100, 2.0)],
+        )
+
+    def test_weighted_by_intake(self):
+        costs = feed.allocate(date(2025, 3, 1), date(2025, 3, 10), weighted=True)
+        # Cows in milk weigh 1, the ewe 0.1
+        self.assertEqual(
+            [(a['tag_number'], a['feed_cost'], a['cost_per_liter']) for a in costs['animals']],
+            [('HIGH', 142.86, 1.43), ('LOW', 142.86, 2.86)],
+        )
+        self.assertEqual(costs['cost_per_liter'], 2.0)
+
+    def test_spans_cross_months(self):
+        today = date(2025, 4, 15)
+        march = feed.month_costs(2025, 3, today=today)
+        april = feed.month_costs(2025, 4, today=today)
+        self.assertEqual(march['feed_cost'], 300 + 21 * 10)
+        self.assertEqual((april['start'], april['end'], april['feed_cost']), (date(2025, 4, 1), today, 90))
+        self.assertIsNone(april['cost_per_liter'])
+
+    def test_sold_animals_count_until_last_milked(self):
+        sold = Animal.objects.create(
+            animal_type='cow', tag_number='SOLD', gender='female', status='sold', date_acquired=date(2025, 1, 1),
+        )
+        MilkProduction.objects.create(animal=sold, date=date(2025, 3, 5), morning_liters=4)
+        # Milk, active herd, the sold cow, feed
+        with self.assertNumQueries(4):
+            costs = feed.allocate(date(2025, 3, 1), date(2025, 3, 10))
+        self.assertEqual([day['animals'] for day in costs['days'][:6]], [4, 4, 4, 4, 4, 3])
+        self.assertEqual(costs['feed_cost'], 300)
+
+    def test_month_cached_until_feed_changes(self):
+        today = date(2025, 4, 15)
+        with self.assertNumQueries(3):
+            feed.month_costs(2025, 3, today=today)
+        with self.assertNumQueries(0):
+            feed.month_costs(2025, 3, today=today)
+        FeedRecord.objects.create(date=date(2025, 3, 31), feed_type='Maize bran', quantity_kg=70, cost=70)
+        self.assertEqual(feed.month_costs(2025, 3, today=today)['feed_cost'], 512.33)
+
+    def test_view(self):
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('dairy:feed_costs'), {'month': '2025-03', 'weighted': '1'})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.context['costs']['weighted'])
+        self.assertContains(response, 'HIGH')
+        # Future months show the current one
+        response = self.client.get(reverse('dairy:feed_costs'), {'month': '2999-01'})
+        self.assertEqual(response.context['month'], timezone.localdate().replace(day=1))
+        self.assertIsNone(response.context['next_month'])
@@ -0,0 +1,135 @@
+"""
+Resized copies of Animal.photo for phones on slow connections.
+
+Each upload is rendered at every width in WIDTHS (never wider than the
+original) as WebP and JPEG. Orientation from the EXIF data is applied
+to the pixels and the EXIF block itself (GPS position, camera details)
+is not written to the copies. JPEGs are decoded at reduced scale with
+draft(), so a 12 MP phone photo never has to be expanded in full.
+
+Rendering runs on a small thread pool after the saving transaction
+commits, so the upload request returns straight away; Pillow releases
+the GIL while decoding, resizing and encoding. Until the copies exist
+Animal.photo_variants is empty and templates fall back to the original.
+"""
+import io
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connection, transaction as db_transaction
+from PIL import Image, ImageOps
+
+from .models import Animal
+
+
+logger = logging.getLogger(__name__)
+
+WIDTHS = (320, 640, 1280)
+
+FORMATS = (
+    ('webp', 'WEBP', {'quality': 80, 'method': 4}),
+    ('jpeg', 'JPEG', {'quality': 82, 'optimize': True, 'progressive': True}),
+)
+
+UPLOAD_DIR = 'animals/variants'
+
+# Threads rendering uploads in the background
+WORKERS = 2
+
+_executor = None
+_lock = threading.Lock()
+
+
+def render(name, storage=default_storage):
+    """
+    Write the variants of the stored photo `name`.
+
+    Returns [{'width': ..., 'webp': path, 'jpeg': path}, ...] smallest
+    first. Touches only the storage, never the database.
+    """
+    with storage.open(name, 'rb') as f:
+        image = Image.open(f)
+        # JPEG decodes straight to the smallest scale still >= the largest width
+        image.draft('RGB', (max(WIDTHS), max(WIDTHS)))
+        image = ImageOps.exif_transpose(image)
+        if image.mode != 'RGB':
+            image = image.convert('RGB')
+
+    stem = os.path.splitext(os.path.basename(name))[0]
+    original_width, original_height = image.size
+    widths = [w for w in WIDTHS if w < original_width] or [original_width]
+    variants = []
+    # Largest first, each resized from the one before
+    for width in sorted(widths, reverse=True):
+        height = max(round(original_height * width / original_width), 1)
+        image = image.resize((width, height), Image.LANCZOS, reducing_gap=3.0)
+        variant = {'width': width}
+        for extension, format, options in FORMATS:
+            buffer = io.BytesIO()
+            image.save(buffer, format, exif=b'', **options)
+            path = f'{UPLOAD_DIR}/{stem}-{width}.{extension}'
+            variant[extension] = storage.save(path, ContentFile(buffer.getvalue()))
+        variants.append(variant)
+    return variants[::-1]
+
+
+def discard(variants, storage=default_storage):
+    """Delete the files of variants no longer in use"""
+    for variant in variants or []:
+        for extension, _format, _options in FORMATS:
+            if variant.get(extension):
+                storage.delete(variant[extension])
+
+
+def store(animal_id, name, variants):
+    """
+    Save `variants` on the animal if `name` is still its photo.
+
+    A photo replaced while it was being rendered keeps the newer upload's
+    variants; the stale files are deleted. Uses update() so the pedigree
+    and ledger signals don't fire for a thumbnail.
+    """
+    updated = Animal.objects.filter(pk=animal_id, photo=name).update(photo_variants=variants)
+    if not updated:
+        discard(variants)
+    return bool(updated)
+
+
+def generate(animal_id, name, stale=None):
+    """Render and store one photo's variants, deleting `stale` ones"""
+    discard(stale)
+    return store(animal_id, name, render(name))
+
+
+def _background(animal_id, name, stale):
+    try:
+        generate(animal_id, name, stale)
+    except Exception:
+        logger.exception('Could not create thumbnails for %s', name)
+    finally:
+        # The worker thread opened its own connection; don't leave it idle
+        connection.close()
+
+
+def executor():
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=WORKERS, thread_name_prefix='thumbnails')
+        return _executor
+
+
+def schedule(animal, stale=None):
+    """
+    Render `animal`'s photo in the background once the save commits.
+
+    `stale` are the variants of a photo it replaced, deleted by the job.
+    """
+    name = animal.photo.name
+    if not name:
+        return
+    db_transaction.on_commit(lambda: executor().submit(_background, animal.pk, name, stale))
@@ -1,23 +1,30 @@
+from django.conf import settings
 from django.urls import path
 from . import views
 
 app_name = 'dairy'
 
 urlpatterns = [
-    path('', views.dairy_home, name='home'),
+    path('', views.dairy_home_async if settings.ASYNC_HOME_VIEWS else views.dairy_home, name='home'),
     path('animals/', views.animal_list, name='animal_list'),
     path('animals/add/', views.animal_add, name='animal_add'),
     path('animals/<int:pk>/', views.animal_detail, name='animal_detail'),
     path('animals/<int:pk>/edit/', views.animal_edit, name='animal_edit'),
     
     path('milk/add/', views.milk_production_add, name='milk_add'),
+    path('milk/grid/', views.milk_grid, name='milk_grid'),
+    path('milk/lactation/', views.lactation_ranking, name='lactation_ranking'),
     path('milk/', views.milk_production_list, name='milk_list'),
     
     path('health/<int:animal_id>/add/', views.health_record_add, name='health_add'),
+    path('health/calendar/', views.health_calendar, name='health_calendar'),
+    path('health/herd/', views.health_campaign_add, name='health_campaign_add'),
     
+    path('breeding/', views.breeding_calendar, name='breeding_calendar'),
     path('pregnancy/<int:animal_id>/add/', views.pregnancy_add, name='pregnancy_add'),
     path('pregnancy/<int:pk>/update/', views.pregnancy_update, name='pregnancy_update'),
     
     path('feed/add/', views.feed_record_add, name='feed_add'),
     path('feed/', views.feed_record_list, name='feed_list'),
+    path('feed/costs/', views.feed_costs, name='feed_costs'),
 ]
\ No newline at end of file
@@ -1,64 +1,96 @@
 from django.shortcuts import render, redirect, get_object_or_404
+from django.urls import reverse
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
+from django.core.exceptions import ValidationError
+from django.core.paginator import Paginator
 from django.db.models import Sum, Count, Q
-from datetime import date, timedelta
-from .models import Animal, MilkProduction, HealthRecord, Pregnancy, FeedRecord
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+from asgiref.sync import sync_to_async
+import calendar
+from datetime import date, datetime, timedelta
+from .models import Animal, MilkProduction, HealthCampaign, HealthEvent, HealthRecord, Pregnancy, FeedRecord
+from .aggregates import herd_counts, milk_totals
+from .campaigns import record_campaign
+from .filters import AnimalFilterForm, AnimalSelectionForm, HealthCampaignForm
+from .health import due_soon
+from .milk import milking_cows, parse_grid, record_milk
+from .lactation import animal_metrics, herd_metrics
+from .pedigree import pedigree
+from . import breeding, feed, thumbnails
+from dashboard.cache import cache_home_page
+from dashboard.concurrency import agather_sections, async_login_required, gather_sections
 
 
-@login_required
-def dairy_home(request):
-    """Dairy management home - overview of all livestock"""
-    animals = Animal.objects.filter(status='active')
-    cows = animals.filter(animal_type='cow')
-    sheep = animals.filter(animal_type='sheep')
-    
-    # Get today's milk production
-    today = date.today()
-    today_milk = MilkProduction.objects.filter(date=today).aggregate(
-        total=Sum('morning_liters') + Sum('evening_liters')
-    )['total'] or 0
-    
-    # Upcoming health reminders
-    upcoming_health = HealthRecord.objects.filter(
-        next_due_date__lte=today + timedelta(days=7),
-        next_due_date__gte=today
-    ).select_related('animal')[:5]
+ANIMALS_PER_PAGE = 50
+
+
+def herd_section(today):
+    """Animal counts and today's milk production"""
+    herd = herd_counts()
+    return {
+        'total_cows': herd['cows'],
+        'total_sheep': herd['sheep'],
+        'total_animals': herd['total'],
+        'today_milk': milk_totals(today, days=0)['today'],
+    }
+
+
+def reminders_section(today):
+    """Upcoming health reminders and pregnancies due soon"""
+    upcoming_health = due_soon(today)[:5]
     
-    # Pregnancies due soon
     pregnancies_due = Pregnancy.objects.filter(
         expected_delivery__lte=today + timedelta(days=14),
         status__in=['bred', 'confirmed', 'due_soon']
     ).select_related('animal')
     
-    context = {
-        'total_cows': cows.count(),
-        'total_sheep': sheep.count(),
-        'total_animals': animals.count(),
-        'today_milk': today_milk,
-        'upcoming_health': upcoming_health,
-        'pregnancies_due': pregnancies_due,
+    return {
+        'upcoming_health': list(upcoming_health),
+        'pregnancies_due': list(pregnancies_due),
     }
+
+
+HOME_SECTIONS = [herd_section, reminders_section]
+
+
+@login_required
+@cache_home_page('dairy')
+def dairy_home(request):
+    """Dairy management home - overview of all livestock"""
+    context = gather_sections(HOME_SECTIONS, timezone.localdate())
     return render(request, 'dairy/home.html', context)
 
 
+@async_login_required
+@cache_home_page('dairy')
+async def dairy_home_async(request):
+    """Dairy home for ASGI - sections run concurrently"""
+    context = await agather_sections(HOME_SECTIONS, timezone.localdate())
+    return await sync_to_async(render)(request, 'dairy/home.html', context)
+
+
 @login_required
 def animal_list(request):
-    """List all animals with filters"""
-    animal_type = request.GET.get('type', '')
-    status = request.GET.get('status', 'active')
-    
-    animals = Animal.objects.all()
+    """List animals with filters, a page at a time"""
+    # Status defaults to active unless the filter form was submitted
+    query = request.GET.copy()
+    query.setdefault('status', 'active')
+    form = AnimalFilterForm(query)
+    animals = form.filter(Animal.objects.with_age())
     
-    if animal_type:
-        animals = animals.filter(animal_type=animal_type)
-    if status:
-        animals = animals.filter(status=status)
+    paginator = Paginator(animals, ANIMALS_PER_PAGE)
+    page = paginator.get_page(request.GET.get('page'))
+    query.pop('page', None)
     
     context = {
-        'animals': animals,
-        'selected_type': animal_type,
-        'selected_status': status,
+        'form': form,
+        'animals': page.object_list,
+        'page': page,
+        'query': query.urlencode(),
+        'selected_type': form.cleaned_data.get('type', ''),
+        'selected_status': form.cleaned_data.get('status', ''),
     }
     return render(request, 'dairy/animal_list.html', context)
 
@@ -84,6 +116,8 @@ def animal_add(request):
             animal.photo = request.FILES['photo']
         
         animal.save()
+        if animal.photo:
+            thumbnails.schedule(animal)
         messages.success(request, f'Animal {animal.tag_number} added successfully!')
         return redirect('dairy:animal_detail', pk=animal.pk)
     
@@ -97,11 +131,16 @@ def animal_detail(request, pk):
     
     # Recent milk production (last 7 days for cows)
     milk_records = []
+    lactation = None
     if animal.animal_type == 'cow' and animal.gender == 'female':
         milk_records = animal.milk_records.all()[:7]
+        lactation = animal_metrics(animal.pk)
     
     health_records = animal.health_records.all()[:10]
-    pregnancies = animal.pregnancies.all()[:5]
+    pregnancies = list(animal.pregnancies.all()[:5])
+    next_heat = None
+    if animal.gender == 'female' and pregnancies:
+        next_heat = breeding.next_heat(pregnancies[0], timezone.localdate())
     
     # Calculate total milk (last 30 days)
     thirty_days_ago = date.today() - timedelta(days=30)
@@ -111,14 +150,21 @@ def animal_detail(request, pk):
         total=Sum('morning_liters') + Sum('evening_liters')
     )['total'] or 0
     
+    lineage = pedigree()
+    
     context = {
         'animal': animal,
+        'inbreeding_percent': round(lineage.inbreeding(animal.tag_number) * 100, 2),
+        'ancestors': sorted(lineage.ancestors(animal.tag_number, generations=2).items(), key=lambda a: a[1]),
+        'offspring': sorted(lineage.descendants(animal.tag_number, generations=1)),
         'milk_records': milk_records,
         'health_records': health_records,
         'pregnancies': pregnancies,
+        'next_heat': next_heat,
         'total_milk_30d': total_milk_30d,
+        'lactation': lactation,
     }
-    return render(request, 'dairy/animal_detail.html', context)
+    return render(request, 'dairy/dairy_animal_detail.html', context)
 
 
 @login_required
@@ -137,10 +183,15 @@ def animal_edit(request, pk):
         animal.father_tag = request.POST.get('father_tag', '')
         animal.notes = request.POST.get('notes', '')
         
+        stale_variants = None
         if 'photo' in request.FILES:
             animal.photo = request.FILES['photo']
+            # The old photo's copies are deleted once the new ones are made
+            stale_variants, animal.photo_variants = animal.photo_variants, []
         
         animal.save()
+        if stale_variants is not None:
+            thumbnails.schedule(animal, stale=stale_variants)
         messages.success(request, f'Animal {animal.tag_number} updated successfully!')
         return redirect('dairy:animal_detail', pk=animal.pk)
     
@@ -155,41 +206,82 @@ def milk_production_add(request):
         animal_id = request.POST.get('animal')
         animal = get_object_or_404(Animal, pk=animal_id)
         
-        # Check if record exists for today
-        record_date = request.POST.get('date', date.today())
-        existing = MilkProduction.objects.filter(animal=animal, date=record_date).first()
-        
-        if existing:
-            # Update existing record
-            existing.morning_liters = request.POST.get('morning_liters', 0)
-            existing.evening_liters = request.POST.get('evening_liters', 0)
-            existing.notes = request.POST.get('notes', '')
-            existing.save()
-            messages.success(request, 'Milk record updated!')
-        else:
-            # Create new record
-            MilkProduction.objects.create(
-                animal=animal,
-                date=record_date,
-                morning_liters=request.POST.get('morning_liters', 0),
-                evening_liters=request.POST.get('evening_liters', 0),
-                notes=request.POST.get('notes', ''),
-            )
-            messages.success(request, 'Milk record added!')
+        # Creates the day's record or updates it if one already exists
+        record_date = MilkProduction._meta.get_field('date').to_python(
+            request.POST.get('date') or date.today()
+        )
+        record_milk(record_date, [{
+            'animal_id': animal.pk,
+            'morning_liters': request.POST.get('morning_liters') or 0,
+            'evening_liters': request.POST.get('evening_liters') or 0,
+            'notes': request.POST.get('notes', ''),
+        }], fields=('morning_liters', 'evening_liters', 'notes'))
+        messages.success(request, 'Milk record saved!')
         
         return redirect('dairy:milk_list')
     
     # Get milking cows only
-    cows = Animal.objects.filter(
-        animal_type='cow',
-        gender='female',
-        status='active'
-    )
+    cows = milking_cows()
     
     context = {'cows': cows}
     return render(request, 'dairy/milk_form.html', context)
 
 
+@login_required
+def milk_grid(request):
+    """Morning and evening milk for every milking cow on one page"""
+    field = MilkProduction._meta.get_field('date')
+    try:
+        day = field.to_python(request.POST.get('date') or request.GET.get('date')) or date.today()
+    except ValidationError:
+        day = date.today()
+    cows = list(milking_cows().order_by('tag_number'))
+    errors = {}
+    
+    if request.method == 'POST':
+        rows, errors = parse_grid(request.POST, cows)
+        if not errors:
+            count = record_milk(day, rows)
+            messages.success(request, f'Milk saved for {count} cow(s)!')
+            return redirect(f"{reverse('dairy:milk_grid')}?date={day.isoformat()}")
+        messages.error(request, 'Some entries need fixing - nothing was saved.')
+    
+    recorded = {
+        record.animal_id: record
+        for record in MilkProduction.objects.filter(date=day, animal__in=cows)
+    }
+    for cow in cows:
+        record = recorded.get(cow.pk)
+        # Re-show what was typed after an error, else the saved figures
+        if request.method == 'POST':
+            cow.morning = request.POST.get(f'morning_{cow.pk}', '')
+            cow.evening = request.POST.get(f'evening_{cow.pk}', '')
+        else:
+            cow.morning = record.morning_liters if record else ''
+            cow.evening = record.evening_liters if record else ''
+        cow.error = errors.get(cow.tag_number)
+    
+    context = {
+        'day': day,
+        'cows': cows,
+        'recorded_count': len(recorded),
+    }
+    return render(request, 'dairy/milk_grid.html', context)
+
+
+@login_required
+def lactation_ranking(request):
+    """Milking cows ranked by projected 305-day yield"""
+    metrics = herd_metrics()
+    cows = list(milking_cows().filter(pk__in=metrics))
+    for cow in cows:
+        cow.lactation = metrics[cow.pk]
+    cows.sort(key=lambda cow: -cow.lactation['projected_305'])
+    
+    context = {'cows': cows}
+    return render(request, 'dairy/lactation_ranking.html', context)
+
+
 @login_required
 def milk_production_list(request):
     """List milk production records"""
@@ -213,7 +305,7 @@ def milk_production_list(request):
     )
     total_liters = (totals['total_morning'] or 0) + (totals['total_evening'] or 0)
     
-    cows = Animal.objects.filter(animal_type='cow', gender='female', status='active')
+    cows = milking_cows()
     
     context = {
         'records': records[:30],
@@ -248,9 +340,124 @@ def health_record_add(request, animal_id):
     return render(request, 'dairy/health_form.html', context)
 
 
+@login_required
+def health_campaign_add(request):
+    """Record one treatment for every animal picked by type, status, age or tag"""
+    data = request.POST.copy() if request.method == 'POST' else request.GET.copy()
+    data.setdefault('status', 'active')
+    selection = AnimalSelectionForm(data)
+    form = HealthCampaignForm(request.POST or None, initial={'date': timezone.localdate()})
+    
+    if request.method == 'POST' and form.is_valid() and selection.is_valid():
+        animals = list(
+            selection.filter(Animal.objects.all()).only('pk', 'tag_number', 'animal_type').order_by('tag_number')
+        )
+        missing = set(selection.cleaned_data['tags']) - {animal.tag_number for animal in animals}
+        if not animals:
+            messages.error(request, 'No animals match the selection.')
+        else:
+            data = form.cleaned_data
+            campaign = record_campaign(
+                animals,
+                record_type=data['record_type'],
+                description=data['description'],
+                day=data['date'],
+                cost=data['cost'],
+                split=data['cost_split'],
+                next_due_date=data['next_due_date'],
+                veterinarian=data['veterinarian'],
+                notes=data['notes'],
+            )
+            messages.success(
+                request,
+                f'{campaign.get_record_type_display()} recorded for {campaign.animal_count} animals '
+                f'(KSh {campaign.total_cost:,.2f}).',
+            )
+            if missing:
+                messages.warning(request, f'Not matched: {", ".join(sorted(missing))}')
+            return redirect('dairy:health_calendar')
+    
+    context = {
+        'form': form,
+        'selection': selection,
+        'recent': HealthCampaign.objects.all()[:5],
+    }
+    return render(request, 'dairy/health_campaign_form.html', context)
+
+
+@login_required
+def health_calendar(request):
+    """Open health events: overdue ones, a month's worth, and counts per month"""
+    today = timezone.localdate()
+    try:
+        month = datetime.strptime(request.GET.get('month', ''), '%Y-%m').date()
+    except ValueError:
+        month = today.replace(day=1)
+    next_month = (month + timedelta(days=32)).replace(day=1)
+    
+    open_events = HealthEvent.objects.filter(status='open')
+    months = (
+        open_events.filter(due_date__gte=today)
+        .annotate(month=TruncMonth('due_date'))
+        .values('month')
+        .annotate(count=Count('id'))
+        .order_by('month')
+    )
+    
+    context = {
+        'month': month,
+        'previous_month': (month - timedelta(days=1)).replace(day=1),
+        'next_month': next_month,
+        'overdue': open_events.filter(due_date__lt=today).select_related('animal')[:50],
+        'overdue_count': open_events.filter(due_date__lt=today).count(),
+        'events': open_events.filter(
+            due_date__gte=max(month, today), due_date__lt=next_month,
+        ).select_related('animal'),
+        'months': months,
+    }
+    return render(request, 'dairy/health_calendar.html', context)
+
+
+@login_required
+def breeding_calendar(request):
+    """Month view of predicted heats, pregnancy checks, dry-offs and deliveries"""
+    today = timezone.localdate()
+    try:
+        month = datetime.strptime(request.GET.get('month', ''), '%Y-%m').date()
+    except ValueError:
+        month = today.replace(day=1)
+    
+    days = breeding.month_events(month.year, month.month)
+    labels = dict(breeding.EVENT_TYPES)
+    weeks = [
+        [
+            {
+                'date': day,
+                'in_month': day.month == month.month,
+                'events': [
+                    {'type': event_type, 'label': labels[event_type], 'animal_id': pk, 'tag': tag, 'name': name}
+                    for event_type, pk, tag, name in days.get(day, [])
+                ],
+            }
+            for day in week
+        ]
+        for week in calendar.Calendar().monthdatescalendar(month.year, month.month)
+    ]
+    
+    context = {
+        'month': month,
+        'today': today,
+        'previous_month': (month - timedelta(days=1)).replace(day=1),
+        'next_month': (month + timedelta(days=32)).replace(day=1),
+        'weeks': weeks,
+        'event_types': breeding.EVENT_TYPES,
+    }
+    return render(request, 'dairy/breeding_calendar.html', context)
+
+
 @login_required
 def pregnancy_add(request, animal_id):
-    """Add pregnancy record"""
+    """Add pregnancy record, optionally checking the bull first"""
     animal = get_object_or_404(Animal, pk=animal_id)
     
     if request.method == 'POST':
@@ -264,7 +471,13 @@ def pregnancy_add(request, animal_id):
         messages.success(request, 'Pregnancy record added!')
         return redirect('dairy:animal_detail', pk=animal.pk)
     
-    context = {'animal': animal}
+    bull_tag = request.GET.get('bull_tag', '').strip()
+    mating = None
+    if bull_tag:
+        mating = pedigree().mating_check(animal.tag_number, bull_tag)
+        mating['inbreeding_percent'] = round(mating['inbreeding'] * 100, 2)
+    
+    context = {'animal': animal, 'bull_tag': bull_tag, 'mating': mating}
     return render(request, 'dairy/pregnancy_form.html', context)
 
 
@@ -321,4 +534,28 @@ def feed_record_list(request):
         'total_cost_30d': totals['total_cost'] or 0,
         'total_quantity_30d': totals['total_quantity'] or 0,
     }
-    return render(request, 'dairy/feed_list.html', context)
\ No newline at end of file
+    return render(request, 'dairy/feed_list.html', context)
+
+
+@login_required
+def feed_costs(request):
+    """Feed cost per liter of milk for a month: herd, days and cows"""
+    today = timezone.localdate()
+    this_month = today.replace(day=1)
+    try:
+        month = datetime.strptime(request.GET.get('month', ''), '%Y-%m').date()
+    except ValueError:
+        month = this_month
+    month = min(month, this_month)
+    weighted = request.GET.get('weighted') == '1'
+    next_month = (month + timedelta(days=32)).replace(day=1)
+    
+    context = {
+        'month': month,
+        'previous_month': (month - timedelta(days=1)).replace(day=1),
+        'next_month': next_month if next_month <= this_month else None,
+        'weighted': weighted,
+        'feed_days': feed.FEED_DAYS,
+        'costs': feed.month_costs(month.year, month.month, weighted, today),
+    }
+    return render(request, 'dairy/feed_costs.html', context)
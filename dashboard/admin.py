@@ -1,3 +1,8 @@
 from django.contrib import admin
+from .models import DailyFarmSnapshot
 
-# Register your models here.
+
+@admin.register(DailyFarmSnapshot)
+class DailyFarmSnapshotAdmin(admin.ModelAdmin):
+    list_display = ['date', 'milk_liters', 'income', 'expense', 'active_cows', 'active_sheep', 'active_crop_seasons']
+    date_hierarchy = 'date'
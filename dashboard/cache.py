@@ -0,0 +1,105 @@
+"""
+Rendered-page cache for the home pages.
+
+Pages are keyed on the user, the local date and a version counter per
+app. Saving or deleting any model in an app bumps that app's counter
+(see dashboard.signals), so a cached page is served only until the data
+behind it changes or the day rolls over at local midnight.
+"""
+import hashlib
+import time
+from datetime import datetime, time as dtime, timedelta
+from functools import wraps
+from inspect import iscoroutinefunction
+
+from asgiref.sync import sync_to_async
+from django.contrib.messages import get_messages
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.utils import timezone
+
+
+TRACKED_APPS = ('dashboard', 'dairy', 'crops', 'finance')
+
+
+def _version_key(app_label):
+    return f'app-version:{app_label}'
+
+
+def bump_version(app_label):
+    """Invalidate every cached page that depends on `app_label`"""
+    key = _version_key(app_label)
+    try:
+        cache.incr(key)
+    except ValueError:
+        # Missing or evicted: start from a fresh value so old pages can't match
+        cache.set(key, time.time_ns(), None)
+
+
+def app_versions(app_labels):
+    """Current version of each app, initialising any that are missing"""
+    keys = [_version_key(label) for label in app_labels]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            cache.add(key, time.time_ns(), None)
+            versions[key] = cache.get(key)
+    return [versions[key] for key in keys]
+
+
+def seconds_until_midnight():
+    """Seconds left in the current local (TIME_ZONE) day"""
+    now = timezone.localtime()
+    midnight = datetime.combine(now.date() + timedelta(days=1), dtime.min, tzinfo=now.tzinfo)
+    return max(1, int((midnight - now).total_seconds()))
+
+
+def page_key(request, app_labels):
+    versions = '.'.join(str(v) for v in app_versions(app_labels))
+    path = hashlib.md5(request.get_full_path().encode()).hexdigest()
+    return f'page:{request.user.pk}:{timezone.localdate()}:{versions}:{path}'
+
+
+def _cached_content(request, app_labels):
+    """Return (key, cached HTML); key is None when the cache must be bypassed"""
+    if request.method != 'GET' or len(get_messages(request)):
+        return None, None
+    key = page_key(request, app_labels)
+    return key, cache.get(key)
+
+
+def _store(key, response):
+    if key and response.status_code == 200 and not response.streaming:
+        cache.set(key, response.content, seconds_until_midnight())
+
+
+def cache_home_page(*app_labels):
+    """
+    Cache a GET view's rendered HTML until one of `app_labels` changes.
+
+    Requests with flash messages waiting are rendered fresh so the
+    messages are shown and consumed. Works for sync and async views.
+    """
+    def decorator(view):
+        if iscoroutinefunction(view):
+            @wraps(view)
+            async def async_wrapper(request, *args, **kwargs):
+                # Session and user lookups are sync ORM calls
+                key, content = await sync_to_async(_cached_content)(request, app_labels)
+                if content is not None:
+                    return HttpResponse(content)
+                response = await view(request, *args, **kwargs)
+                await sync_to_async(_store)(key, response)
+                return response
+            return async_wrapper
+        
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            key, content = _cached_content(request, app_labels)
+            if content is not None:
+                return HttpResponse(content)
+            response = view(request, *args, **kwargs)
+            _store(key, response)
+            return response
+        return wrapper
+    return decorator
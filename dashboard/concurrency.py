@@ -0,0 +1,70 @@
+"""
+Helpers for the async home views.
+
+Django's async ORM methods (aaggregate, acount, ...) currently hand every
+query to the same thread-sensitive executor, so gathering them does not
+overlap database round-trips. run_concurrently instead runs each
+independent group of queries on a worker thread with its own database
+connection, which is what lets the groups wait on the database at the
+same time.
+"""
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial, wraps
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.views import redirect_to_login
+from django.db import close_old_connections
+
+
+# Workers keep their connections between requests (see CONN_MAX_AGE);
+# opening a fresh connection per section costs more than it saves.
+_executor = ThreadPoolExecutor(
+    max_workers=settings.HOME_VIEW_WORKERS,
+    thread_name_prefix='home-view',
+)
+
+
+def _in_worker(func):
+    def run():
+        # The same recycling Django does around each request
+        close_old_connections()
+        return func()
+    return run
+
+
+async def run_concurrently(*funcs):
+    """Run zero-argument callables on the worker pool and gather results"""
+    return await asyncio.gather(*(
+        sync_to_async(_in_worker(func), thread_sensitive=False, executor=_executor)()
+        for func in funcs
+    ))
+
+
+def async_login_required(view):
+    """login_required for async views (Django 5.0's decorator is sync-only)"""
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        user = await request.auser()
+        if not user.is_authenticated:
+            return redirect_to_login(request.get_full_path(), settings.LOGIN_URL)
+        return await view(request, *args, **kwargs)
+    return wrapper
+
+
+def gather_sections(sections, today):
+    """Merge the context dicts returned by each section(today), in order"""
+    context = {}
+    for section in sections:
+        context.update(section(today))
+    return context
+
+
+async def agather_sections(sections, today):
+    """gather_sections with the sections running concurrently"""
+    parts = await run_concurrently(*(partial(section, today) for section in sections))
+    context = {}
+    for part in parts:
+        context.update(part)
+    return context
@@ -0,0 +1,267 @@
+"""
+Streaming CSV/XLSX exports of the ledger and production records.
+
+Rows are read with values_list().iterator(chunk_size=...), so only one
+chunk of tuples is in memory at a time whatever the size of the export.
+CSV is streamed straight into the response; XLSX is written by
+xlsxwriter in constant_memory mode to a temporary file which is then
+streamed back.
+"""
+import csv
+import tempfile
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django import forms
+from django.http import FileResponse, Http404, StreamingHttpResponse
+
+from crops.models import CropInput, CropSale, CropSeason
+from dairy.models import MilkProduction
+from finance.filters import TransactionFilterForm
+from finance.models import Transaction
+
+try:
+    import xlsxwriter
+except ImportError:  # optional - only needed for .xlsx exports
+    xlsxwriter = None
+
+
+CHUNK_SIZE = 2000
+
+FORMATS = ('csv', 'xlsx')
+
+# Rows per worksheet, header included
+XLSX_MAX_ROWS = 1048576
+
+# Spreadsheets read a cell starting with one of these as a formula
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+
+class DateRangeForm(forms.Form):
+    """start/end or "last N days" plus simple equality filters from `lookups`"""
+    start = forms.DateField(required=False)
+    end = forms.DateField(required=False)
+    days = forms.IntegerField(min_value=1, max_value=36500, required=False)
+
+    # form field name -> queryset lookup
+    lookups = {}
+
+    def filter(self, queryset, today=None):
+        self.is_valid()
+        data = self.cleaned_data
+        for name, lookup in self.lookups.items():
+            if data.get(name) not in (None, ''):
+                queryset = queryset.filter(**{lookup: data[name]})
+
+        if data.get('start') or data.get('end'):
+            if data.get('start'):
+                queryset = queryset.filter(date__gte=data['start'])
+            if data.get('end'):
+                queryset = queryset.filter(date__lte=data['end'])
+        elif data.get('days'):
+            today = today or date.today()
+            queryset = queryset.filter(date__gte=today - timedelta(days=data['days']))
+        return queryset
+
+
+class MilkFilterForm(DateRangeForm):
+    animal = forms.IntegerField(required=False)
+    lookups = {'animal': 'animal_id'}
+
+
+class CropInputFilterForm(DateRangeForm):
+    season = forms.IntegerField(required=False)
+    input_type = forms.ChoiceField(choices=(('', 'All'),) + CropInput.INPUT_TYPES, required=False)
+    lookups = {'season': 'season_id', 'input_type': 'input_type'}
+
+
+class CropSaleFilterForm(DateRangeForm):
+    season = forms.IntegerField(required=False)
+    payment_status = forms.ChoiceField(
+        choices=(('', 'All'),) + tuple(CropSale._meta.get_field('payment_status').choices),
+        required=False,
+    )
+    lookups = {'season': 'season_id', 'payment_status': 'payment_status'}
+
+
+def _choices(model, field):
+    return dict(model._meta.get_field(field).choices)
+
+
+# name -> model, filter form, columns as (header, field[, value labels])
+DATASETS = {
+    'transactions': {
+        'model': Transaction,
+        'form': TransactionFilterForm,
+        'columns': [
+            ('Date', 'date'),
+            ('Type', 'transaction_type', _choices(Transaction, 'transaction_type')),
+            ('Category', 'category', _choices(Transaction, 'category')),
+            ('Description', 'description'),
+            ('Amount', 'amount'),
+            ('Payment Method', 'payment_method', _choices(Transaction, 'payment_method')),
+            ('Party', 'party_name'),
+            ('Reference', 'reference'),
+            ('Notes', 'notes'),
+        ],
+    },
+    'milk': {
+        'model': MilkProduction,
+        'form': MilkFilterForm,
+        'columns': [
+            ('Date', 'date'),
+            ('Tag', 'animal__tag_number'),
+            ('Name', 'animal__name'),
+            ('Morning (L)', 'morning_liters'),
+            ('Evening (L)', 'evening_liters'),
+            ('Notes', 'notes'),
+        ],
+    },
+    'crop-inputs': {
+        'model': CropInput,
+        'form': CropInputFilterForm,
+        'columns': [
+            ('Date', 'date'),
+            ('Farm', 'season__farm__name'),
+            ('Crop', 'season__crop_type', _choices(CropSeason, 'crop_type')),
+            ('Input Type', 'input_type', _choices(CropInput, 'input_type')),
+            ('Description', 'description'),
+            ('Quantity', 'quantity'),
+            ('Cost', 'cost'),
+            ('Supplier', 'supplier'),
+            ('Notes', 'notes'),
+        ],
+    },
+    'crop-sales': {
+        'model': CropSale,
+        'form': CropSaleFilterForm,
+        'columns': [
+            ('Date', 'date'),
+            ('Farm', 'season__farm__name'),
+            ('Crop', 'season__crop_type', _choices(CropSeason, 'crop_type')),
+            ('Quantity (kg)', 'quantity_kg'),
+            ('Price per kg', 'price_per_kg'),
+            ('Total', 'total_amount'),
+            ('Buyer', 'buyer'),
+            ('Payment Status', 'payment_status', _choices(CropSale, 'payment_status')),
+            ('Notes', 'notes'),
+        ],
+    },
+}
+
+
+def export_rows(name, params=None, today=None):
+    """(headers, row iterator) for dataset `name` filtered by `params`"""
+    dataset = DATASETS[name]
+    queryset = dataset['model'].objects.all()
+    if params:
+        queryset = dataset['form'](params).filter(queryset, today=today)
+
+    columns = dataset['columns']
+    headers = [column[0] for column in columns]
+    fields = [column[1] for column in columns]
+    labels = [(i, column[2]) for i, column in enumerate(columns) if len(column) > 2]
+
+    rows = (
+        queryset.order_by('date', 'id')
+        .values_list(*fields)
+        .iterator(chunk_size=CHUNK_SIZE)
+    )
+    if not labels:
+        return headers, rows
+
+    def labelled():
+        for row in rows:
+            row = list(row)
+            for i, choices in labels:
+                row[i] = choices.get(row[i], row[i])
+            yield row
+    return headers, labelled()
+
+
+class Echo:
+    """File-like object whose write() hands the line back to csv.writer's caller"""
+    def write(self, value):
+        return value
+
+
+def _csv_safe(row):
+    """Quote text that a spreadsheet would otherwise run as a formula"""
+    return [
+        f"'{value}" if isinstance(value, str) and value.startswith(FORMULA_PREFIXES) else value
+        for value in row
+    ]
+
+
+def csv_lines(headers, rows):
+    writer = csv.writer(Echo())
+    yield writer.writerow(headers)
+    for row in rows:
+        yield writer.writerow(_csv_safe(row))
+
+
+def write_csv(stream, headers, rows):
+    """Write to an open text stream, returning the number of data rows"""
+    writer = csv.writer(stream)
+    writer.writerow(headers)
+    count = 0
+    for row in rows:
+        writer.writerow(_csv_safe(row))
+        count += 1
+    return count
+
+
+def write_xlsx(target, headers, rows):
+    """Write to a path or binary file in constant_memory mode, returning the row count"""
+    if xlsxwriter is None:
+        raise ImportError('XLSX export needs the xlsxwriter package (pip install XlsxWriter)')
+    workbook = xlsxwriter.Workbook(target, {'constant_memory': True, 'in_memory': False})
+    bold = workbook.add_format({'bold': True})
+    date_format = workbook.add_format({'num_format': 'yyyy-mm-dd'})
+
+    count = 0
+    line = XLSX_MAX_ROWS
+    for row in rows:
+        # Carry on in a new sheet once one is full
+        if line == XLSX_MAX_ROWS:
+            sheet = workbook.add_worksheet()
+            sheet.write_row(0, 0, headers, bold)
+            line = 1
+        for col, value in enumerate(row):
+            if isinstance(value, date):
+                sheet.write_datetime(line, col, value, date_format)
+            elif isinstance(value, Decimal):
+                sheet.write_number(line, col, float(value))
+            elif isinstance(value, str):
+                # write() would turn "=..." into a live formula
+                sheet.write_string(line, col, value)
+            else:
+                sheet.write(line, col, value)
+        line += 1
+        count += 1
+    if count == 0:
+        workbook.add_worksheet().write_row(0, 0, headers, bold)
+    workbook.close()
+    return count
+
+
+def export_response(name, fmt, params=None, today=None):
+    """Streaming HTTP response for dataset `name` in `fmt` (csv or xlsx)"""
+    if name not in DATASETS or fmt not in FORMATS:
+        raise Http404('Unknown export')
+    if fmt == 'xlsx' and xlsxwriter is None:
+        raise Http404('XLSX export is not available on this server')
+
+    headers, rows = export_rows(name, params, today=today)
+    filename = f'{name}-{today or date.today()}.{fmt}'
+
+    if fmt == 'csv':
+        response = StreamingHttpResponse(csv_lines(headers, rows), content_type='text/csv')
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
+
+    # xlsx is a zip, so it has to be finished before it can be sent
+    spool = tempfile.TemporaryFile()
+    write_xlsx(spool, headers, rows)
+    spool.seek(0)
+    return FileResponse(spool, as_attachment=True, filename=filename)
@@ -0,0 +1,104 @@
+import asyncio
+import statistics
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.test import AsyncRequestFactory, RequestFactory
+
+from dashboard import views as dashboard_views
+from dairy import views as dairy_views
+from crops import views as crops_views
+from finance import views as finance_views
+
+
+PAGES = [
+    ('dashboard', dashboard_views.dashboard, dashboard_views.dashboard_async),
+    ('finance', finance_views.finance_home, finance_views.finance_home_async),
+    ('dairy', dairy_views.dairy_home, dairy_views.dairy_home_async),
+    ('crops', crops_views.crops_home, crops_views.crops_home_async),
+]
+
+
+def percentiles(samples):
+    cuts = statistics.quantiles(samples, n=20)
+    return statistics.median(samples), cuts[18]
+
+
+class Command(BaseCommand):
+    help = 'Compare p50/p95 latency of the sync and async home views with simulated database latency'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--latency-ms', type=float, default=5.0,
+                            help='Delay added to every query, e.g. a remote PostgreSQL (default 5)')
+        parser.add_argument('--requests', type=int, default=50, help='Requests per page and mode')
+        parser.add_argument('--username', help='User to render pages as (default: first superuser)')
+
+    def handle(self, *args, **options):
+        User = get_user_model()
+        if options['username']:
+            user = User.objects.filter(username=options['username']).first()
+        else:
+            user = User.objects.filter(is_superuser=True).first()
+        if user is None:
+            raise CommandError('No user to render pages as; create one or pass --username')
+        if options['requests'] < 2:
+            raise CommandError('--requests must be at least 2')
+
+        latency = options['latency_ms'] / 1000
+
+        def slow_link(execute, sql, params, many, context):
+            time.sleep(latency)
+            return execute(sql, params, many, context)
+
+        def add_latency(sender, connection, **kwargs):
+            connection.execute_wrappers.append(slow_link)
+
+        # Worker threads open their own connections; cover those too
+        connection_created.connect(add_latency)
+        for conn in connections.all():
+            conn.execute_wrappers.append(slow_link)
+
+        self.stdout.write(f"{'page':<10} {'mode':<6} {'p50 ms':>8} {'p95 ms':>8}")
+        try:
+            for name, sync_view, async_view in PAGES:
+                for mode, samples in (
+                    ('wsgi', self.time_sync(sync_view, user, options['requests'])),
+                    ('asgi', asyncio.run(self.time_async(async_view, user, options['requests']))),
+                ):
+                    p50, p95 = percentiles(samples)
+                    self.stdout.write(f'{name:<10} {mode:<6} {p50:>8.1f} {p95:>8.1f}')
+        finally:
+            connection_created.disconnect(add_latency)
+            for conn in connections.all():
+                if slow_link in conn.execute_wrappers:
+                    conn.execute_wrappers.remove(slow_link)
+
+    def time_sync(self, view, user, count):
+        samples = []
+        for _ in range(count):
+            request = RequestFactory().get('/')
+            request.user = user
+            cache.clear()
+            start = time.perf_counter()
+            view(request)
+            samples.append((time.perf_counter() - start) * 1000)
+        return samples
+
+    async def time_async(self, view, user, count):
+        async def auser():
+            return user
+
+        samples = []
+        for _ in range(count):
+            request = AsyncRequestFactory().get('/')
+            request.user = user
+            request.auser = auser
+            await cache.aclear()
+            start = time.perf_counter()
+            await view(request)
+            samples.append((time.perf_counter() - start) * 1000)
+        return samples
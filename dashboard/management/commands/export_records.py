@@ -0,0 +1,56 @@
+import resource
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.http import QueryDict
+from django.utils import timezone
+
+from dashboard.exports import DATASETS, FORMATS, export_rows, write_csv, write_xlsx
+
+
+class Command(BaseCommand):
+    help = 'Export transactions, milk, crop inputs or crop sales to CSV or XLSX'
+
+    def add_arguments(self, parser):
+        parser.add_argument('dataset', choices=sorted(DATASETS))
+        parser.add_argument('--format', choices=FORMATS, default='csv')
+        parser.add_argument('--output', '-o', help='File to write (default: stdout, CSV only)')
+        parser.add_argument('--start', help='First day, YYYY-MM-DD')
+        parser.add_argument('--end', help='Last day, YYYY-MM-DD')
+        parser.add_argument('--days', help='Only the last N days')
+        parser.add_argument('--filter', action='append', default=[], metavar='FIELD=VALUE',
+                            help='Any other list-view filter, e.g. --filter type=expense')
+
+    def handle(self, *args, **options):
+        fmt = options['format']
+        if fmt == 'xlsx' and not options['output']:
+            raise CommandError('--output is required for XLSX exports')
+
+        params = QueryDict(mutable=True)
+        for key in ('start', 'end', 'days'):
+            if options[key]:
+                params[key] = options[key]
+        for item in options['filter']:
+            key, sep, value = item.partition('=')
+            if not sep:
+                raise CommandError(f'Invalid filter "{item}", expected FIELD=VALUE')
+            params[key] = value
+
+        form = DATASETS[options['dataset']]['form'](params)
+        if params and not form.is_valid():
+            raise CommandError(f'Invalid filters: {form.errors.as_text()}')
+
+        started = time.monotonic()
+        headers, rows = export_rows(options['dataset'], params, today=timezone.localdate())
+        if fmt == 'xlsx':
+            count = write_xlsx(options['output'], headers, rows)
+        elif options['output']:
+            with open(options['output'], 'w', newline='', encoding='utf-8') as stream:
+                count = write_csv(stream, headers, rows)
+        else:
+            count = write_csv(self.stdout, headers, rows)
+
+        # ru_maxrss is in KiB on Linux
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        elapsed = time.monotonic() - started
+        self.stderr.write(f'Exported {count} row(s) in {elapsed:.1f}s, peak RSS {peak:.0f} MB')
@@ -0,0 +1,26 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from dashboard.search import BATCH_SIZE, rebuild
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the search index of animals, farms, crop seasons and transactions'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE,
+                            help='Records read and indexed at a time')
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        with transaction.atomic():
+            counts = rebuild(options['batch_size'])
+        if not counts:
+            self.stdout.write(self.style.WARNING('This database has no search index; search uses plain lookups'))
+            return
+        summary = ', '.join(f'{count} {kind}(s)' for kind, count in counts.items())
+        self.stdout.write(self.style.SUCCESS(
+            f'Indexed {summary} in {time.monotonic() - started:.1f}s'
+        ))
@@ -0,0 +1,42 @@
+from datetime import datetime
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from dairy.models import MilkProduction
+from finance.models import Transaction
+from dashboard.snapshots import rebuild
+
+
+def parse_date(value):
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').date()
+    except ValueError:
+        raise CommandError(f'Invalid date "{value}", expected YYYY-MM-DD')
+
+
+class Command(BaseCommand):
+    help = 'Rebuild DailyFarmSnapshot rows for a date range'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--start', type=parse_date,
+                            help='First day (default: earliest milk or transaction record)')
+        parser.add_argument('--end', type=parse_date, help='Last day (default: today)')
+
+    def handle(self, *args, **options):
+        end = options['end'] or timezone.localdate()
+        start = options['start']
+        if start is None:
+            earliest = [
+                d for d in (
+                    MilkProduction.objects.order_by('date').values_list('date', flat=True).first(),
+                    Transaction.objects.order_by('date').values_list('date', flat=True).first(),
+                ) if d
+            ]
+            start = min(earliest, default=end)
+        if start > end:
+            raise CommandError('--start must not be after --end')
+
+        with transaction.atomic():
+            count = rebuild(start, end)
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {count} snapshot(s) from {start} to {end}'))
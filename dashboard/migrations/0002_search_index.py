@@ -0,0 +1,39 @@
+from django.db import migrations
+
+
+# Searchable text of animals, farms, seasons and transactions (see dashboard.search)
+CREATE = {
+    'sqlite': [
+        "CREATE VIRTUAL TABLE dashboard_search USING fts5("
+        "title, body, detail UNINDEXED, tokenize='unicode61 remove_diacritics 2', prefix='2 3')",
+    ],
+    'postgresql': [
+        "CREATE TABLE dashboard_search ("
+        "rowid bigint PRIMARY KEY, title text NOT NULL, body text NOT NULL, detail text NOT NULL, "
+        "document tsvector GENERATED ALWAYS AS ("
+        "setweight(to_tsvector('simple', title), 'A') || setweight(to_tsvector('simple', body), 'B')"
+        ") STORED)",
+        "CREATE INDEX dashboard_search_document ON dashboard_search USING GIN (document)",
+    ],
+}
+
+
+def create_search_table(apps, schema_editor):
+    for statement in CREATE.get(schema_editor.connection.vendor, []):
+        schema_editor.execute(statement)
+
+
+def drop_search_table(apps, schema_editor):
+    if schema_editor.connection.vendor in CREATE:
+        schema_editor.execute("DROP TABLE dashboard_search")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_table, drop_search_table),
+    ]
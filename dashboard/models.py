@@ -1,3 +1,30 @@
 from django.db import models
 
-# Create your models here.
+
+class DailyFarmSnapshot(models.Model):
+    """
+    One row per day of farm-wide totals.
+
+    Kept up to date by the signal handlers in dashboard.signals and
+    rebuildable with `manage.py rebuild_snapshots`. Period figures on the
+    dashboard and finance pages are sums over these rows instead of scans
+    of the raw milk and transaction tables.
+    """
+    date = models.DateField(unique=True)
+    milk_liters = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    income = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    expense = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    active_cows = models.IntegerField(default=0)
+    active_sheep = models.IntegerField(default=0)
+    active_crop_seasons = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        ordering = ['-date']
+    
+    def __str__(self):
+        return f"Snapshot {self.date}"
+    
+    @property
+    def profit(self):
+        return self.income - self.expense
@@ -0,0 +1,230 @@
+"""
+Full-text search over animals, farms, crop seasons and transactions.
+
+Every searchable record is one row of the `dashboard_search` table
+(created by migration 0002), keyed by rowid = pk * KIND_SPAN + the kind's
+code so a record is updated or removed by primary key:
+
+- SQLite: an FTS5 virtual table, ranked with bm25 and the title weighted
+  above the body
+- PostgreSQL: a table with a stored tsvector column under a GIN index,
+  ranked with ts_rank
+
+dashboard.signals keeps the rows in step when a record is saved or
+deleted; finance.signals.bulk_created indexes bulk-inserted
+transactions. `manage.py rebuild_search_index` rebuilds the table after
+other bulk writes. On any other database nothing is indexed and find()
+falls back to icontains queries on the same fields.
+
+Each search word matches as a prefix ("fries" finds Friesian) and every
+word must match.
+"""
+import re
+from functools import reduce
+from operator import and_, or_
+
+from django.db import connection
+from django.db.models import Q
+from django.urls import reverse
+
+from crops.models import CropSeason, Farm
+from dairy.models import Animal
+from finance.models import Transaction
+
+
+BATCH_SIZE = 1000
+
+LIMIT = 50
+
+# Words after this many are ignored
+MAX_TERMS = 8
+
+# rowid = pk * KIND_SPAN + code; room for more kinds
+KIND_SPAN = 8
+
+
+def _animal(record):
+    title = f"{record.tag_number} {record.name}"
+    body = f"{record.breed} {record.notes}"
+    detail = ' | '.join(filter(None, [record.get_animal_type_display(), record.breed, record.get_status_display()]))
+    return title, body, detail
+
+
+def _farm(record):
+    detail = ' | '.join(filter(None, [f"{record.size_acres} acres", record.location]))
+    return record.name, record.location, detail
+
+
+def _season(record):
+    title = f"{record.get_crop_type_display()} {record.crop_variety}"
+    detail = f"Planted {record.planting_date} | {record.get_status_display()}"
+    return title, record.notes, detail
+
+
+def _transaction(record):
+    body = f"{record.party_name} {record.reference}"
+    detail = f"{record.get_transaction_type_display()} | KSh {record.amount} | {record.date}"
+    return record.description, body, detail
+
+
+# kind: (code, model, label, detail URL name, indexed fields, builder)
+DOCUMENTS = {
+    'animal': (1, Animal, 'Animal', 'dairy:animal_detail', ['tag_number', 'name', 'breed', 'notes'], _animal),
+    'farm': (2, Farm, 'Farm', 'crops:farm_detail', ['name', 'location'], _farm),
+    'season': (3, CropSeason, 'Crop Season', 'crops:season_detail', ['crop_variety', 'notes'], _season),
+    'transaction': (
+        4, Transaction, 'Transaction', 'finance:transaction_edit', ['description', 'party_name', 'reference'],
+        _transaction,
+    ),
+}
+
+KINDS = {model: kind for kind, (_, model, _, _, _, _) in DOCUMENTS.items()}
+
+CODES = {code: kind for kind, (code, *_) in DOCUMENTS.items()}
+
+SQL = {
+    'sqlite': {
+        'delete': 'DELETE FROM dashboard_search WHERE rowid = %s',
+        'insert': 'INSERT INTO dashboard_search (rowid, title, body, detail) VALUES (%s, %s, %s, %s)',
+        'clear': 'DELETE FROM dashboard_search',
+        'optimize': "INSERT INTO dashboard_search (dashboard_search) VALUES ('optimize')",
+        'find': (
+            'SELECT rowid, title, detail FROM dashboard_search WHERE dashboard_search MATCH %s '
+            'ORDER BY bm25(dashboard_search, 10.0, 1.0, 0.0) LIMIT %s'
+        ),
+    },
+    'postgresql': {
+        'delete': 'DELETE FROM dashboard_search WHERE rowid = %s',
+        'insert': (
+            'INSERT INTO dashboard_search (rowid, title, body, detail) VALUES (%s, %s, %s, %s) '
+            'ON CONFLICT (rowid) DO UPDATE SET '
+            'title = EXCLUDED.title, body = EXCLUDED.body, detail = EXCLUDED.detail'
+        ),
+        'clear': 'TRUNCATE dashboard_search',
+        'optimize': 'ANALYZE dashboard_search',
+        'find': (
+            "SELECT rowid, title, detail FROM dashboard_search, to_tsquery('simple', %s) query "
+            'WHERE document @@ query ORDER BY ts_rank(document, query) DESC LIMIT %s'
+        ),
+    },
+}
+
+
+def _sql():
+    """Statements for the current database, or None when it has no index"""
+    return SQL.get(connection.vendor)
+
+
+def _terms(query):
+    return re.findall(r'[^\W_]+', query.lower())[:MAX_TERMS]
+
+
+def _match(terms):
+    """Every term as a prefix, in the current database's query syntax"""
+    if connection.vendor == 'sqlite':
+        return ' '.join(f'"{term}"*' for term in terms)
+    return ' & '.join(f'{term}:*' for term in terms)
+
+
+def _row(kind, record):
+    code, _, _, _, _, builder = DOCUMENTS[kind]
+    title, body, detail = builder(record)
+    return record.pk * KIND_SPAN + code, title.strip(), body.strip(), detail
+
+
+def _write(sql, rows, replace=True):
+    with connection.cursor() as cursor:
+        if replace and connection.vendor == 'sqlite':
+            # FTS5 tables have no upsert
+            cursor.executemany(sql['delete'], [(row[0],) for row in rows])
+        cursor.executemany(sql['insert'], rows)
+
+
+def index_many(records):
+    """Add or refresh the index rows of saved records of one model"""
+    sql = _sql()
+    if sql is None or not records:
+        return
+    kind = KINDS[type(records[0])]
+    _write(sql, [_row(kind, record) for record in records])
+
+
+def index(record):
+    index_many([record])
+
+
+def remove(record):
+    """Drop a deleted record's index row"""
+    sql = _sql()
+    if sql is not None:
+        with connection.cursor() as cursor:
+            cursor.execute(sql['delete'], [record.pk * KIND_SPAN + DOCUMENTS[KINDS[type(record)]][0]])
+
+
+def rebuild(batch_size=BATCH_SIZE):
+    """Reindex every record from scratch; returns the count per kind"""
+    sql = _sql()
+    if sql is None:
+        return {}
+    counts = {}
+    with connection.cursor() as cursor:
+        cursor.execute(sql['clear'])
+    for kind, (_, model, *_) in DOCUMENTS.items():
+        counts[kind] = 0
+        batch = []
+        for record in model.objects.order_by('pk').iterator(chunk_size=batch_size):
+            batch.append(_row(kind, record))
+            if len(batch) >= batch_size:
+                _write(sql, batch, replace=False)
+                counts[kind] += len(batch)
+                batch = []
+        if batch:
+            _write(sql, batch, replace=False)
+            counts[kind] += len(batch)
+    with connection.cursor() as cursor:
+        cursor.execute(sql['optimize'])
+    return counts
+
+
+def _result(kind, pk, title, detail):
+    _, _, label, url_name, _, _ = DOCUMENTS[kind]
+    return {
+        'kind': kind,
+        'label': label,
+        'pk': pk,
+        'title': title,
+        'detail': detail,
+        'url': reverse(url_name, args=[pk]),
+    }
+
+
+def _find_unindexed(terms, limit):
+    """icontains fallback for databases without an index"""
+    results = []
+    for kind, (_, model, _, _, fields, builder) in DOCUMENTS.items():
+        matches = reduce(and_, (
+            reduce(or_, (Q(**{f'{field}__icontains': term}) for field in fields)) for term in terms
+        ))
+        for record in model.objects.filter(matches).order_by('-pk')[:limit - len(results)]:
+            title, _, detail = builder(record)
+            results.append(_result(kind, record.pk, title.strip(), detail))
+        if len(results) >= limit:
+            break
+    return results
+
+
+def find(query, limit=LIMIT):
+    """Best `limit` matches for `query`, each a dict with kind, label and url"""
+    terms = _terms(query)
+    if not terms:
+        return []
+    sql = _sql()
+    if sql is None:
+        return _find_unindexed(terms, limit)
+    with connection.cursor() as cursor:
+        cursor.execute(sql['find'], [_match(terms), limit])
+        rows = cursor.fetchall()
+    return [
+        _result(CODES[rowid % KIND_SPAN], rowid // KIND_SPAN, title, detail)
+        for rowid, title, detail in rows
+    ]
@@ -0,0 +1,76 @@
+"""
+Keep DailyFarmSnapshot, the search index and the home-page cache
+versions in step with the source tables.
+
+Queryset.update() and bulk_create() bypass these handlers; callers doing
+bulk writes should refresh the affected days themselves (or run
+`manage.py rebuild_snapshots` and `manage.py rebuild_search_index`).
+"""
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+
+from dairy.models import Animal, MilkProduction
+from crops.models import CropSeason, Farm
+from finance.models import Transaction
+from . import search, snapshots
+from .cache import TRACKED_APPS, bump_version
+
+
+@receiver(pre_save, sender=MilkProduction)
+@receiver(pre_save, sender=Transaction)
+def remember_previous_date(sender, instance, **kwargs):
+    """Stash the stored date so an edit that moves a record refreshes both days"""
+    instance._snapshot_previous_date = None
+    if instance.pk:
+        instance._snapshot_previous_date = (
+            sender.objects.filter(pk=instance.pk).values_list('date', flat=True).first()
+        )
+
+
+@receiver(post_save, sender=MilkProduction)
+@receiver(post_save, sender=Transaction)
+def refresh_flow_snapshot(sender, instance, **kwargs):
+    # Form views assign raw POST strings, so normalise before comparing
+    day = sender._meta.get_field('date').to_python(instance.date)
+    snapshots.refresh_flows(day)
+    previous = getattr(instance, '_snapshot_previous_date', None)
+    if previous and previous != day:
+        snapshots.refresh_flows(previous)
+
+
+@receiver(post_delete, sender=MilkProduction)
+@receiver(post_delete, sender=Transaction)
+def refresh_flow_snapshot_on_delete(sender, instance, **kwargs):
+    snapshots.refresh_flows(instance.date)
+
+
+@receiver(post_save, sender=Animal)
+@receiver(post_delete, sender=Animal)
+@receiver(post_save, sender=CropSeason)
+@receiver(post_delete, sender=CropSeason)
+def refresh_stock_snapshot(sender, instance, **kwargs):
+    snapshots.refresh_stock()
+
+
+@receiver(post_save, sender=Animal)
+@receiver(post_save, sender=Farm)
+@receiver(post_save, sender=CropSeason)
+@receiver(post_save, sender=Transaction)
+def update_search_index(sender, instance, **kwargs):
+    search.index(instance)
+
+
+@receiver(post_delete, sender=Animal)
+@receiver(post_delete, sender=Farm)
+@receiver(post_delete, sender=CropSeason)
+@receiver(post_delete, sender=Transaction)
+def remove_from_search_index(sender, instance, **kwargs):
+    search.remove(instance)
+
+
+@receiver(post_save)
+@receiver(post_delete)
+def bump_app_cache_version(sender, **kwargs):
+    app_label = sender._meta.app_label
+    if app_label in TRACKED_APPS:
+        bump_version(app_label)
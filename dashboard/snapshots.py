@@ -0,0 +1,161 @@
+"""
+Maintenance and reads for DailyFarmSnapshot.
+
+Flow figures (milk, income, expense) are recomputed for a single day from
+the source tables whenever a record on that day changes. Stock figures
+(active animals and crop seasons) describe the herd and fields as at the
+end of the day.
+"""
+from django.db.models import Count, F, Q, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from datetime import timedelta
+from decimal import Decimal
+
+from dairy.models import Animal, MilkProduction
+from crops.models import CropSeason
+from finance.models import Transaction
+from .models import DailyFarmSnapshot
+from .cache import bump_version
+
+
+ZERO = Decimal('0')
+
+
+def _flows(day):
+    """Milk, income and expense recorded on one day"""
+    milk = MilkProduction.objects.filter(date=day).aggregate(
+        total=Sum(F('morning_liters') + F('evening_liters'))
+    )['total'] or ZERO
+    money = Transaction.objects.filter(date=day).aggregate(
+        income=Sum('amount', filter=Q(transaction_type='income')),
+        expense=Sum('amount', filter=Q(transaction_type='expense')),
+    )
+    return {
+        'milk_liters': milk,
+        'income': money['income'] or ZERO,
+        'expense': money['expense'] or ZERO,
+    }
+
+
+def _stock(day):
+    """
+    Active cows, sheep and crop seasons at the end of `day`.
+
+    For today and later this is the live status. Past days are
+    reconstructed from dates: an animal counts from its acquisition until
+    the last update that took it out of the herd, and a season counts from
+    planting until its harvest (actual or expected).
+    """
+    if day >= timezone.localdate():
+        animals = Animal.objects.filter(status='active')
+        seasons = CropSeason.objects.filter(status__in=['planned', 'planted'])
+    else:
+        animals = Animal.objects.filter(date_acquired__lte=day).filter(
+            Q(status='active') | Q(updated_at__date__gt=day)
+        )
+        seasons = CropSeason.objects.exclude(status='failed').filter(
+            planting_date__lte=day,
+            expected_harvest_date__gte=day,
+        ).filter(
+            Q(actual_harvest_date__isnull=True) | Q(actual_harvest_date__gt=day)
+        )
+    herd = animals.aggregate(
+        cows=Count('id', filter=Q(animal_type='cow')),
+        sheep=Count('id', filter=Q(animal_type='sheep')),
+    )
+    return {
+        'active_cows': herd['cows'],
+        'active_sheep': herd['sheep'],
+        'active_crop_seasons': seasons.count(),
+    }
+
+
+def _store(day, values):
+    """Update the row for `day`, creating it with full figures if missing"""
+    if not DailyFarmSnapshot.objects.filter(date=day).update(**values):
+        row = {**_flows(day), **_stock(day), **values}
+        DailyFarmSnapshot.objects.update_or_create(date=day, defaults=row)
+
+
+def refresh_flows(day):
+    """Recompute milk and money totals for one day"""
+    _store(day, _flows(day))
+
+
+def refresh_stock(day=None):
+    """Recompute herd and crop counts for one day (default today)"""
+    day = day or timezone.localdate()
+    _store(day, _stock(day))
+
+
+def rebuild(start, end):
+    """
+    Recreate every snapshot row between `start` and `end` inclusive.
+
+    Flows come from one grouped query per table over the whole range, so
+    the cost is dominated by the per-day stock counts.
+    """
+    milk = dict(
+        MilkProduction.objects.filter(date__range=(start, end))
+        .values('date')
+        .annotate(total=Sum(F('morning_liters') + F('evening_liters')))
+        .values_list('date', 'total')
+    )
+    money = {
+        row['date']: row
+        for row in Transaction.objects.filter(date__range=(start, end))
+        .values('date')
+        .annotate(
+            income=Coalesce(Sum('amount', filter=Q(transaction_type='income')), ZERO),
+            expense=Coalesce(Sum('amount', filter=Q(transaction_type='expense')), ZERO),
+        )
+        .order_by()
+    }
+    
+    rows = []
+    day = start
+    while day <= end:
+        totals = money.get(day, {})
+        rows.append(DailyFarmSnapshot(
+            date=day,
+            milk_liters=milk.get(day) or ZERO,
+            income=totals.get('income', ZERO),
+            expense=totals.get('expense', ZERO),
+            **_stock(day),
+        ))
+        day += timedelta(days=1)
+    
+    DailyFarmSnapshot.objects.filter(date__range=(start, end)).delete()
+    DailyFarmSnapshot.objects.bulk_create(rows, batch_size=500)
+    bump_version('dashboard')
+    return len(rows)
+
+
+def snapshot_totals(today, milk_days=7, money_days=30):
+    """
+    Dashboard period figures from the snapshot table in one query.
+
+    Returns today's and the last `milk_days` days' milk plus month-to-date
+    and last `money_days` days' income and expense.
+    """
+    month_start = today.replace(day=1)
+    milk_since = today - timedelta(days=milk_days)
+    money_since = today - timedelta(days=money_days)
+    in_month = Q(date__gte=month_start)
+    in_window = Q(date__gte=money_since)
+    
+    totals = DailyFarmSnapshot.objects.filter(
+        date__gte=min(month_start, milk_since, money_since)
+    ).aggregate(
+        milk_today=Sum('milk_liters', filter=Q(date=today)),
+        milk_recent=Sum('milk_liters', filter=Q(date__gte=milk_since)),
+        month_income=Sum('income', filter=in_month),
+        month_expense=Sum('expense', filter=in_month),
+        income_30d=Sum('income', filter=in_window),
+        expense_30d=Sum('expense', filter=in_window),
+    )
+    totals = {key: value or 0 for key, value in totals.items()}
+    totals['month_profit'] = totals['month_income'] - totals['month_expense']
+    totals['profit_30d'] = totals['income_30d'] - totals['expense_30d']
+    return totals
@@ -0,0 +1,119 @@
+"""
+Query-plan regression tests for the hot views.
+
+Every SELECT a hot view issues is run through SQLite's EXPLAIN QUERY
+PLAN; the test fails if any of them reads one of the growing tables
+with a full scan instead of an index.
+"""
+import re
+from datetime import timedelta
+from unittest import skipUnless
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from dairy.models import Animal, MilkProduction, HealthRecord, Pregnancy
+from crops.models import Farm, CropSeason
+from finance.models import Transaction
+
+
+# Tables that grow with use. Small lookup tables (farms, budgets, users)
+# are fine to scan.
+WATCHED_TABLES = {
+    'finance_transaction',
+    'finance_monthlycategorytotal',
+    'dairy_animal',
+    'dairy_milkproduction',
+    'dairy_healthrecord',
+    'dairy_healthevent',
+    'dairy_pregnancy',
+    'dairy_feedrecord',
+    'crops_cropseason',
+    'dashboard_dailyfarmsnapshot',
+}
+
+# "SCAN t" ("SCAN TABLE t" before SQLite 3.36) is a full scan;
+# "SCAN t USING [COVERING] INDEX i" walks an index
+FULL_SCAN = re.compile(r'^SCAN (?:TABLE )?(\w+)(?: AS \w+)?$')
+
+HOT_VIEWS = [
+    ('dashboard:home', {}),
+    ('dashboard:search', {'q': 'c1'}),
+    ('finance:home', {}),
+    ('finance:reports', {}),
+    ('finance:transaction_list', {}),
+    ('finance:transaction_list', {'type': 'expense'}),
+    ('finance:ledger', {}),
+    ('finance:ledger', {'payment_method': 'mpesa'}),
+    ('dairy:home', {}),
+    ('dairy:animal_list', {}),
+    ('dairy:animal_list', {'type': 'cow'}),
+    ('dairy:milk_list', {}),
+    ('dairy:milk_add', {}),
+    ('dairy:health_calendar', {}),
+    ('dairy:feed_costs', {}),
+    ('dairy:feed_costs', {'weighted': '1'}),
+    ('crops:home', {}),
+]
+
+
+@skipUnless(connection.vendor == 'sqlite', 'EXPLAIN QUERY PLAN is SQLite syntax')
+class HotViewQueryPlanTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user('farmer', password='pass')
+        today = timezone.localdate()
+        cow = Animal.objects.create(animal_type='cow', tag_number='C1', gender='female')
+        MilkProduction.objects.create(animal=cow, date=today, morning_liters=5, evening_liters=4)
+        HealthRecord.objects.create(
+            animal=cow, record_type='vaccination', description='FMD',
+            next_due_date=today + timedelta(days=3),
+        )
+        Pregnancy.objects.create(animal=cow, breeding_date=today - timedelta(days=280))
+        farm = Farm.objects.create(name='Shamba', size_acres=5)
+        CropSeason.objects.create(
+            farm=farm, crop_type='maize', planting_date=today, status='planted',
+            expected_harvest_date=today + timedelta(days=7), area_planted_acres=2,
+        )
+        Transaction.objects.create(
+            transaction_type='income', category='milk_sale', date=today,
+            amount=500, description='Milk',
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def full_scans(self, sql, params):
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+            details = [row[-1] for row in cursor.fetchall()]
+        return [
+            detail for detail in details
+            if (match := FULL_SCAN.match(detail)) and match.group(1) in WATCHED_TABLES
+        ]
+
+    def test_no_full_table_scans(self):
+        for name, params in HOT_VIEWS:
+            with self.subTest(view=name, params=params):
+                with CaptureQueriesContext(connection) as captured:
+                    response = self.client.get(reverse(name), params)
+                self.assertEqual(response.status_code, 200)
+                for query in captured.captured_queries:
+                    sql = query['sql']
+                    if not sql.startswith('SELECT'):
+                        continue
+                    # captured SQL has parameters inlined already
+                    scans = self.full_scans(sql, ())
+                    self.assertEqual(scans, [], f'Full scan in {name}: {sql}')
+
+    def test_full_scan_pattern(self):
+        # Both plan wordings, old and new SQLite
+        for detail in ('SCAN finance_transaction', 'SCAN TABLE finance_transaction', 'SCAN dairy_animal AS U0'):
+            self.assertIn(FULL_SCAN.match(detail).group(1), WATCHED_TABLES)
+        self.assertIsNone(FULL_SCAN.match('SCAN finance_transaction USING INDEX finance_tra_date_idx'))
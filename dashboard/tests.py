@@ -1,3 +1,354 @@
-from django.test import TestCase
+from django.test import AsyncRequestFactory, TestCase, TransactionTestCase
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.core.management import call_command
+from django.urls import reverse
+from django.utils import timezone
+from datetime import timedelta
+from decimal import Decimal
+import csv
+import io
+import zipfile
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from dairy.models import Animal, MilkProduction
+from crops.models import Farm, CropSeason
+from finance.models import Transaction
+from .models import DailyFarmSnapshot
+from .snapshots import snapshot_totals
+from . import search, views
+
+
+class DashboardViewTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user('farmer', password='pass')
+        today = timezone.localdate()
+
+        cow = Animal.objects.create(animal_type='cow', tag_number='C1', gender='female')
+        Animal.objects.create(animal_type='cow', tag_number='C2', gender='female', status='sold')
+        Animal.objects.create(animal_type='sheep', tag_number='S1', gender='female')
+        MilkProduction.objects.create(animal=cow, date=today, morning_liters=5, evening_liters=4)
+        MilkProduction.objects.create(
+            animal=cow, date=today - timedelta(days=3), morning_liters=6, evening_liters=3
+        )
+
+        farm = Farm.objects.create(name='Shamba', size_acres=10)
+        CropSeason.objects.create(
+            farm=farm, crop_type='maize', planting_date=today,
+            expected_harvest_date=today + timedelta(days=90), area_planted_acres=2,
+        )
+
+        Transaction.objects.create(
+            transaction_type='income', category='milk_sale', date=today,
+            amount=1000, description='Milk',
+        )
+        Transaction.objects.create(
+            transaction_type='expense', category='feed', date=today,
+            amount=400, description='Dairy meal',
+        )
+        Transaction.objects.create(
+            transaction_type='income', category='milk_sale', date=today - timedelta(days=60),
+            amount=999, description='Old milk',
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def test_summary_figures(self):
+        response = self.client.get(reverse('dashboard:home'))
+        self.assertEqual(response.status_code, 200)
+        context = response.context
+        self.assertEqual(context['total_cows'], 1)
+        self.assertEqual(context['total_sheep'], 1)
+        self.assertEqual(context['today_milk'], Decimal('9'))
+        self.assertEqual(context['milk_7d'], Decimal('18'))
+        self.assertEqual(context['active_crops'], 1)
+        self.assertEqual(context['month_income'], Decimal('1000'))
+        self.assertEqual(context['month_expense'], Decimal('400'))
+        self.assertEqual(context['profit_30d'], Decimal('600'))
+
+    def test_query_count(self):
+        # session + user, one aggregate each for Animal, CropSeason and
+        # DailyFarmSnapshot, then the harvest, health, pregnancy, milk
+        # alert and recent-transaction lists rendered by the template.
+        with self.assertNumQueries(10):
+            self.client.get(reverse('dashboard:home'))
+
+    def test_cached_page_until_data_changes(self):
+        url = reverse('dashboard:home')
+        self.client.get(url)
+        # only the session and user lookups on a cache hit
+        with self.assertNumQueries(2):
+            response = self.client.get(url)
+        self.assertContains(response, 'Liters Today')
+
+        Animal.objects.create(animal_type='sheep', tag_number='S2', gender='male')
+        response = self.client.get(url)
+        self.assertEqual(response.context['total_sheep'], 2)
+
+    def test_cache_rolls_over_at_local_midnight(self):
+        url = reverse('dashboard:home')
+        self.client.get(url)
+        tomorrow = timezone.localdate() + timedelta(days=1)
+        with mock.patch('dashboard.cache.timezone.localdate', return_value=tomorrow):
+            response = self.client.get(url)
+        self.assertIsNotNone(response.context)
+
+
+class DailyFarmSnapshotTests(TestCase):
+    def setUp(self):
+        self.today = timezone.localdate()
+        self.cow = Animal.objects.create(animal_type='cow', tag_number='C1', gender='female')
+
+    def snapshot(self, day):
+        return DailyFarmSnapshot.objects.get(date=day)
+
+    def test_milk_and_money_hooks(self):
+        record = MilkProduction.objects.create(
+            animal=self.cow, date=self.today, morning_liters=5, evening_liters=4
+        )
+        Transaction.objects.create(
+            transaction_type='income', category='milk_sale', date=self.today,
+            amount=500, description='Milk',
+        )
+        row = self.snapshot(self.today)
+        self.assertEqual(row.milk_liters, Decimal('9'))
+        self.assertEqual(row.income, Decimal('500'))
+        self.assertEqual(row.active_cows, 1)
+
+        record.delete()
+        self.assertEqual(self.snapshot(self.today).milk_liters, 0)
+
+    def test_edit_moving_date_refreshes_both_days(self):
+        yesterday = self.today - timedelta(days=1)
+        trans = Transaction.objects.create(
+            transaction_type='expense', category='feed', date=self.today,
+            amount=300, description='Hay',
+        )
+        trans.date = yesterday.isoformat()
+        trans.save()
+        self.assertEqual(self.snapshot(self.today).expense, 0)
+        self.assertEqual(self.snapshot(yesterday).expense, Decimal('300'))
+
+    def test_animal_status_updates_counts(self):
+        self.assertEqual(self.snapshot(self.today).active_cows, 1)
+        self.cow.status = 'sold'
+        self.cow.save()
+        self.assertEqual(self.snapshot(self.today).active_cows, 0)
+
+    def test_rebuild_matches_incremental(self):
+        for offset in range(5):
+            day = self.today - timedelta(days=offset)
+            MilkProduction.objects.create(
+                animal=self.cow, date=day, morning_liters=offset, evening_liters=1
+            )
+            Transaction.objects.create(
+                transaction_type='income', category='milk_sale', date=day,
+                amount=100 * offset, description='Milk',
+            )
+        expected = list(DailyFarmSnapshot.objects.values_list('date', 'milk_liters', 'income'))
+
+        DailyFarmSnapshot.objects.all().delete()
+        call_command('rebuild_snapshots', stdout=StringIO())
+        rebuilt = list(DailyFarmSnapshot.objects.values_list('date', 'milk_liters', 'income'))
+        self.assertEqual(rebuilt, expected)
+
+        totals = snapshot_totals(self.today, milk_days=7, money_days=30)
+        self.assertEqual(totals['milk_today'], Decimal('1'))
+        self.assertEqual(totals['income_30d'], Decimal('1000'))
+
+
+class AsyncDashboardTests(TransactionTestCase):
+    # Sections run on worker threads with their own connections, which
+    # only see committed data, hence TransactionTestCase.
+
+    def setUp(self):
+        cache.clear()
+        self.user = get_user_model().objects.create_user('farmer', password='pass')
+        today = timezone.localdate()
+        cow = Animal.objects.create(animal_type='cow', tag_number='C1', gender='female')
+        MilkProduction.objects.create(animal=cow, date=today, morning_liters=5, evening_liters=4)
+        Transaction.objects.create(
+            transaction_type='income', category='milk_sale', date=today,
+            amount=1000, description='Milk',
+        )
+
+    def request(self, user):
+        request = AsyncRequestFactory().get(reverse('dashboard:home'))
+        request.user = user
+
+        async def auser():
+            return user
+        request.auser = auser
+        return request
+
+    async def test_matches_sync_context(self):
+        response = await views.dashboard_async(self.request(self.user))
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'KSh 1000')
+        self.assertContains(response, '9.0')
+
+    async def test_redirects_anonymous(self):
+        response = await views.dashboard_async(self.request(AnonymousUser()))
+        self.assertEqual(response.status_code, 302)
+
+
+class ExportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user('farmer', password='pass')
+        cls.today = timezone.localdate()
+        for day in range(5):
+            Transaction.objects.create(
+                transaction_type='expense' if day % 2 else 'income', category='labor',
+                date=cls.today - timedelta(days=day * 100), amount=100 + day,
+                description=f'Row {day}',
+            )
+        cow = Animal.objects.create(animal_type='cow', tag_number='C1', gender='female')
+        MilkProduction.objects.create(animal=cow, date=cls.today, morning_liters=5, evening_liters=4)
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def csv_rows(self, response):
+        return list(csv.reader(io.StringIO(b''.join(response.streaming_content).decode())))
+
+    def test_csv_streams_whole_ledger_oldest_first(self):
+        response = self.client.get(reverse('dashboard:export', args=['transactions', 'csv']))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        rows = self.csv_rows(response)
+        self.assertEqual(rows[0][:3], ['Date', 'Type', 'Category'])
+        self.assertEqual([row[3] for row in rows[1:]], ['Row 4', 'Row 3', 'Row 2', 'Row 1', 'Row 0'])
+        self.assertEqual(rows[-1][1:3], ['Income', 'Labor/Wages'])
+
+    def test_list_filters_apply(self):
+        url = reverse('dashboard:export', args=['transactions', 'csv'])
+        rows = self.csv_rows(self.client.get(url, {'type': 'expense', 'days': 200}))
+        self.assertEqual([row[3] for row in rows[1:]], ['Row 1'])
+
+        rows = self.csv_rows(self.client.get(
+            reverse('dashboard:export', args=['milk', 'csv']), {'animal': 999}
+        ))
+        self.assertEqual(len(rows), 1)
+
+    def test_xlsx(self):
+        response = self.client.get(reverse('dashboard:export', args=['milk', 'xlsx']))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(b''.join(response.streaming_content).startswith(b'PK'))
+
+    def test_formulas_are_not_exported_live(self):
+        Transaction.objects.create(
+            transaction_type='income', category='milk_sale', date=self.today, amount=5,
+            description='=HYPERLINK("http://x","y")', party_name='+254700', reference='-1', notes='Fine',
+        )
+        rows = self.csv_rows(self.client.get(reverse('dashboard:export', args=['transactions', 'csv'])))
+        self.assertEqual(rows[-1][3], '\'=HYPERLINK("http://x","y")')
+        self.assertEqual(rows[-1][6:], ["'+254700", "'-1", 'Fine'])
+        # Numbers are left alone
+        self.assertEqual(rows[-1][4], '5.00')
+
+        response = self.client.get(reverse('dashboard:export', args=['transactions', 'xlsx']))
+        with zipfile.ZipFile(io.BytesIO(b''.join(response.streaming_content))) as workbook:
+            sheet = workbook.read('xl/worksheets/sheet1.xml').decode()
+        self.assertNotIn('<f>', sheet)
+        self.assertIn('=HYPERLINK', sheet)
+
+    def test_unknown_dataset(self):
+        response = self.client.get(reverse('dashboard:export', args=['users', 'csv']))
+        self.assertEqual(response.status_code, 404)
+
+    def test_command(self):
+        out, err = StringIO(), StringIO()
+        call_command('export_records', 'transactions', '--filter', 'type=income',
+                     stdout=out, stderr=err)
+        self.assertEqual(len(out.getvalue().splitlines()), 4)
+        self.assertIn('Exported 3 row(s)', err.getvalue())
+
+
+class SearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user('farmer', password='pass')
+        today = timezone.localdate()
+        cls.cow = Animal.objects.create(
+            animal_type='cow', tag_number='KE-101', name='Daisy', breed='Friesian', gender='female',
+        )
+        cls.farm = Farm.objects.create(name='Mwea Plot', size_acres=5, location='Kirinyaga')
+        cls.season = CropSeason.objects.create(
+            farm=cls.farm, crop_type='maize', crop_variety='H614', planting_date=today,
+            expected_harvest_date=today + timedelta(days=120), area_planted_acres=2, notes='Drought tolerant',
+        )
+        cls.sale = Transaction.objects.create(
+            transaction_type='income', category='milk_sale', amount=900, date=today,
+            description='Milk to Brookside', party_name='Mwea Traders', reference='INV-88',
+        )
+
+    def kinds(self, query):
+        return [(result['kind'], result['pk']) for result in search.find(query)]
+
+    def test_finds_each_kind_by_prefix(self):
+        self.assertEqual(self.kinds('fries'), [('animal', self.cow.pk)])
+        self.assertEqual(self.kinds('ke 101'), [('animal', self.cow.pk)])
+        self.assertEqual(self.kinds('kirinyaga'), [('farm', self.farm.pk)])
+        self.assertEqual(self.kinds('drought'), [('season', self.season.pk)])
+        self.assertEqual(self.kinds('inv-88'), [('transaction', self.sale.pk)])
+        result = search.find('daisy')[0]
+        self.assertEqual(result['url'], reverse('dairy:animal_detail', args=[self.cow.pk]))
+        self.assertEqual(result['title'], 'KE-101 Daisy')
+
+    def test_all_words_must_match_and_titles_rank_first(self):
+        self.assertEqual(self.kinds('daisy friesian'), [('animal', self.cow.pk)])
+        self.assertEqual(self.kinds('daisy maize'), [])
+        # The farm's name beats the buyer named after it
+        self.assertEqual(self.kinds('mwea'), [('farm', self.farm.pk), ('transaction', self.sale.pk)])
+        self.assertEqual(search.find('"*) OR -'), [])
+
+    def test_index_follows_saves_and_deletes(self):
+        self.cow.name = 'Rosie'
+        self.cow.save()
+        self.assertEqual(self.kinds('daisy'), [])
+        self.assertEqual(self.kinds('rosie'), [('animal', self.cow.pk)])
+        self.farm.delete()
+        self.assertEqual(self.kinds('mwea'), [('transaction', self.sale.pk)])
+
+    def test_bulk_created_transactions_are_indexed(self):
+        from finance.signals import bulk_created
+        rows = Transaction.objects.bulk_create([
+            Transaction(transaction_type='expense', category='labor', amount=300, description=f'Weeding gang {n}')
+            for n in range(3)
+        ])
+        bulk_created(rows)
+        self.assertEqual(len(search.find('weeding')), 3)
+
+    def test_rebuild_command(self):
+        from django.db import connection
+        with connection.cursor() as cursor:
+            cursor.execute('DELETE FROM dashboard_search')
+        self.assertEqual(search.find('daisy'), [])
+        out = StringIO()
+        call_command('rebuild_search_index', stdout=out)
+        self.assertIn('1 animal(s)', out.getvalue())
+        self.assertEqual(self.kinds('daisy'), [('animal', self.cow.pk)])
+
+    def test_fallback_without_index(self):
+        with mock.patch.object(search, '_sql', return_value=None):
+            self.assertEqual(self.kinds('friesian'), [('animal', self.cow.pk)])
+            self.assertEqual(
+                sorted(self.kinds('mwea')), sorted([('farm', self.farm.pk), ('transaction', self.sale.pk)]),
+            )
+
+    def test_view(self):
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('dashboard:home'))
+        self.assertContains(response, 'name="q"')
+        # Session, user and one index query
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse('dashboard:search'), {'q': 'H61'})
+        self.assertContains(response, reverse('crops:season_detail', args=[self.season.pk]))
+        self.assertEqual(response.context['counts'], {'Crop Season': 1})
+        self.assertContains(response, 'value="H61"')
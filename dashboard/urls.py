@@ -1,8 +1,11 @@
+from django.conf import settings
 from django.urls import path
 from . import views
 
 app_name = 'dashboard'
 
 urlpatterns = [
-    path('', views.dashboard, name='home'),
+    path('', views.dashboard_async if settings.ASYNC_HOME_VIEWS else views.dashboard, name='home'),
+    path('export/<slug:dataset>.<slug:fmt>', views.export, name='export'),
+    path('search/', views.search, name='search'),
 ]
\ No newline at end of file
@@ -1,74 +1,69 @@
 from django.shortcuts import render
 from django.contrib.auth.decorators import login_required
-from django.db.models import Sum, Q
-from datetime import date, timedelta
+from django.utils import timezone
+from asgiref.sync import sync_to_async
+from datetime import timedelta
 
-from dairy.models import Animal, MilkProduction, HealthRecord, Pregnancy
+from dairy.models import MilkAlert, MilkProduction, Pregnancy
+from dairy.aggregates import herd_counts
+from dairy.health import due_soon
 from crops.models import CropSeason
+from crops.aggregates import season_counts
 from finance.models import Transaction
+from .snapshots import snapshot_totals
+from .cache import cache_home_page
+from .concurrency import agather_sections, async_login_required, gather_sections
+from .exports import export_response
+from .search import find
 
 
-@login_required
-def dashboard(request):
-    """Main dashboard - farm overview"""
-    today = date.today()
-    this_month = today.replace(day=1)
-    last_7_days = today - timedelta(days=7)
-    last_30_days = today - timedelta(days=30)
-    
-    # === LIVESTOCK SUMMARY ===
-    total_cows = Animal.objects.filter(animal_type='cow', status='active').count()
-    total_sheep = Animal.objects.filter(animal_type='sheep', status='active').count()
-    
-    # Today's milk
-    today_milk = MilkProduction.objects.filter(date=today).aggregate(
-        total=Sum('morning_liters') + Sum('evening_liters')
-    )['total'] or 0
-    
-    # Last 7 days milk
-    milk_7d = MilkProduction.objects.filter(date__gte=last_7_days).aggregate(
-        total=Sum('morning_liters') + Sum('evening_liters')
-    )['total'] or 0
-    
-    # === CROPS SUMMARY ===
-    active_crops = CropSeason.objects.filter(status__in=['planned', 'planted']).count()
-    
+# Each section is independent of the others, so the async view can run
+# them concurrently. Lists are materialised inside the section so their
+# queries run there too.
+
+def livestock_section(today):
+    """Active cow and sheep counts"""
+    herd = herd_counts()
+    return {
+        'total_cows': herd['cows'],
+        'total_sheep': herd['sheep'],
+    }
+
+
+def totals_section(today):
+    """Milk and money totals from the daily snapshots"""
+    # Today, last 7 days of milk; this month and last 30 days of money
+    totals = snapshot_totals(today, milk_days=7, money_days=30)
+    return {
+        'today_milk': totals['milk_today'],
+        'milk_7d': totals['milk_recent'],
+        'month_income': totals['month_income'],
+        'month_expense': totals['month_expense'],
+        'month_profit': totals['month_profit'],
+        'income_30d': totals['income_30d'],
+        'expense_30d': totals['expense_30d'],
+        'profit_30d': totals['profit_30d'],
+    }
+
+
+def crops_section(today):
+    """Active seasons and harvests due soon"""
     # Harvest due soon (next 14 days)
     harvest_due = CropSeason.objects.filter(
         status__in=['planted'],
         expected_harvest_date__lte=today + timedelta(days=14),
         expected_harvest_date__gte=today
-    )
-    
-    # === FINANCE SUMMARY ===
-    # This month
-    month_income = Transaction.objects.filter(
-        transaction_type='income',
-        date__gte=this_month
-    ).aggregate(Sum('amount'))['amount__sum'] or 0
-    
-    month_expense = Transaction.objects.filter(
-        transaction_type='expense',
-        date__gte=this_month
-    ).aggregate(Sum('amount'))['amount__sum'] or 0
-    
-    # Last 30 days
-    income_30d = Transaction.objects.filter(
-        transaction_type='income',
-        date__gte=last_30_days
-    ).aggregate(Sum('amount'))['amount__sum'] or 0
-    
-    expense_30d = Transaction.objects.filter(
-        transaction_type='expense',
-        date__gte=last_30_days
-    ).aggregate(Sum('amount'))['amount__sum'] or 0
-    
-    # === ALERTS & REMINDERS ===
+    ).select_related('farm')
+    return {
+        'active_crops': season_counts()['active'],
+        'harvest_due': list(harvest_due),
+    }
+
+
+def alerts_section(today):
+    """Health checkups and deliveries coming up, and recent milk drops"""
     # Health checkups due
-    health_due = HealthRecord.objects.filter(
-        next_due_date__lte=today + timedelta(days=7),
-        next_due_date__gte=today
-    ).select_related('animal')[:5]
+    health_due = due_soon(today)[:5]
     
     # Pregnancies due soon
     pregnancies_due = Pregnancy.objects.filter(
@@ -77,36 +72,71 @@ def dashboard(request):
         status__in=['bred', 'confirmed', 'due_soon']
     ).select_related('animal')[:5]
     
-    # Recent activity
-    recent_transactions = Transaction.objects.all()[:5]
-    recent_milk = MilkProduction.objects.select_related('animal')[:5]
+    # Flagged by the nightly detect_milk_anomalies job
+    milk_drops = MilkAlert.objects.filter(
+        resolved=False,
+        date__gte=today - timedelta(days=7),
+    ).select_related('animal')[:5]
     
-    context = {
-        # Livestock
-        'total_cows': total_cows,
-        'total_sheep': total_sheep,
-        'today_milk': today_milk,
-        'milk_7d': milk_7d,
-        
-        # Crops
-        'active_crops': active_crops,
-        'harvest_due': harvest_due,
-        
-        # Finance
-        'month_income': month_income,
-        'month_expense': month_expense,
-        'month_profit': month_income - month_expense,
-        'income_30d': income_30d,
-        'expense_30d': expense_30d,
-        'profit_30d': income_30d - expense_30d,
-        
-        # Alerts
-        'health_due': health_due,
-        'pregnancies_due': pregnancies_due,
-        
-        # Recent activity
-        'recent_transactions': recent_transactions,
-        'recent_milk': recent_milk,
+    return {
+        'health_due': list(health_due),
+        'pregnancies_due': list(pregnancies_due),
+        'milk_drops': list(milk_drops),
+    }
+
+
+def recent_section(today):
+    """Latest transactions"""
+    return {
+        'recent_transactions': list(Transaction.objects.all()[:5]),
+        # Not shown on the page; left lazy so it costs nothing
+        'recent_milk': MilkProduction.objects.select_related('animal')[:5],
     }
+
+
+DASHBOARD_SECTIONS = [
+    livestock_section,
+    totals_section,
+    crops_section,
+    alerts_section,
+    recent_section,
+]
+
+
+@login_required
+@cache_home_page('dashboard', 'dairy', 'crops', 'finance')
+def dashboard(request):
+    """Main dashboard - farm overview"""
+    context = gather_sections(DASHBOARD_SECTIONS, timezone.localdate())
+    return render(request, 'dashboard/home.html', context)
+
+
+@async_login_required
+@cache_home_page('dashboard', 'dairy', 'crops', 'finance')
+async def dashboard_async(request):
+    """Main dashboard for ASGI - sections run concurrently"""
+    context = await agather_sections(DASHBOARD_SECTIONS, timezone.localdate())
+    return await sync_to_async(render)(request, 'dashboard/home.html', context)
+
+
+@login_required
+def export(request, dataset, fmt):
+    """Download a dataset as CSV or XLSX, filtered like its list view"""
+    return export_response(dataset, fmt, request.GET, today=timezone.localdate())
+
+
+@login_required
+def search(request):
+    """Ranked matches for the header search box"""
+    query = request.GET.get('q', '').strip()
+    results = find(query) if query else []
+    counts = {}
+    for result in results:
+        counts[result['label']] = counts.get(result['label'], 0) + 1
     
-    return render(request, 'dashboard/home.html', context)
\ No newline at end of file
+    context = {
+        'search_query': query,
+        'results': results,
+        'counts': counts,
+    }
+    return render(request, 'dashboard/search.html', context)
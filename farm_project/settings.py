@@ -75,6 +75,13 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'farm_project.wsgi.application'
 
+# Serve the concurrent async home views. asgi.py turns this on; under
+# WSGI the sync views avoid the per-request event loop.
+ASYNC_HOME_VIEWS = os.environ.get('ASYNC_HOME_VIEWS', '') == '1'
+
+# Threads available to the async home views for running query groups
+HOME_VIEW_WORKERS = int(os.environ.get('HOME_VIEW_WORKERS', 8))
+
 
 # Database
 # https://docs.djangoproject.com/en/5.1/ref/settings/#databases
@@ -83,10 +90,34 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # Keep connections open between requests; the async home views'
+        # worker threads rely on this to avoid reconnecting per section.
+        'CONN_MAX_AGE': 60,
+        'CONN_HEALTH_CHECKS': True,
     }
 }
 
 
+# Cache
+# Local memory is enough for a single worker. Set CACHE_DIR to share the
+# home-page cache between several worker processes through the filesystem.
+
+if os.environ.get('CACHE_DIR'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': os.environ['CACHE_DIR'],
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'farm-system',
+        }
+    }
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
 
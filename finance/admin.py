@@ -1,17 +1,41 @@
 from django.contrib import admin
-from .models import Transaction, Budget
+from .models import Transaction, Budget, BudgetLine, MonthlyCategoryTotal, CategoryRule, Settlement
+
+
+class SettlementInline(admin.TabularInline):
+    model = Settlement
+    extra = 0
 
 
 @admin.register(Transaction)
 class TransactionAdmin(admin.ModelAdmin):
+    inlines = [SettlementInline]
     list_display = ['date', 'transaction_type', 'category', 'amount', 'party_name', 'payment_method']
     list_filter = ['transaction_type', 'category', 'payment_method', 'date']
     search_fields = ['description', 'party_name', 'reference']
     date_hierarchy = 'date'
 
 
+class BudgetLineInline(admin.TabularInline):
+    model = BudgetLine
+    extra = 1
+
+
 @admin.register(Budget)
 class BudgetAdmin(admin.ModelAdmin):
+    inlines = [BudgetLineInline]
     list_display = ['name', 'start_date', 'end_date', 'target_income', 'target_expense']
     search_fields = ['name']
-    date_hierarchy = 'start_date'
\ No newline at end of file
+    date_hierarchy = 'start_date'
+
+@admin.register(MonthlyCategoryTotal)
+class MonthlyCategoryTotalAdmin(admin.ModelAdmin):
+    list_display = ['year', 'month', 'transaction_type', 'category', 'total', 'count']
+    list_filter = ['year', 'transaction_type', 'category']
+
+
+@admin.register(CategoryRule)
+class CategoryRuleAdmin(admin.ModelAdmin):
+    list_display = ['keyword', 'transaction_type', 'category', 'priority']
+    list_editable = ['priority']
+    search_fields = ['keyword']
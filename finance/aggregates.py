@@ -0,0 +1,31 @@
+"""
+Single-query aggregates for finance summaries.
+"""
+from django.db.models import Q, Sum
+from datetime import timedelta
+
+from dashboard.models import DailyFarmSnapshot
+
+
+def transaction_totals(today, days=30):
+    """
+    Month-to-date and last-`days` income/expense in one query.
+
+    Reads the per-day snapshot rows rather than the ledger, so the cost
+    is bounded by the window length, not the number of transactions.
+    """
+    month_start = today.replace(day=1)
+    since = today - timedelta(days=days)
+    in_month = Q(date__gte=month_start)
+    in_window = Q(date__gte=since)
+
+    totals = DailyFarmSnapshot.objects.filter(date__gte=min(month_start, since)).aggregate(
+        month_income=Sum('income', filter=in_month),
+        month_expense=Sum('expense', filter=in_month),
+        income_30d=Sum('income', filter=in_window),
+        expense_30d=Sum('expense', filter=in_window),
+    )
+    totals = {key: value or 0 for key, value in totals.items()}
+    totals['month_profit'] = totals['month_income'] - totals['month_expense']
+    totals['profit_30d'] = totals['income_30d'] - totals['expense_30d']
+    return totals
@@ -0,0 +1,205 @@
+"""
+Running balances per payment method.
+
+A balance is income minus expense, plus the Settlements received on the
+method; the 'credit' balance loses each settlement on the day it is
+received. The ledger computes the running balance over a date range,
+starting from the opening balance at the first day of the range. Opening
+balances start from the latest month-end BalanceCheckpoint before the
+date, so they cost at most a month of rows whatever the date.
+"""
+from collections import defaultdict
+from functools import reduce
+from heapq import merge
+from operator import or_
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.db.models import Case, DecimalField, F, Max, Q, Sum, When
+from django.db.models.functions import ExtractMonth, ExtractYear
+from django.utils import timezone
+
+from .models import Transaction, BalanceCheckpoint, Settlement
+
+
+ZERO = Decimal('0')
+
+
+def signed_amount():
+    """Transaction amount, negative for expenses"""
+    return Case(
+        When(transaction_type='income', then=F('amount')),
+        default=-F('amount'),
+        output_field=DecimalField(max_digits=14, decimal_places=2),
+    )
+
+
+def month_end_before(day):
+    return day.replace(day=1) - timedelta(days=1)
+
+
+def apply_delta(payment_method, day, amount):
+    """Add a signed `amount` dated `day` to the checkpoints it falls before"""
+    if amount:
+        BalanceCheckpoint.objects.filter(
+            payment_method=payment_method, date__gte=day
+        ).update(balance=F('balance') + amount)
+
+
+def balances(day):
+    """
+    Balance of every payment method at the start of `day`.
+
+    Four queries: the latest checkpoint date per method, those
+    checkpoints, and one grouped sum each of the transactions and the
+    settlements after them. If a method's latest checkpoint is older than
+    the previous month end, that checkpoint is written on the way so the
+    next lookup is shorter.
+    """
+    latest = dict(
+        BalanceCheckpoint.objects.filter(date__lt=day)
+        .values('payment_method').annotate(last=Max('date'))
+        .values_list('payment_method', 'last')
+    )
+    result = {method: ZERO for method, _ in Transaction.PAYMENT_METHODS}
+    if latest:
+        checkpoints = BalanceCheckpoint.objects.filter(
+            reduce(or_, (Q(payment_method=m, date=d) for m, d in latest.items()))
+        )
+        for checkpoint in checkpoints:
+            result[checkpoint.payment_method] = checkpoint.balance
+
+    # Only the rows after each method's checkpoint
+    since = [Q(payment_method=m, date__gt=d) for m, d in latest.items()]
+    since.append(~Q(payment_method__in=list(latest)))
+    since = reduce(or_, since)
+    previous_end = month_end_before(day)
+    sums = (
+        Transaction.objects.filter(date__lt=day).filter(since)
+        .values('payment_method')
+        .annotate(
+            total=Sum(signed_amount()),
+            after=Sum(signed_amount(), filter=Q(date__gt=previous_end)),
+        )
+        .order_by()
+    )
+    # Settlements add to their method and come off credit
+    credit_since = Q(date__gt=latest['credit']) if 'credit' in latest else Q(date__lt=day)
+    settled = (
+        Settlement.objects.filter(date__lt=day)
+        .values('payment_method')
+        .annotate(
+            received=Sum('amount', filter=since),
+            received_after=Sum('amount', filter=since & Q(date__gt=previous_end)),
+            credited=Sum('amount', filter=credit_since),
+            credited_after=Sum('amount', filter=credit_since & Q(date__gt=previous_end)),
+        )
+        .order_by()
+    )
+
+    changes = defaultdict(lambda: [ZERO, ZERO])
+    for row in sums:
+        change = changes[row['payment_method']]
+        change[0] += row['total']
+        change[1] += row['after'] or ZERO
+    for row in settled:
+        for method, sign, total, after in (
+            (row['payment_method'], 1, row['received'], row['received_after']),
+            ('credit', -1, row['credited'], row['credited_after']),
+        ):
+            if total:
+                changes[method][0] += sign * total
+                changes[method][1] += sign * (after or ZERO)
+
+    missing = []
+    for method, (total, after) in changes.items():
+        result[method] += total
+        if latest.get(method) is None or latest[method] < previous_end:
+            missing.append(BalanceCheckpoint(
+                payment_method=method, date=previous_end, balance=result[method] - after,
+            ))
+    if missing:
+        BalanceCheckpoint.objects.bulk_create(missing, ignore_conflicts=True)
+    return result
+
+
+def opening_balance(payment_method, day):
+    return balances(day)[payment_method]
+
+
+def _settlements(payment_method):
+    """Settlements moving money on `payment_method`, with their signed amount"""
+    if payment_method == 'credit':
+        return Settlement.objects.annotate(signed=-F('amount'))
+    return Settlement.objects.filter(payment_method=payment_method).annotate(signed=F('amount'))
+
+
+def ledger(payment_method, start=None, end=None):
+    """
+    Transactions and settlements for one payment method, oldest first,
+    each with `signed` (its signed amount) and `running` (the running
+    total since `start`). Add opening_balance(payment_method, start) for
+    the balance. Settlement rows carry their `sale`.
+    """
+    rows = Transaction.objects.filter(payment_method=payment_method)
+    settlements = _settlements(payment_method).select_related('sale')
+    if start:
+        rows = rows.filter(date__gte=start)
+        settlements = settlements.filter(date__gte=start)
+    if end:
+        rows = rows.filter(date__lte=end)
+        settlements = settlements.filter(date__lte=end)
+    order = ('date', 'created_at', 'id')
+    entries = merge(
+        rows.annotate(signed=signed_amount()).order_by(*order),
+        settlements.order_by(*order),
+        key=lambda entry: (entry.date, entry.created_at),
+    )
+    running = ZERO
+    result = []
+    for entry in entries:
+        running += entry.signed
+        entry.running = running
+        result.append(entry)
+    return result
+
+
+def rebuild():
+    """Recreate month-end checkpoints up to the end of last month"""
+    last_end = month_end_before(timezone.localdate())
+    months = (
+        Transaction.objects.filter(date__lte=last_end)
+        .annotate(year=ExtractYear('date'), month=ExtractMonth('date'))
+        .values('payment_method', 'year', 'month')
+        .annotate(total=Sum(signed_amount()))
+        .order_by('payment_method', 'year', 'month')
+    )
+    settled = (
+        Settlement.objects.filter(date__lte=last_end)
+        .annotate(year=ExtractYear('date'), month=ExtractMonth('date'))
+        .values('payment_method', 'year', 'month')
+        .annotate(total=Sum('amount'))
+        .order_by()
+    )
+    totals = {}
+    for row in months:
+        totals.setdefault(row['payment_method'], {})[(row['year'], row['month'])] = row['total']
+    for row in settled:
+        key = (row['year'], row['month'])
+        for method, amount in ((row['payment_method'], row['total']), ('credit', -row['total'])):
+            by_month = totals.setdefault(method, {})
+            by_month[key] = by_month.get(key, ZERO) + amount
+
+    checkpoints = []
+    for method, by_month in totals.items():
+        year, month = min(by_month)
+        balance = ZERO
+        while (year, month) <= (last_end.year, last_end.month):
+            balance += by_month.get((year, month), ZERO)
+            year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+            end = date(year, month, 1) - timedelta(days=1)
+            checkpoints.append(BalanceCheckpoint(payment_method=method, date=end, balance=balance))
+
+    BalanceCheckpoint.objects.all().delete()
+    BalanceCheckpoint.objects.bulk_create(checkpoints, batch_size=500)
+    return len(checkpoints)
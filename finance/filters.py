@@ -0,0 +1,180 @@
+"""
+Validated filters and keyset pagination for the transaction list.
+"""
+import base64
+import json
+from datetime import date, datetime, timedelta
+
+from django import forms
+from django.db.models import Q
+
+from .models import Transaction
+
+
+class TransactionFilterForm(forms.Form):
+    """GET filters for transaction_list; invalid fields are reported and ignored"""
+    type = forms.ChoiceField(choices=(('', 'All Types'),) + Transaction.TRANSACTION_TYPES, required=False)
+    category = forms.ChoiceField(choices=(('', 'All Categories'),) + Transaction.CATEGORIES, required=False)
+    payment_method = forms.ChoiceField(choices=(('', 'Any Payment'),) + Transaction.PAYMENT_METHODS, required=False)
+    party = forms.CharField(max_length=200, required=False)
+    min_amount = forms.DecimalField(min_value=0, required=False)
+    max_amount = forms.DecimalField(min_value=0, required=False)
+    start = forms.DateField(required=False)
+    end = forms.DateField(required=False)
+    days = forms.IntegerField(min_value=1, max_value=36500, required=False)
+
+    def clean(self):
+        cleaned = super().clean()
+        low, high = cleaned.get('min_amount'), cleaned.get('max_amount')
+        if low is not None and high is not None and low > high:
+            self.add_error('max_amount', 'Must not be less than the minimum amount.')
+        start, end = cleaned.get('start'), cleaned.get('end')
+        if start and end and start > end:
+            self.add_error('end', 'Must not be before the start date.')
+        return cleaned
+
+    def filter(self, queryset, today=None):
+        """Apply every valid filter to `queryset`"""
+        # cleaned_data only holds the fields that validated
+        self.is_valid()
+        data = self.cleaned_data
+        if data.get('type'):
+            queryset = queryset.filter(transaction_type=data['type'])
+        if data.get('category'):
+            queryset = queryset.filter(category=data['category'])
+        if data.get('payment_method'):
+            queryset = queryset.filter(payment_method=data['payment_method'])
+        if data.get('party'):
+            queryset = queryset.filter(party_name__icontains=data['party'])
+        if data.get('min_amount') is not None:
+            queryset = queryset.filter(amount__gte=data['min_amount'])
+        if data.get('max_amount') is not None:
+            queryset = queryset.filter(amount__lte=data['max_amount'])
+        
+        # An explicit date range wins over the "last N days" shortcut
+        if data.get('start') or data.get('end'):
+            if data.get('start'):
+                queryset = queryset.filter(date__gte=data['start'])
+            if data.get('end'):
+                queryset = queryset.filter(date__lte=data['end'])
+        elif data.get('days'):
+            today = today or date.today()
+            queryset = queryset.filter(date__gte=today - timedelta(days=data['days']))
+        return queryset
+
+
+class LedgerFilterForm(forms.Form):
+    """GET filters for the running-balance ledger"""
+    payment_method = forms.ChoiceField(choices=Transaction.PAYMENT_METHODS, required=False)
+    start = forms.DateField(required=False)
+    end = forms.DateField(required=False)
+
+    def clean(self):
+        cleaned = super().clean()
+        start, end = cleaned.get('start'), cleaned.get('end')
+        if start and end and start > end:
+            self.add_error('end', 'Must not be before the start date.')
+        return cleaned
+
+
+class SeriesFilterForm(forms.Form):
+    """GET parameters for the time-series report"""
+    period = forms.ChoiceField(
+        choices=(('month', 'Month'), ('week', 'Week'), ('quarter', 'Quarter')), required=False
+    )
+    start = forms.DateField(required=False)
+    end = forms.DateField(required=False)
+    by = forms.ChoiceField(choices=(('', 'Totals'), ('category', 'Category')), required=False)
+    compare = forms.ChoiceField(choices=(('', 'None'), ('yoy', 'Year over year')), required=False)
+
+    # Keeps a weekly report over a long span to a sensible size
+    MAX_DAYS = 366 * 10
+
+    def clean(self):
+        cleaned = super().clean()
+        start, end = cleaned.get('start'), cleaned.get('end')
+        if start and end:
+            if start > end:
+                self.add_error('end', 'Must not be before the start date.')
+            elif (end - start).days > self.MAX_DAYS:
+                self.add_error('start', 'Reports cover at most ten years.')
+        return cleaned
+
+
+class SettlementForm(forms.Form):
+    """POST body for recording a payment against a credit sale"""
+    amount = forms.DecimalField(min_value=0.01, max_digits=12, decimal_places=2)
+    payment_method = forms.ChoiceField(
+        choices=[choice for choice in Transaction.PAYMENT_METHODS if choice[0] != 'credit']
+    )
+    date = forms.DateField(required=False, help_text="Day the money was received (default today)")
+
+
+# === Keyset pagination on (date, created_at, id), newest first ===
+
+def encode_cursor(transaction):
+    key = [transaction.date.isoformat(), transaction.created_at.isoformat(), transaction.pk]
+    return base64.urlsafe_b64encode(json.dumps(key).encode()).decode().rstrip('=')
+
+
+def decode_cursor(value):
+    """(date, created_at, id) from a cursor string, or None if malformed"""
+    if not value:
+        return None
+    try:
+        padded = value + '=' * (-len(value) % 4)
+        day, created, pk = json.loads(base64.urlsafe_b64decode(padded))
+        return date.fromisoformat(day), datetime.fromisoformat(created), int(pk)
+    except (ValueError, TypeError):
+        return None
+
+
+def _older_than(key):
+    day, created, pk = key
+    # The plain date bound is the range the index reads; the OR settles ties
+    return Q(date__lte=day) & (
+        Q(date__lt=day)
+        | Q(date=day, created_at__lt=created)
+        | Q(date=day, created_at=created, id__lt=pk)
+    )
+
+
+def _newer_than(key):
+    day, created, pk = key
+    return Q(date__gte=day) & (
+        Q(date__gt=day)
+        | Q(date=day, created_at__gt=created)
+        | Q(date=day, created_at=created, id__gt=pk)
+    )
+
+
+def keyset_page(queryset, after=None, before=None, size=50):
+    """
+    One page of `queryset`, newest first, positioned by cursor.
+    
+    `after` continues past the last row of a page (older rows); `before`
+    goes back to the rows preceding the first row of a page. Each page is
+    an indexed range read of size + 1 rows however deep it is.
+    """
+    after, before = decode_cursor(after), decode_cursor(before)
+    if before:
+        rows = list(
+            queryset.filter(_newer_than(before))
+            .order_by('date', 'created_at', 'id')[:size + 1]
+        )
+        has_previous = len(rows) > size
+        rows = rows[:size][::-1]
+        has_next = True
+    else:
+        if after:
+            queryset = queryset.filter(_older_than(after))
+        rows = list(queryset.order_by('-date', '-created_at', '-id')[:size + 1])
+        has_next = len(rows) > size
+        rows = rows[:size]
+        has_previous = after is not None
+    
+    return {
+        'items': rows,
+        'next_cursor': encode_cursor(rows[-1]) if rows and has_next else None,
+        'previous_cursor': encode_cursor(rows[0]) if rows and has_previous else None,
+    }
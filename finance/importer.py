@@ -0,0 +1,232 @@
+"""
+Bulk import of M-Pesa and bank statements (CSV) into Transaction.
+
+The file is read one line at a time. Lines are categorised with
+CategoryRule, checked against the ledger's `reference` index a batch at
+a time and inserted with bulk_create, all inside one transaction.
+bulk_create skips the model signals, so the monthly rollup and balance
+checkpoints are updated per batch and the daily snapshots and home-page
+cache once at the end.
+"""
+import csv
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+
+from django.db import transaction as db_transaction
+
+from dashboard.cache import bump_version
+from dashboard.snapshots import refresh_flows
+from .models import Transaction, CategoryRule
+from .signals import bulk_created
+
+
+BATCH_SIZE = 1000
+
+# Only the first few failures are kept with their reasons
+MAX_ERRORS = 50
+
+# Accepted header names (lower case) for each column we read
+STATEMENT_FORMATS = {
+    'mpesa': {
+        'payment_method': 'mpesa',
+        'columns': {
+            'reference': ['receipt no.', 'receipt no', 'receipt'],
+            'date': ['completion time', 'date'],
+            'details': ['details'],
+            'status': ['transaction status', 'status'],
+            'paid_in': ['paid in'],
+            'withdrawn': ['withdrawn', 'withdrawn amount'],
+        },
+    },
+    'bank': {
+        'payment_method': 'bank',
+        'columns': {
+            'reference': ['reference', 'ref', 'ref no', 'cheque/ref no'],
+            'date': ['transaction date', 'date', 'value date'],
+            'details': ['description', 'narration', 'details', 'particulars'],
+            'paid_in': ['credit', 'money in', 'deposits'],
+            'withdrawn': ['debit', 'money out', 'withdrawals'],
+        },
+    },
+}
+
+REQUIRED_COLUMNS = ('reference', 'date', 'details', 'paid_in', 'withdrawn')
+
+DATE_FORMATS = (
+    '%Y-%m-%d %H:%M:%S', '%Y-%m-%d %H:%M', '%Y-%m-%d',
+    '%d/%m/%Y %H:%M:%S', '%d/%m/%Y %H:%M', '%d/%m/%Y',
+    '%d-%m-%Y', '%d %b %Y', '%d-%b-%Y',
+)
+
+DEFAULT_CATEGORY = {'income': 'other_income', 'expense': 'other_expense'}
+
+
+class StatementError(ValueError):
+    """The file is not a statement we can read"""
+
+
+def _column_map(header, statement_format):
+    """Column positions for `statement_format` if `header` is its header row"""
+    names = [cell.strip().lower() for cell in header]
+    positions = {}
+    for column, aliases in STATEMENT_FORMATS[statement_format]['columns'].items():
+        for alias in aliases:
+            if alias in names:
+                positions[column] = names.index(alias)
+                break
+    if all(column in positions for column in REQUIRED_COLUMNS):
+        return positions
+    return None
+
+
+def _parse_date(value):
+    value = value.strip()
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(value, fmt).date()
+        except ValueError:
+            continue
+    raise ValueError(f'unrecognised date "{value}"')
+
+
+def _parse_amount(value):
+    """Absolute amount from '1,234.50', '-500', '(500.00)' or blank"""
+    value = value.replace(',', '').replace('KES', '').replace('KSh', '').strip('() \t')
+    if not value:
+        return Decimal('0')
+    try:
+        return abs(Decimal(value))
+    except InvalidOperation:
+        raise ValueError(f'invalid amount "{value}"')
+
+
+def _party(details):
+    """M-Pesa details read '<what> to/from <number> - <NAME>'"""
+    if ' - ' in details:
+        return details.rsplit(' - ', 1)[1].strip()[:200]
+    return ''
+
+
+def categorise(details, transaction_type, rules):
+    """Category of the first matching rule, else the type's "other" category"""
+    text = details.lower()
+    for rule in rules:
+        if rule.transaction_type and rule.transaction_type != transaction_type:
+            continue
+        if rule.keyword.lower() in text:
+            return rule.category
+    return DEFAULT_CATEGORY[transaction_type]
+
+
+def _rows(reader, statement_format):
+    """
+    (line number, payment method, cells by column) for each data line.
+
+    Statements often start with a few lines of account details, so
+    everything before the first recognisable header row is ignored.
+    """
+    formats = list(STATEMENT_FORMATS) if statement_format == 'auto' else [statement_format]
+    columns = None
+    for line, cells in enumerate(reader, start=1):
+        if columns is None:
+            for name in formats:
+                columns = _column_map(cells, name)
+                if columns:
+                    payment_method = STATEMENT_FORMATS[name]['payment_method']
+                    break
+            continue
+        if not any(cell.strip() for cell in cells):
+            continue
+        yield line, payment_method, {
+            column: cells[position].strip() if position < len(cells) else ''
+            for column, position in columns.items()
+        }
+    if columns is None:
+        raise StatementError('No statement header row found - is this an M-Pesa or bank CSV?')
+
+
+def import_statement(stream, statement_format='auto', batch_size=BATCH_SIZE, dry_run=False):
+    """
+    Import statement lines from an open text stream.
+
+    Returns counts of inserted, skipped (duplicate reference, incomplete
+    or zero-amount lines) and failed (unreadable) lines, plus the first
+    MAX_ERRORS failures as (line number, reason). With `dry_run` nothing
+    is saved.
+    """
+    result = {'inserted': 0, 'skipped': 0, 'failed': 0, 'errors': []}
+    rules = list(CategoryRule.objects.all())
+    seen = set()
+    days = set()
+
+    def fail(line, reason):
+        result['failed'] += 1
+        if len(result['errors']) < MAX_ERRORS:
+            result['errors'].append((line, reason))
+
+    def flush(batch):
+        # One indexed IN lookup per batch for references already stored
+        stored = set(
+            Transaction.objects.filter(reference__in=[t.reference for t in batch])
+            .values_list('reference', flat=True)
+        )
+        new = [t for t in batch if t.reference not in stored]
+        Transaction.objects.bulk_create(new)
+        result['inserted'] += len(new)
+        result['skipped'] += len(batch) - len(new)
+        days.update(bulk_created(new))
+
+    with db_transaction.atomic():
+        batch = []
+        for line, payment_method, row in _rows(csv.reader(stream), statement_format):
+            if row.get('status') and row['status'].lower() != 'completed':
+                result['skipped'] += 1
+                continue
+            reference = row['reference'][:100]
+            if not reference:
+                fail(line, 'missing reference')
+                continue
+            if reference in seen:
+                result['skipped'] += 1
+                continue
+            try:
+                day = _parse_date(row['date'])
+                paid_in = _parse_amount(row['paid_in'])
+                withdrawn = _parse_amount(row['withdrawn'])
+            except ValueError as e:
+                fail(line, str(e))
+                continue
+            if not paid_in and not withdrawn:
+                result['skipped'] += 1
+                continue
+            seen.add(reference)
+
+            transaction_type = 'income' if paid_in else 'expense'
+            details = row['details'] or 'Statement line'
+            batch.append(Transaction(
+                transaction_type=transaction_type,
+                category=categorise(details, transaction_type, rules),
+                date=day,
+                amount=paid_in or withdrawn,
+                description=details[:300],
+                payment_method=payment_method,
+                party_name=_party(details),
+                reference=reference,
+                notes='Imported from statement',
+            ))
+            if len(batch) >= batch_size:
+                flush(batch)
+                batch = []
+        if batch:
+            flush(batch)
+
+        for day in sorted(days):
+            refresh_flows(day)
+
+        if dry_run:
+            db_transaction.set_rollback(True)
+
+    if result['inserted'] and not dry_run:
+        bump_version('finance')
+        bump_version('dashboard')
+    return result
@@ -0,0 +1,30 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from finance.importer import STATEMENT_FORMATS, StatementError, import_statement
+
+
+class Command(BaseCommand):
+    help = 'Import an M-Pesa or bank statement CSV into the ledger'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Statement CSV file')
+        parser.add_argument('--format', choices=['auto'] + sorted(STATEMENT_FORMATS), default='auto')
+        parser.add_argument('--dry-run', action='store_true', help='Report what would be imported without saving')
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        try:
+            with open(options['path'], newline='', encoding='utf-8-sig', errors='replace') as stream:
+                result = import_statement(stream, options['format'], dry_run=options['dry_run'])
+        except (OSError, StatementError) as e:
+            raise CommandError(str(e))
+
+        for line, reason in result['errors']:
+            self.stderr.write(f'Line {line}: {reason}')
+        prefix = 'Dry run: ' if options['dry_run'] else ''
+        self.stdout.write(self.style.SUCCESS(
+            f"{prefix}{result['inserted']} inserted, {result['skipped']} skipped, "
+            f"{result['failed']} failed in {time.monotonic() - started:.1f}s"
+        ))
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from finance.posting import BATCH_SIZE, backfill
+
+
+class Command(BaseCommand):
+    help = 'Post crop, health, feed and animal purchase records that are not yet in the ledger'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        counts = backfill(options['batch_size'])
+        for source_type, count in counts.items():
+            self.stdout.write(f'{source_type}: {count}')
+        self.stdout.write(self.style.SUCCESS(f'Posted {sum(counts.values())} transaction(s)'))
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from finance.balances import rebuild
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the month-end balance checkpoints for each payment method'
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            count = rebuild()
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {count} balance checkpoint(s)'))
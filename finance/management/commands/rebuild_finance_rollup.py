@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from finance.rollup import rebuild
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the monthly per-category transaction totals'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--year', type=int, help='Only rebuild this year (default: all)')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            count = rebuild(options['year'])
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {count} monthly total(s)'))
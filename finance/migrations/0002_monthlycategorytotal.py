@@ -0,0 +1,29 @@
+# Generated by Django 5.0.1 on 2026-10-16 20:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finance', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MonthlyCategoryTotal',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('year', models.PositiveSmallIntegerField()),
+                ('month', models.PositiveSmallIntegerField()),
+                ('transaction_type', models.CharField(choices=[('income', 'Income'), ('expense', 'Expense')], max_length=10)),
+                ('category', models.CharField(choices=[('milk_sale', 'Milk Sale'), ('crop_sale', 'Crop Sale'), ('animal_sale', 'Animal Sale'), ('other_income', 'Other Income'), ('feed', 'Animal Feed'), ('veterinary', 'Veterinary/Health'), ('seeds', 'Seeds'), ('fertilizer', 'Fertilizer'), ('pesticide', 'Pesticide'), ('labor', 'Labor/Wages'), ('transport', 'Transport'), ('equipment', 'Equipment/Tools'), ('utilities', 'Utilities'), ('other_expense', 'Other Expense')], max_length=30)),
+                ('total', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('count', models.IntegerField(default=0)),
+            ],
+            options={
+                'ordering': ['-year', '-month', 'transaction_type', 'category'],
+                'unique_together': {('year', 'month', 'transaction_type', 'category')},
+            },
+        ),
+    ]
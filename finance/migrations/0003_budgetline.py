@@ -0,0 +1,28 @@
+# Generated by Django 5.0.1 on 2026-10-16 20:42
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finance', '0002_monthlycategorytotal'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BudgetLine',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('transaction_type', models.CharField(choices=[('income', 'Income'), ('expense', 'Expense')], max_length=10)),
+                ('category', models.CharField(choices=[('milk_sale', 'Milk Sale'), ('crop_sale', 'Crop Sale'), ('animal_sale', 'Animal Sale'), ('other_income', 'Other Income'), ('feed', 'Animal Feed'), ('veterinary', 'Veterinary/Health'), ('seeds', 'Seeds'), ('fertilizer', 'Fertilizer'), ('pesticide', 'Pesticide'), ('labor', 'Labor/Wages'), ('transport', 'Transport'), ('equipment', 'Equipment/Tools'), ('utilities', 'Utilities'), ('other_expense', 'Other Expense')], max_length=30)),
+                ('target', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('budget', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='lines', to='finance.budget')),
+            ],
+            options={
+                'ordering': ['transaction_type', 'category'],
+                'unique_together': {('budget', 'transaction_type', 'category')},
+            },
+        ),
+    ]
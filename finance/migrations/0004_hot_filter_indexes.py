@@ -0,0 +1,25 @@
+# Generated by Django 5.0.1 on 2026-10-16 20:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finance', '0003_budgetline'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['transaction_type', 'date', 'amount'], name='finance_tra_transac_2c120c_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['payment_method', 'transaction_type'], name='finance_tra_payment_597c50_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['date', 'created_at'], name='finance_tra_date_e5941a_idx'),
+        ),
+    ]
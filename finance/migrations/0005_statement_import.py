@@ -0,0 +1,30 @@
+# Generated by Django 5.0.1 on 2026-10-16 20:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finance', '0004_hot_filter_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CategoryRule',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('keyword', models.CharField(help_text='Text to look for, e.g. a paybill name', max_length=100)),
+                ('transaction_type', models.CharField(blank=True, choices=[('income', 'Income'), ('expense', 'Expense')], help_text='Leave blank to match money in and out', max_length=10)),
+                ('category', models.CharField(choices=[('milk_sale', 'Milk Sale'), ('crop_sale', 'Crop Sale'), ('animal_sale', 'Animal Sale'), ('other_income', 'Other Income'), ('feed', 'Animal Feed'), ('veterinary', 'Veterinary/Health'), ('seeds', 'Seeds'), ('fertilizer', 'Fertilizer'), ('pesticide', 'Pesticide'), ('labor', 'Labor/Wages'), ('transport', 'Transport'), ('equipment', 'Equipment/Tools'), ('utilities', 'Utilities'), ('other_expense', 'Other Expense')], max_length=30)),
+                ('priority', models.PositiveSmallIntegerField(default=100, help_text='Lower runs first')),
+            ],
+            options={
+                'ordering': ['priority', 'id'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['reference'], name='finance_tra_referen_220685_idx'),
+        ),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 5.0.1 on 2026-10-16 22:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finance', '0006_balance_checkpoints'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='transaction',
+            name='source_id',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='transaction',
+            name='source_type',
+            field=models.CharField(blank=True, choices=[('crop_input', 'Crop Input'), ('crop_sale', 'Crop Sale'), ('health_record', 'Health Record'), ('feed_record', 'Feed Record'), ('animal', 'Animal Purchase')], editable=False, max_length=20),
+        ),
+        migrations.AlterField(
+            model_name='budgetline',
+            name='category',
+            field=models.CharField(choices=[('milk_sale', 'Milk Sale'), ('crop_sale', 'Crop Sale'), ('animal_sale', 'Animal Sale'), ('other_income', 'Other Income'), ('feed', 'Animal Feed'), ('veterinary', 'Veterinary/Health'), ('seeds', 'Seeds'), ('fertilizer', 'Fertilizer'), ('pesticide', 'Pesticide'), ('labor', 'Labor/Wages'), ('transport', 'Transport'), ('equipment', 'Equipment/Tools'), ('livestock', 'Livestock Purchase'), ('utilities', 'Utilities'), ('other_expense', 'Other Expense')], max_length=30),
+        ),
+        migrations.AlterField(
+            model_name='categoryrule',
+            name='category',
+            field=models.CharField(choices=[('milk_sale', 'Milk Sale'), ('crop_sale', 'Crop Sale'), ('animal_sale', 'Animal Sale'), ('other_income', 'Other Income'), ('feed', 'Animal Feed'), ('veterinary', 'Veterinary/Health'), ('seeds', 'Seeds'), ('fertilizer', 'Fertilizer'), ('pesticide', 'Pesticide'), ('labor', 'Labor/Wages'), ('transport', 'Transport'), ('equipment', 'Equipment/Tools'), ('livestock', 'Livestock Purchase'), ('utilities', 'Utilities'), ('other_expense', 'Other Expense')], max_length=30),
+        ),
+        migrations.AlterField(
+            model_name='monthlycategorytotal',
+            name='category',
+            field=models.CharField(choices=[('milk_sale', 'Milk Sale'), ('crop_sale', 'Crop Sale'), ('animal_sale', 'Animal Sale'), ('other_income', 'Other Income'), ('feed', 'Animal Feed'), ('veterinary', 'Veterinary/Health'), ('seeds', 'Seeds'), ('fertilizer', 'Fertilizer'), ('pesticide', 'Pesticide'), ('labor', 'Labor/Wages'), ('transport', 'Transport'), ('equipment', 'Equipment/Tools'), ('livestock', 'Livestock Purchase'), ('utilities', 'Utilities'), ('other_expense', 'Other Expense')], max_length=30),
+        ),
+        migrations.AlterField(
+            model_name='transaction',
+            name='category',
+            field=models.CharField(choices=[('milk_sale', 'Milk Sale'), ('crop_sale', 'Crop Sale'), ('animal_sale', 'Animal Sale'), ('other_income', 'Other Income'), ('feed', 'Animal Feed'), ('veterinary', 'Veterinary/Health'), ('seeds', 'Seeds'), ('fertilizer', 'Fertilizer'), ('pesticide', 'Pesticide'), ('labor', 'Labor/Wages'), ('transport', 'Transport'), ('equipment', 'Equipment/Tools'), ('livestock', 'Livestock Purchase'), ('utilities', 'Utilities'), ('other_expense', 'Other Expense')], max_length=30),
+        ),
+        migrations.AddConstraint(
+            model_name='transaction',
+            constraint=models.UniqueConstraint(fields=('source_type', 'source_id'), name='unique_transaction_source'),
+        ),
+    ]
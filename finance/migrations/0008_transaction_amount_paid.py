@@ -0,0 +1,18 @@
+# Generated by Django 5.0.1 on 2026-10-16 22:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finance', '0007_auto_posting'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='transaction',
+            name='amount_paid',
+            field=models.DecimalField(decimal_places=2, default=0, help_text='Received so far on a credit sale', max_digits=12),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.1 on 2026-10-16 22:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finance', '0008_transaction_amount_paid'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='transaction',
+            name='source_type',
+            field=models.CharField(blank=True, choices=[('crop_input', 'Crop Input'), ('crop_sale', 'Crop Sale'), ('health_record', 'Health Record'), ('health_campaign', 'Herd Health Event'), ('feed_record', 'Feed Record'), ('animal', 'Animal Purchase')], editable=False, max_length=20),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.0.1 on 2026-10-16 23:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finance', '0009_alter_transaction_source_type'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['transaction_type', 'date', 'created_at'], name='finance_tra_transac_304e96_idx'),
+        ),
+    ]
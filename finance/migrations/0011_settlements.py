@@ -0,0 +1,57 @@
+# Generated by Django 5.0.1 on 2026-10-16 23:14
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def settle_part_payments(apps, schema_editor):
+    """
+    Part payments recorded before settlements only counted in amount_paid;
+    keep them as cash settlements dated when the sale was last updated.
+    Checkpoints are dropped and rewritten on the next balance lookup.
+    """
+    Transaction = apps.get_model('finance', 'Transaction')
+    Settlement = apps.get_model('finance', 'Settlement')
+    BalanceCheckpoint = apps.get_model('finance', 'BalanceCheckpoint')
+    part_paid = Transaction.objects.filter(
+        transaction_type='income', payment_method='credit', amount_paid__gt=0
+    )
+    settlements = [
+        Settlement(sale=sale, date=sale.updated_at.date(), amount=sale.amount_paid, payment_method='cash')
+        for sale in part_paid
+    ]
+    if settlements:
+        Settlement.objects.bulk_create(settlements, batch_size=500)
+        BalanceCheckpoint.objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finance', '0010_keyset_type_index'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='transaction',
+            name='amount_paid',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, help_text='Received so far on a credit sale (the total of its settlements)', max_digits=12),
+        ),
+        migrations.CreateModel(
+            name='Settlement',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(default=django.utils.timezone.localdate)),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('payment_method', models.CharField(choices=[('cash', 'Cash'), ('mpesa', 'M-Pesa'), ('bank', 'Bank Transfer')], default='cash', max_length=20)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('sale', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='settlements', to='finance.transaction')),
+            ],
+            options={
+                'ordering': ['-date', '-created_at'],
+                'indexes': [models.Index(fields=['payment_method', 'date', 'created_at'], name='finance_set_payment_de982e_idx'), models.Index(fields=['date', 'created_at'], name='finance_set_date_de1416_idx')],
+            },
+        ),
+        migrations.RunPython(settle_part_payments, migrations.RunPython.noop),
+    ]
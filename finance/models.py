@@ -25,6 +25,7 @@ class Transaction(models.Model):
         ('labor', 'Labor/Wages'),
         ('transport', 'Transport'),
         ('equipment', 'Equipment/Tools'),
+        ('livestock', 'Livestock Purchase'),
         ('utilities', 'Utilities'),
         ('other_expense', 'Other Expense'),
     )
@@ -36,6 +37,16 @@ class Transaction(models.Model):
         ('credit', 'Credit/Pending'),
     )
     
+    # Records posted automatically by finance.posting
+    SOURCE_TYPES = (
+        ('crop_input', 'Crop Input'),
+        ('crop_sale', 'Crop Sale'),
+        ('health_record', 'Health Record'),
+        ('health_campaign', 'Herd Health Event'),
+        ('feed_record', 'Feed Record'),
+        ('animal', 'Animal Purchase'),
+    )
+    
     transaction_type = models.CharField(max_length=10, choices=TRANSACTION_TYPES)
     category = models.CharField(max_length=30, choices=CATEGORIES)
     date = models.DateField(default=timezone.now)
@@ -45,17 +56,80 @@ class Transaction(models.Model):
     party_name = models.CharField(max_length=200, blank=True, help_text="Buyer/Seller/Supplier name")
     reference = models.CharField(max_length=100, blank=True, help_text="Receipt/Invoice number")
     notes = models.TextField(blank=True)
+    amount_paid = models.DecimalField(
+        max_digits=12, decimal_places=2, default=0, editable=False,
+        help_text="Received so far on a credit sale (the total of its settlements)",
+    )
+    source_type = models.CharField(max_length=20, choices=SOURCE_TYPES, blank=True, editable=False)
+    source_id = models.PositiveIntegerField(null=True, blank=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
     class Meta:
         ordering = ['-date', '-created_at']
+        constraints = [
+            # One posted transaction per source record; also the lookup index
+            models.UniqueConstraint(fields=['source_type', 'source_id'], name='unique_transaction_source'),
+        ]
+        indexes = [
+            # Type + date range sums; amount makes the index covering
+            models.Index(fields=['transaction_type', 'date', 'amount']),
+            models.Index(fields=['payment_method', 'transaction_type']),
+            # Date ranges and the default newest-first ordering
+            models.Index(fields=['date', 'created_at']),
+            # Keyset pages of the list filtered by type
+            models.Index(fields=['transaction_type', 'date', 'created_at']),
+            # Duplicate checks when importing statements
+            models.Index(fields=['reference']),
+            # Per-method running balances, oldest first
+            models.Index(fields=['payment_method', 'date', 'created_at']),
+        ]
     
     def __str__(self):
         symbol = '+' if self.transaction_type == 'income' else '-'
         return f"{symbol}KSh {self.amount} - {self.get_category_display()} ({self.date})"
 
 
+class Settlement(models.Model):
+    """
+    Money received against a credit sale (see finance.receivables).
+    
+    The sale stays on 'credit'; from `date` on, each settlement moves its
+    amount from the credit balance to `payment_method`, so part payments
+    reach the cash, M-Pesa and bank balances on the day they are received
+    and balances before then are left alone.
+    """
+    sale = models.ForeignKey(Transaction, on_delete=models.CASCADE, related_name='settlements')
+    date = models.DateField(default=timezone.localdate)
+    amount = models.DecimalField(max_digits=12, decimal_places=2)
+    payment_method = models.CharField(
+        max_length=20, choices=[c for c in Transaction.PAYMENT_METHODS if c[0] != 'credit'], default='cash',
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        ordering = ['-date', '-created_at']
+        indexes = [
+            # Per-method running balances, oldest first
+            models.Index(fields=['payment_method', 'date', 'created_at']),
+            # The credit side of every settlement, and balances after a checkpoint
+            models.Index(fields=['date', 'created_at']),
+        ]
+    
+    # Ledger rows mix settlements with transactions (finance.balances.ledger)
+    category = 'settlement'
+    
+    def __str__(self):
+        return f"KSh {self.amount} received by {self.get_payment_method_display()} ({self.date})"
+    
+    @property
+    def description(self):
+        return f"Received: {self.sale.description}"
+    
+    def get_category_display(self):
+        return 'Settlement'
+
+
 class Budget(models.Model):
     """Monthly or seasonal budgets"""
     name = models.CharField(max_length=200, help_text="e.g., 'January 2025' or 'Maize Season 2025'")
@@ -74,19 +148,15 @@ class Budget(models.Model):
     
     def actual_income(self):
         """Calculate actual income in period"""
-        return Transaction.objects.filter(
-            transaction_type='income',
-            date__gte=self.start_date,
-            date__lte=self.end_date
-        ).aggregate(models.Sum('amount'))['amount__sum'] or 0
+        if not hasattr(self, '_actual_income'):
+            attach_actuals([self])
+        return self._actual_income
     
     def actual_expense(self):
         """Calculate actual expenses in period"""
-        return Transaction.objects.filter(
-            transaction_type='expense',
-            date__gte=self.start_date,
-            date__lte=self.end_date
-        ).aggregate(models.Sum('amount'))['amount__sum'] or 0
+        if not hasattr(self, '_actual_expense'):
+            attach_actuals([self])
+        return self._actual_expense
     
     def actual_profit(self):
         """Calculate actual profit"""
@@ -94,4 +164,158 @@ class Budget(models.Model):
     
     def expected_profit(self):
         """Calculate expected profit"""
-        return self.target_income - self.target_expense
\ No newline at end of file
+        return self.target_income - self.target_expense
+    
+    def transactions(self):
+        """Transactions dated inside the budget period"""
+        return Transaction.objects.filter(
+            date__gte=self.start_date,
+            date__lte=self.end_date
+        )
+    
+    def category_breakdown(self):
+        """
+        Actual vs target per category for the period.
+        
+        One grouped query for the actuals plus one for the category
+        targets; categories with either a target or activity are listed.
+        """
+        actuals = {
+            (row['transaction_type'], row['category']): row['total']
+            for row in self.transactions()
+            .values('transaction_type', 'category')
+            .annotate(total=models.Sum('amount'))
+            .order_by()
+        }
+        targets = {
+            (line.transaction_type, line.category): line.target
+            for line in self.lines.all()
+        }
+        labels = dict(Transaction.CATEGORIES)
+        breakdown = []
+        for key in sorted(set(actuals) | set(targets)):
+            actual = actuals.get(key, 0)
+            target = targets.get(key)
+            breakdown.append({
+                'transaction_type': key[0],
+                'category': key[1],
+                'label': labels.get(key[1], key[1]),
+                'actual': actual,
+                'target': target,
+                'variance': actual - target if target is not None else None,
+            })
+        return breakdown
+
+
+class BudgetLine(models.Model):
+    """Target amount for one category within a budget"""
+    budget = models.ForeignKey(Budget, on_delete=models.CASCADE, related_name='lines')
+    transaction_type = models.CharField(max_length=10, choices=Transaction.TRANSACTION_TYPES)
+    category = models.CharField(max_length=30, choices=Transaction.CATEGORIES)
+    target = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    
+    class Meta:
+        ordering = ['transaction_type', 'category']
+        unique_together = ['budget', 'transaction_type', 'category']
+    
+    def __str__(self):
+        return f"{self.budget.name} - {self.get_category_display()}: KSh {self.target}"
+
+
+def attach_actuals(budgets, chunk_size=200):
+    """
+    Compute actual income and expense for many budgets at once.
+    
+    Each chunk of budgets is one Transaction query with a pair of
+    date-range-conditioned SUMs per budget, so listing N budgets costs
+    ceil(N / chunk_size) queries instead of 2-4 per budget. Results are
+    cached on the instances for actual_income() / actual_expense().
+    """
+    budgets = list(budgets)
+    for offset in range(0, len(budgets), chunk_size):
+        chunk = budgets[offset:offset + chunk_size]
+        sums = {}
+        for index, budget in enumerate(chunk):
+            period = models.Q(date__gte=budget.start_date, date__lte=budget.end_date)
+            sums[f'income_{index}'] = models.Sum(
+                'amount', filter=period & models.Q(transaction_type='income')
+            )
+            sums[f'expense_{index}'] = models.Sum(
+                'amount', filter=period & models.Q(transaction_type='expense')
+            )
+        totals = Transaction.objects.filter(
+            date__gte=min(b.start_date for b in chunk),
+            date__lte=max(b.end_date for b in chunk),
+        ).aggregate(**sums)
+        for index, budget in enumerate(chunk):
+            budget._actual_income = totals[f'income_{index}'] or 0
+            budget._actual_expense = totals[f'expense_{index}'] or 0
+    return budgets
+
+
+class MonthlyCategoryTotal(models.Model):
+    """
+    Rollup of Transaction amounts per month, type and category.
+
+    Maintained incrementally by finance.signals and rebuildable with
+    `manage.py rebuild_finance_rollup`. Reports read these rows instead
+    of aggregating the whole ledger.
+    """
+    year = models.PositiveSmallIntegerField()
+    month = models.PositiveSmallIntegerField()
+    transaction_type = models.CharField(max_length=10, choices=Transaction.TRANSACTION_TYPES)
+    category = models.CharField(max_length=30, choices=Transaction.CATEGORIES)
+    total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    count = models.IntegerField(default=0)
+    
+    class Meta:
+        ordering = ['-year', '-month', 'transaction_type', 'category']
+        unique_together = ['year', 'month', 'transaction_type', 'category']
+    
+    def __str__(self):
+        return f"{self.year}-{self.month:02d} {self.get_category_display()}: KSh {self.total}"
+
+
+class BalanceCheckpoint(models.Model):
+    """
+    Balance (income minus expense) of one payment method at the end of a
+    month-end date.
+    
+    Opening balances start from the latest checkpoint instead of summing
+    the ledger from the beginning. finance.signals keeps checkpoints after
+    a changed transaction's date up to date; `manage.py
+    rebuild_balance_checkpoints` recreates them.
+    """
+    payment_method = models.CharField(max_length=20, choices=Transaction.PAYMENT_METHODS)
+    date = models.DateField()
+    balance = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    
+    class Meta:
+        ordering = ['payment_method', '-date']
+        unique_together = ['payment_method', 'date']
+    
+    def __str__(self):
+        return f"{self.get_payment_method_display()} at {self.date}: KSh {self.balance}"
+
+
+class CategoryRule(models.Model):
+    """
+    Maps imported statement lines to a Transaction category.
+    
+    A rule matches when `keyword` appears in the line's details (case
+    insensitive) and, if set, the line has the same transaction type.
+    Rules are tried in priority order; the first match wins.
+    """
+    keyword = models.CharField(max_length=100, help_text="Text to look for, e.g. a paybill name")
+    transaction_type = models.CharField(
+        max_length=10, choices=Transaction.TRANSACTION_TYPES, blank=True,
+        help_text="Leave blank to match money in and out",
+    )
+    category = models.CharField(max_length=30, choices=Transaction.CATEGORIES)
+    priority = models.PositiveSmallIntegerField(default=100, help_text="Lower runs first")
+    
+    class Meta:
+        ordering = ['priority', 'id']
+    
+    def __str__(self):
+        return f"'{self.keyword}' -> {self.get_category_display()}"
@@ -0,0 +1,198 @@
+"""
+Post crop, livestock and feed money into the Transaction ledger.
+
+Each source record with a non-zero amount owns one Transaction, linked
+back through (source_type, source_id). finance.signals keeps the linked
+row in step when the source is saved or deleted; `manage.py
+post_to_ledger` posts records that existed before auto-posting (or were
+written with bulk operations) in batches with bulk_create.
+
+Linked transactions are rewritten from their source on every save, so
+corrections belong on the source record. Settlements are the exception:
+a sale with settlements stays on credit even once its source is marked
+paid, as the settlements already carry the money to where it was paid.
+"""
+from django.db import transaction as db_transaction
+
+from crops.models import CropInput, CropSale
+from dairy.models import Animal, FeedRecord, HealthCampaign, HealthRecord
+from dashboard.cache import bump_version
+from dashboard.snapshots import refresh_flows
+from .models import Transaction
+
+
+BATCH_SIZE = 1000
+
+INPUT_CATEGORIES = {
+    'seeds': 'seeds',
+    'fertilizer': 'fertilizer',
+    'pesticide': 'pesticide',
+    'water': 'utilities',
+    'labor': 'labor',
+}
+
+
+def _crop_input(record):
+    return {
+        'transaction_type': 'expense',
+        'category': INPUT_CATEGORIES.get(record.input_type, 'other_expense'),
+        'date': record.date,
+        'amount': record.cost,
+        'description': f"{record.get_input_type_display()}: {record.description}",
+        'party_name': record.supplier,
+    }
+
+
+def _crop_sale(record):
+    return {
+        'transaction_type': 'income',
+        'category': 'crop_sale',
+        'date': record.date,
+        'amount': record.total_amount,
+        'description': f"{record.season.get_crop_type_display()} sale - {record.quantity_kg}kg",
+        'party_name': record.buyer,
+        # Unpaid and part-paid sales are still owed
+        'payment_method': 'cash' if record.payment_status == 'paid' else 'credit',
+    }
+
+
+def _health_record(record):
+    return {
+        'transaction_type': 'expense',
+        'category': 'veterinary',
+        'date': record.date,
+        # A campaign's records share one posting, made by the campaign
+        'amount': 0 if record.campaign_id else record.cost,
+        'description': f"{record.get_record_type_display()} - {record.animal.tag_number}",
+        'party_name': record.veterinarian,
+    }
+
+
+def _health_campaign(record):
+    return {
+        'transaction_type': 'expense',
+        'category': 'veterinary',
+        'date': record.date,
+        'amount': record.total_cost,
+        'description': f"{record.get_record_type_display()} - {record.animal_count} animals: {record.description}",
+        'party_name': record.veterinarian,
+    }
+
+
+def _feed_record(record):
+    return {
+        'transaction_type': 'expense',
+        'category': 'feed',
+        'date': record.date,
+        'amount': record.cost,
+        'description': f"{record.feed_type} - {record.quantity_kg}kg",
+        'party_name': record.supplier,
+    }
+
+
+def _animal(record):
+    return {
+        'transaction_type': 'expense',
+        'category': 'livestock',
+        'date': record.date_acquired,
+        'amount': record.acquisition_cost,
+        'description': f"Bought {record.get_animal_type_display().lower()} {record.tag_number}",
+    }
+
+
+# source_type: (model, related fields the description reads, field builder)
+SOURCES = {
+    'crop_input': (CropInput, [], _crop_input),
+    'crop_sale': (CropSale, ['season'], _crop_sale),
+    'health_record': (HealthRecord, ['animal'], _health_record),
+    'health_campaign': (HealthCampaign, [], _health_campaign),
+    'feed_record': (FeedRecord, [], _feed_record),
+    'animal': (Animal, [], _animal),
+}
+
+SOURCE_TYPES = {model: source_type for source_type, (model, _, _) in SOURCES.items()}
+
+
+def _fields(source_type, record):
+    """Transaction fields for a source record, normalising raw form strings"""
+    fields = SOURCES[source_type][2](record)
+    for name in ('date', 'amount'):
+        fields[name] = Transaction._meta.get_field(name).to_python(fields[name])
+    fields['description'] = fields['description'][:300]
+    fields['party_name'] = fields.get('party_name', '')[:200]
+    return fields
+
+
+def post(record):
+    """Create, update or remove the Transaction linked to a source record"""
+    source_type = SOURCE_TYPES[type(record)]
+    linked = Transaction.objects.filter(source_type=source_type, source_id=record.pk)
+    fields = _fields(source_type, record)
+    with db_transaction.atomic():
+        posted = linked.first()
+        if not fields['amount']:
+            if posted:
+                posted.delete()
+            return None
+        if posted is None:
+            posted = Transaction(source_type=source_type, source_id=record.pk)
+        elif posted.payment_method == 'credit' and fields.get('payment_method', 'credit') != 'credit':
+            if posted.settlements.exists():
+                fields['payment_method'] = 'credit'
+        changed = False
+        for name, value in fields.items():
+            if getattr(posted, name) != value:
+                setattr(posted, name, value)
+                changed = True
+        if changed or posted.pk is None:
+            posted.save()
+        return posted
+
+
+def unpost(record):
+    """Remove the Transaction linked to a deleted source record"""
+    Transaction.objects.filter(
+        source_type=SOURCE_TYPES[type(record)], source_id=record.pk
+    ).delete()
+
+
+def backfill(batch_size=BATCH_SIZE):
+    """
+    Post every source record that has no linked Transaction yet.
+
+    Returns the number of transactions created per source type. Records
+    already posted are left alone, so running it again creates nothing.
+    """
+    from .signals import bulk_created
+
+    counts = {}
+    days = set()
+    with db_transaction.atomic():
+        for source_type, (model, related, _) in SOURCES.items():
+            posted = Transaction.objects.filter(source_type=source_type).values('source_id')
+            records = (
+                model.objects.exclude(pk__in=posted)
+                .select_related(*related)
+                .order_by('pk')
+            )
+            counts[source_type] = 0
+            batch = []
+            for record in records.iterator(chunk_size=batch_size):
+                fields = _fields(source_type, record)
+                if not fields['amount']:
+                    continue
+                batch.append(Transaction(source_type=source_type, source_id=record.pk, **fields))
+                if len(batch) >= batch_size:
+                    days |= bulk_created(Transaction.objects.bulk_create(batch))
+                    counts[source_type] += len(batch)
+                    batch = []
+            if batch:
+                days |= bulk_created(Transaction.objects.bulk_create(batch))
+                counts[source_type] += len(batch)
+        for day in sorted(days):
+            refresh_flows(day)
+
+    if days:
+        bump_version('finance')
+        bump_version('dashboard')
+    return counts
@@ -0,0 +1,129 @@
+"""
+Money owed to the farm: credit sales not yet fully paid.
+
+Credit sales entered by hand and crop sales posted by finance.posting
+(pending or part paid) are both income transactions on the 'credit'
+payment method, so one table holds every receivable. Money received is
+recorded as dated Settlements against the sale (see settle), and what
+is outstanding on a day is the amount less the settlements up to that
+day, so aging for a past date does not change when later payments come
+in. Aging buckets are worked out in the database with Case/When on the
+sale date, grouped in the same query.
+"""
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import transaction as db_transaction
+from django.db.models import Case, CharField, DecimalField, F, OuterRef, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from crops.models import CropSale
+from dashboard.cache import bump_version
+from .models import Settlement, Transaction
+
+
+ZERO = Decimal('0')
+
+MONEY = DecimalField(max_digits=14, decimal_places=2)
+
+# (key, label, oldest age in days or None for no limit)
+BUCKETS = (
+    ('0_30', '0-30 days', 30),
+    ('31_60', '31-60 days', 60),
+    ('61_90', '61-90 days', 90),
+    ('over_90', '90+ days', None),
+)
+
+
+def outstanding():
+    """Credit sales with something left to pay"""
+    return Transaction.objects.filter(
+        transaction_type='income', payment_method='credit', amount_paid__lt=F('amount')
+    )
+
+
+def _bucket(today):
+    whens = [
+        When(date__gte=today - timedelta(days=days), then=Value(key))
+        for key, _, days in BUCKETS if days is not None
+    ]
+    return Case(*whens, default=Value(BUCKETS[-1][0]), output_field=CharField())
+
+
+def _paid_by(today):
+    """Settlements received on a sale up to `today`, as a subquery"""
+    settled = (
+        Settlement.objects.filter(sale=OuterRef('pk'), date__lte=today)
+        .values('sale').annotate(total=Sum('amount')).values('total')
+    )
+    return Coalesce(Subquery(settled), Value(ZERO), output_field=MONEY)
+
+
+def aging(today, by_party=True):
+    """
+    What was outstanding at the end of `today` per aging bucket, in one
+    grouped query.
+
+    Returns {'buckets': [(key, label, total)], 'total', 'parties'} where
+    parties lists {'party', 'buckets', 'total'} largest debt first (empty
+    unless `by_party`).
+    """
+    fields = ['bucket'] + (['party_name'] if by_party else [])
+    rows = (
+        Transaction.objects.filter(transaction_type='income', payment_method='credit', date__lte=today)
+        .annotate(paid=_paid_by(today))
+        .filter(paid__lt=F('amount'))
+        .annotate(bucket=_bucket(today))
+        .values(*fields)
+        .annotate(total=Sum(F('amount') - F('paid'), output_field=MONEY))
+        .order_by()
+    )
+
+    totals = {key: ZERO for key, _, _ in BUCKETS}
+    parties = {}
+    for row in rows:
+        totals[row['bucket']] += row['total']
+        if by_party:
+            name = row['party_name'] or 'Unnamed'
+            party = parties.setdefault(name, {
+                'party': name, 'buckets': {key: ZERO for key in totals}, 'total': ZERO,
+            })
+            party['buckets'][row['bucket']] += row['total']
+            party['total'] += row['total']
+
+    for party in parties.values():
+        party['buckets'] = [(key, label, party['buckets'][key]) for key, label, _ in BUCKETS]
+
+    return {
+        'buckets': [(key, label, totals[key]) for key, label, _ in BUCKETS],
+        'total': sum(totals.values(), ZERO),
+        'parties': sorted(parties.values(), key=lambda p: (-p['total'], p['party'])),
+    }
+
+
+def settle(transaction, amount, payment_method='cash', day=None):
+    """
+    Record `amount` received against a credit sale on `day` (default today).
+
+    Each payment is its own Settlement: the sale stays on credit and
+    finance.signals moves the money to `payment_method` from `day` on
+    and keeps amount_paid. A posted crop sale's payment_status follows
+    along so re-posting keeps the same state.
+    """
+    amount = min(amount, transaction.amount - transaction.amount_paid)
+    if amount <= 0:
+        return transaction
+    with db_transaction.atomic():
+        Settlement.objects.create(
+            sale=transaction, date=day or timezone.localdate(), amount=amount, payment_method=payment_method,
+        )
+        transaction.refresh_from_db(fields=['amount_paid'])
+        if transaction.source_type == 'crop_sale':
+            paid = transaction.amount_paid >= transaction.amount
+            CropSale.objects.filter(pk=transaction.source_id).update(
+                payment_status='paid' if paid else 'partial'
+            )
+            # update() skips the signals that would invalidate crop pages
+            bump_version('crops')
+    return transaction
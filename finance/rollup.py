@@ -0,0 +1,108 @@
+"""
+Maintenance and reads for MonthlyCategoryTotal.
+
+Each Transaction contributes its amount to exactly one (year, month,
+type, category) bucket. Saves and deletes apply the difference to the
+affected buckets with F() updates rather than re-aggregating the month.
+"""
+from django.db.models import Count, F, Q, Sum
+from django.db.models.functions import ExtractMonth, ExtractYear
+from datetime import timedelta
+from decimal import Decimal
+
+from dateutil.relativedelta import relativedelta
+
+from .models import Transaction, MonthlyCategoryTotal
+
+
+def bucket_key(transaction_type, category, day):
+    return {
+        'year': day.year,
+        'month': day.month,
+        'transaction_type': transaction_type,
+        'category': category,
+    }
+
+
+def apply_delta(key, amount, count):
+    """Add `amount` and `count` to a bucket, creating it if needed"""
+    changes = {'total': F('total') + amount, 'count': F('count') + count}
+    if MonthlyCategoryTotal.objects.filter(**key).update(**changes):
+        return
+    _, created = MonthlyCategoryTotal.objects.get_or_create(
+        **key, defaults={'total': amount, 'count': count}
+    )
+    if not created:
+        # Lost a race with another writer creating the same bucket
+        MonthlyCategoryTotal.objects.filter(**key).update(**changes)
+
+
+def rebuild(year=None):
+    """Recreate buckets from the ledger (one year or everything)"""
+    transactions = Transaction.objects.all()
+    buckets = MonthlyCategoryTotal.objects.all()
+    if year:
+        transactions = transactions.filter(date__year=year)
+        buckets = buckets.filter(year=year)
+    
+    rows = (
+        transactions
+        .annotate(year=ExtractYear('date'), month=ExtractMonth('date'))
+        .values('year', 'month', 'transaction_type', 'category')
+        .annotate(total=Sum('amount'), count=Count('id'))
+        .order_by()
+    )
+    buckets.delete()
+    created = MonthlyCategoryTotal.objects.bulk_create(
+        [MonthlyCategoryTotal(**row) for row in rows], batch_size=500
+    )
+    return len(created)
+
+
+def _month_totals(rows):
+    income = sum((r.total for r in rows if r.transaction_type == 'income'), Decimal('0'))
+    expense = sum((r.total for r in rows if r.transaction_type == 'expense'), Decimal('0'))
+    return {'income': income, 'expense': expense, 'profit': income - expense}
+
+
+def _by_category(rows, transaction_type):
+    """Category totals for one type, largest first (shaped like values().annotate())"""
+    totals = [
+        {'category': r.category, 'total': r.total}
+        for r in rows if r.transaction_type == transaction_type and r.total
+    ]
+    return sorted(totals, key=lambda item: item['total'], reverse=True)
+
+
+def report_totals(today, months=12):
+    """
+    This month, last month, year to date, this month's category
+    breakdowns and a trend of the last `months` months (oldest first)
+    from a single query over the buckets.
+    """
+    month_start = today.replace(day=1)
+    last_month = month_start - timedelta(days=1)
+    # The trend's months, widened to January and last month when months is short
+    first = min(
+        month_start - relativedelta(months=months - 1), month_start.replace(month=1), last_month.replace(day=1),
+    )
+    rows = list(MonthlyCategoryTotal.objects.filter(
+        Q(year__gt=first.year) | Q(year=first.year, month__gte=first.month),
+        Q(year__lt=today.year) | Q(year=today.year, month__lte=today.month),
+    ))
+    trend = []
+    for offset in range(months - 1, -1, -1):
+        month = month_start - relativedelta(months=offset)
+        point = _month_totals([r for r in rows if (r.year, r.month) == (month.year, month.month)])
+        trend.append({'period': month, **point})
+    this_month = [r for r in rows if (r.year, r.month) == (today.year, today.month)]
+    previous = [r for r in rows if (r.year, r.month) == (last_month.year, last_month.month)]
+    year = [r for r in rows if r.year == today.year]
+    return {
+        'month': _month_totals(this_month),
+        'last_month': _month_totals(previous),
+        'year': _month_totals(year),
+        'income_by_category': _by_category(this_month, 'income'),
+        'expense_by_category': _by_category(this_month, 'expense'),
+        'trend': trend,
+    }
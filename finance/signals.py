@@ -0,0 +1,162 @@
+"""
+Keep MonthlyCategoryTotal and BalanceCheckpoint in step with Transaction
+and Settlement, and posted Transactions in step with their source records.
+
+Queryset.update() and bulk_create() bypass these handlers; callers doing
+bulk writes should pass the new rows to bulk_created() or run
+`manage.py rebuild_finance_rollup` / `rebuild_balance_checkpoints`.
+"""
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import transaction as db_transaction
+from django.db.models import Sum
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+
+from dashboard import search
+
+from .models import Settlement, Transaction
+from .rollup import apply_delta, bucket_key
+from . import balances, posting
+
+
+def _clean(instance):
+    """Bucket key, date and amount, normalising raw form strings"""
+    field = Transaction._meta.get_field
+    day = field('date').to_python(instance.date)
+    amount = field('amount').to_python(instance.amount)
+    return bucket_key(instance.transaction_type, instance.category, day), day, amount
+
+
+def _signed(transaction_type, amount):
+    return amount if transaction_type == 'income' else -amount
+
+
+@receiver(pre_save, sender=Transaction)
+def remember_stored_bucket(sender, instance, **kwargs):
+    instance._rollup_previous = None
+    instance._balance_previous = None
+    if instance.pk:
+        stored = sender.objects.filter(pk=instance.pk).values(
+            'transaction_type', 'category', 'date', 'amount', 'payment_method'
+        ).first()
+        if stored:
+            key = bucket_key(stored['transaction_type'], stored['category'], stored['date'])
+            instance._rollup_previous = (key, stored['amount'])
+            instance._balance_previous = (
+                stored['payment_method'], stored['date'],
+                _signed(stored['transaction_type'], stored['amount']),
+            )
+
+
+@receiver(post_save, sender=Transaction)
+def update_rollup(sender, instance, **kwargs):
+    key, day, amount = _clean(instance)
+    previous = getattr(instance, '_rollup_previous', None)
+    with db_transaction.atomic():
+        if previous is None:
+            apply_delta(key, amount, 1)
+        elif previous[0] == key:
+            if amount != previous[1]:
+                apply_delta(key, amount - previous[1], 0)
+        else:
+            # Moved to another month, type or category
+            apply_delta(previous[0], -previous[1], -1)
+            apply_delta(key, amount, 1)
+
+
+@receiver(post_save, sender=Transaction)
+def update_balance_checkpoints(sender, instance, **kwargs):
+    key, day, amount = _clean(instance)
+    current = (instance.payment_method, day, _signed(instance.transaction_type, amount))
+    previous = getattr(instance, '_balance_previous', None)
+    if previous == current:
+        return
+    with db_transaction.atomic():
+        if previous:
+            balances.apply_delta(previous[0], previous[1], -previous[2])
+        balances.apply_delta(*current)
+
+
+@receiver(post_delete, sender=Transaction)
+def remove_from_rollup(sender, instance, **kwargs):
+    key, day, amount = _clean(instance)
+    apply_delta(key, -amount, -1)
+    balances.apply_delta(instance.payment_method, day, -_signed(instance.transaction_type, amount))
+
+
+def _move(settlement, sign=1):
+    """Move a settlement's amount from credit to its method from its date on"""
+    field = Settlement._meta.get_field
+    day = field('date').to_python(settlement.date)
+    amount = field('amount').to_python(settlement.amount) * sign
+    balances.apply_delta(settlement.payment_method, day, amount)
+    balances.apply_delta('credit', day, -amount)
+
+
+def _update_amount_paid(sale_id):
+    paid = Settlement.objects.filter(sale_id=sale_id).aggregate(total=Sum('amount'))['total']
+    Transaction.objects.filter(pk=sale_id).update(amount_paid=paid or Decimal('0'))
+
+
+@receiver(pre_save, sender=Settlement)
+def remember_stored_settlement(sender, instance, **kwargs):
+    instance._stored = sender.objects.filter(pk=instance.pk).first() if instance.pk else None
+
+
+@receiver(post_save, sender=Settlement)
+def apply_settlement(sender, instance, **kwargs):
+    stored = getattr(instance, '_stored', None)
+    with db_transaction.atomic():
+        if stored:
+            _move(stored, -1)
+        _move(instance)
+        _update_amount_paid(instance.sale_id)
+
+
+@receiver(post_delete, sender=Settlement)
+def remove_settlement(sender, instance, **kwargs):
+    with db_transaction.atomic():
+        _move(instance, -1)
+        _update_amount_paid(instance.sale_id)
+
+
+def bulk_created(transactions):
+    """
+    Apply what the post_save handlers above would have for rows inserted
+    with bulk_create, once per bucket, and index the rows for search.
+    Returns the days touched so the caller can refresh their snapshots
+    once at the end.
+    """
+    buckets = defaultdict(lambda: [Decimal('0'), 0])
+    # Checkpoints are month ends, so a month's rows share one delta
+    balance_deltas = defaultdict(Decimal)
+    days = set()
+    for t in transactions:
+        month = t.date.replace(day=1)
+        bucket = buckets[(t.transaction_type, t.category, month)]
+        bucket[0] += t.amount
+        bucket[1] += 1
+        balance_deltas[(t.payment_method, month)] += _signed(t.transaction_type, t.amount)
+        days.add(t.date)
+    for (transaction_type, category, month), (amount, count) in buckets.items():
+        apply_delta(bucket_key(transaction_type, category, month), amount, count)
+    for (payment_method, month), amount in balance_deltas.items():
+        balances.apply_delta(payment_method, month, amount)
+    search.index_many(transactions)
+    return days
+
+
+def post_source(sender, instance, raw=False, **kwargs):
+    if not raw:
+        posting.post(instance)
+
+
+def unpost_source(sender, instance, **kwargs):
+    posting.unpost(instance)
+
+
+for source_model in posting.SOURCE_TYPES:
+    post_save.connect(post_source, sender=source_model, dispatch_uid=f'post_{source_model.__name__}')
+    post_delete.connect(unpost_source, sender=source_model, dispatch_uid=f'unpost_{source_model.__name__}')
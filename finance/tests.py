@@ -1,3 +1,713 @@
 from django.test import TestCase
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from datetime import date, timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from dashboard.cache import app_versions
+from dashboard.models import DailyFarmSnapshot
+from crops.models import Farm, CropSeason, CropInput, CropSale
+from dairy.models import Animal, HealthRecord, FeedRecord
+from .models import (
+    Transaction, Budget, BudgetLine, MonthlyCategoryTotal, CategoryRule, BalanceCheckpoint, Settlement, attach_actuals,
+)
+from .aggregates import transaction_totals
+from .rollup import report_totals
+from .filters import keyset_page
+from .importer import StatementError, import_statement
+from .balances import balances, ledger as balance_ledger
+from .timeseries import series, year_over_year
+from .receivables import aging, settle
+from . import posting
+
+
+class TransactionTotalsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.today = date(2025, 3, 10)
+        for offset, kind, amount in [
+            (0, 'income', 100),
+            (5, 'expense', 30),
+            (20, 'income', 50),      # last month, inside 30 days
+            (45, 'expense', 999),    # outside both windows
+        ]:
+            Transaction.objects.create(
+                transaction_type=kind,
+                category='other_income' if kind == 'income' else 'other_expense',
+                date=cls.today - timedelta(days=offset),
+                amount=amount,
+                description='test',
+            )
+
+    def test_windows(self):
+        with self.assertNumQueries(1):
+            totals = transaction_totals(self.today, days=30)
+        self.assertEqual(totals['month_income'], Decimal('100'))
+        self.assertEqual(totals['month_expense'], Decimal('30'))
+        self.assertEqual(totals['month_profit'], Decimal('70'))
+        self.assertEqual(totals['income_30d'], Decimal('150'))
+        self.assertEqual(totals['expense_30d'], Decimal('30'))
+        self.assertEqual(totals['profit_30d'], Decimal('120'))
+
+    def test_no_rows_in_window(self):
+        totals = transaction_totals(date(2100, 1, 1))
+        self.assertEqual(totals['month_income'], 0)
+        self.assertEqual(totals['profit_30d'], 0)
+
+
+class FinanceHomeTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        user = get_user_model().objects.create_user('farmer', password='pass')
+        self.client.force_login(user)
+
+    def test_query_count(self):
+        # session + user, the totals aggregate, the recent list and the aging buckets
+        with self.assertNumQueries(5):
+            response = self.client.get(reverse('finance:home'))
+        self.assertEqual(response.status_code, 200)
+
+    def test_reports_read_rollup(self):
+        # session + user and the rollup query, which also feeds the 12-month trend
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse('finance:reports'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['trend']), 12)
+
+
+class MonthlyCategoryTotalTests(TestCase):
+    def add(self, kind, category, day, amount):
+        return Transaction.objects.create(
+            transaction_type=kind, category=category, date=day,
+            amount=amount, description='test',
+        )
+
+    def bucket(self, year, month, category):
+        row = MonthlyCategoryTotal.objects.filter(year=year, month=month, category=category).first()
+        return (row.total, row.count) if row else None
+
+    def test_create_edit_delete(self):
+        trans = self.add('expense', 'feed', date(2025, 3, 5), 100)
+        self.add('expense', 'feed', date(2025, 3, 20), 50)
+        self.assertEqual(self.bucket(2025, 3, 'feed'), (Decimal('150'), 2))
+
+        trans.amount = '120'
+        trans.save()
+        self.assertEqual(self.bucket(2025, 3, 'feed'), (Decimal('170'), 2))
+
+        trans.delete()
+        self.assertEqual(self.bucket(2025, 3, 'feed'), (Decimal('50'), 1))
+
+    def test_edit_moving_month_and_category(self):
+        trans = self.add('expense', 'feed', date(2025, 3, 5), 100)
+        trans.date = '2025-04-01'
+        trans.category = 'labor'
+        trans.save()
+        self.assertEqual(self.bucket(2025, 3, 'feed'), (Decimal('0'), 0))
+        self.assertEqual(self.bucket(2025, 4, 'labor'), (Decimal('100'), 1))
+
+    def test_rebuild_matches_incremental(self):
+        self.add('income', 'milk_sale', date(2024, 12, 30), 300)
+        self.add('income', 'milk_sale', date(2025, 1, 2), 200)
+        moved = self.add('expense', 'feed', date(2025, 1, 9), 75)
+        moved.category = 'transport'
+        moved.save()
+        incremental = set(
+            MonthlyCategoryTotal.objects.filter(count__gt=0)
+            .values_list('year', 'month', 'transaction_type', 'category', 'total', 'count')
+        )
+        call_command('rebuild_finance_rollup', stdout=StringIO())
+        rebuilt = set(
+            MonthlyCategoryTotal.objects
+            .values_list('year', 'month', 'transaction_type', 'category', 'total', 'count')
+        )
+        self.assertEqual(rebuilt, incremental)
+
+    def test_report_totals(self):
+        today = date(2025, 1, 15)
+        self.add('income', 'milk_sale', date(2024, 12, 30), 300)
+        self.add('income', 'milk_sale', date(2025, 1, 2), 200)
+        self.add('income', 'crop_sale', date(2025, 1, 3), 500)
+        self.add('expense', 'feed', date(2025, 1, 9), 75)
+        self.add('expense', 'feed', date(2024, 2, 1), 40)
+        self.add('expense', 'feed', date(2024, 1, 31), 999)     # before the trend
+        with self.assertNumQueries(1):
+            totals = report_totals(today)
+        self.assertEqual(totals['month'], {
+            'income': Decimal('700'), 'expense': Decimal('75'), 'profit': Decimal('625'),
+        })
+        self.assertEqual(totals['last_month']['income'], Decimal('300'))
+        self.assertEqual(totals['year']['profit'], Decimal('625'))
+        self.assertEqual(
+            [item['category'] for item in totals['income_by_category']],
+            ['crop_sale', 'milk_sale'],
+        )
+        trend = totals['trend']
+        self.assertEqual([p['period'] for p in (trend[0], trend[-1])], [date(2024, 2, 1), date(2025, 1, 1)])
+        self.assertEqual([p['profit'] for p in trend], [-40] + [0] * 9 + [300, 625])
+
+
+class BudgetActualsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user('farmer', password='pass')
+        for month in range(1, 13):
+            Transaction.objects.create(
+                transaction_type='income', category='milk_sale', date=date(2025, month, 10),
+                amount=100, description='Milk',
+            )
+            Transaction.objects.create(
+                transaction_type='expense', category='feed', date=date(2025, month, 12),
+                amount=40, description='Feed',
+            )
+        for month in range(1, 13):
+            Budget.objects.create(
+                name=f'2025-{month:02d}', start_date=date(2025, month, 1),
+                end_date=date(2025, month, 28), target_income=120, target_expense=30,
+            )
+        cls.season = Budget.objects.create(
+            name='H1', start_date=date(2025, 1, 1), end_date=date(2025, 6, 30),
+            target_income=500, target_expense=300,
+        )
+        BudgetLine.objects.create(budget=cls.season, transaction_type='expense', category='feed', target=200)
+        BudgetLine.objects.create(budget=cls.season, transaction_type='expense', category='labor', target=100)
+
+    def test_attach_actuals_single_query(self):
+        with self.assertNumQueries(2):
+            budgets = attach_actuals(Budget.objects.all())
+        for budget in budgets:
+            budget.actual_profit()
+        season = next(b for b in budgets if b.pk == self.season.pk)
+        self.assertEqual(season.actual_income(), Decimal('600'))
+        self.assertEqual(season.actual_expense(), Decimal('240'))
+        self.assertEqual(season.actual_profit(), Decimal('360'))
+
+    def test_unattached_budget_uses_one_query(self):
+        budget = Budget.objects.get(pk=self.season.pk)
+        with self.assertNumQueries(1):
+            self.assertEqual(budget.actual_profit(), Decimal('360'))
+
+    def test_category_breakdown(self):
+        rows = {row['category']: row for row in self.season.category_breakdown()}
+        self.assertEqual(rows['feed']['actual'], Decimal('240'))
+        self.assertEqual(rows['feed']['variance'], Decimal('40'))
+        self.assertEqual(rows['labor']['actual'], 0)
+        self.assertIsNone(rows['milk_sale']['target'])
+
+    def test_views(self):
+        self.client.force_login(self.user)
+        # session + user, budgets and one actuals aggregate for all 13
+        with self.assertNumQueries(4):
+            response = self.client.get(reverse('finance:budget_list'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['budgets']), 13)
+
+        response = self.client.get(reverse('finance:budget_detail', args=[self.season.pk]))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['transactions']), 12)
+
+
+class TransactionListTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user('farmer', password='pass')
+        cls.today = timezone.localdate()
+        # several rows share each date so the created_at/id tie-breaks matter
+        for i in range(23):
+            Transaction.objects.create(
+                transaction_type='income' if i % 2 else 'expense',
+                category='milk_sale' if i % 2 else 'feed',
+                date=cls.today - timedelta(days=i // 4),
+                amount=10 * (i + 1),
+                description=f'row {i}',
+                payment_method='mpesa' if i % 3 == 0 else 'cash',
+                party_name='Brookside' if i % 5 == 0 else '',
+            )
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def test_keyset_walk_forward_and_back(self):
+        queryset = Transaction.objects.all()
+        seen, cursor, pages = [], None, []
+        while True:
+            page = keyset_page(queryset, after=cursor, size=5)
+            pages.append(page)
+            seen.extend(t.pk for t in page['items'])
+            cursor = page['next_cursor']
+            if not cursor:
+                break
+        expected = list(queryset.order_by('-date', '-created_at', '-id').values_list('pk', flat=True))
+        self.assertEqual(seen, expected)
+        self.assertEqual(len(pages), 5)
+        self.assertIsNone(pages[0]['previous_cursor'])
+
+        back = keyset_page(queryset, before=pages[2]['previous_cursor'], size=5)
+        self.assertEqual(back['items'], pages[1]['items'])
+        first = keyset_page(queryset, before=pages[1]['previous_cursor'], size=5)
+        self.assertEqual(first['items'], pages[0]['items'])
+        self.assertIsNone(first['previous_cursor'])
+
+    @skipUnless(connection.vendor == 'sqlite', 'EXPLAIN QUERY PLAN is SQLite syntax')
+    def test_deep_pages_read_an_index_range(self):
+        cursor = keyset_page(Transaction.objects.all(), size=5)['next_cursor']
+        for queryset in (Transaction.objects.all(), Transaction.objects.filter(transaction_type='income')):
+            with CaptureQueriesContext(connection) as captured:
+                keyset_page(queryset, after=cursor, size=5)
+            with connection.cursor() as db:
+                db.execute('EXPLAIN QUERY PLAN ' + captured.captured_queries[0]['sql'])
+                plan = ' | '.join(row[-1] for row in db.fetchall())
+            # A range from the cursor's date, not a walk from the newest row
+            self.assertRegex(plan, r'^SEARCH finance_transaction USING INDEX \w+ \(.*date<\?\)')
+            self.assertNotIn('TEMP B-TREE', plan)
+
+    def test_bad_cursor_starts_from_first_page(self):
+        page = keyset_page(Transaction.objects.all(), after='not-a-cursor', size=5)
+        self.assertEqual(len(page['items']), 5)
+        self.assertIsNone(page['previous_cursor'])
+
+    def test_filters_and_totals(self):
+        response = self.client.get(reverse('finance:transaction_list'), {
+            'type': 'income', 'payment_method': 'mpesa', 'min_amount': '50',
+        })
+        expected = Transaction.objects.filter(
+            transaction_type='income', payment_method='mpesa', amount__gte=50,
+        )
+        self.assertEqual(
+            {t.pk for t in response.context['transactions']},
+            set(expected.values_list('pk', flat=True)),
+        )
+        self.assertEqual(
+            response.context['total_income'],
+            sum(t.amount for t in expected),
+        )
+
+    def test_date_range_and_party(self):
+        start = (self.today - timedelta(days=1)).isoformat()
+        response = self.client.get(reverse('finance:transaction_list'), {
+            'start': start, 'end': self.today.isoformat(), 'party': 'brook',
+        })
+        for trans in response.context['transactions']:
+            self.assertEqual(trans.party_name, 'Brookside')
+            self.assertGreaterEqual(trans.date.isoformat(), start)
+
+    def test_invalid_filters_do_not_error(self):
+        response = self.client.get(reverse('finance:transaction_list'), {
+            'days': 'abc', 'min_amount': '10', 'max_amount': '5',
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('days', response.context['form'].errors)
+        self.assertIn('max_amount', response.context['form'].errors)
+
+    def test_next_link_keeps_filters(self):
+        response = self.client.get(reverse('finance:transaction_list'), {'type': 'expense', 'days': '90'})
+        self.assertIn('type=expense', response.context['filter_query'])
+        self.assertNotIn('after=', response.context['filter_query'])
+
+
+MPESA_STATEMENT = """\
+MPESA FULL STATEMENT
+Customer Name:,JANE FARMER
+Receipt No.,Completion Time,Details,Transaction Status,Paid In,Withdrawn,Balance
+RA1,2024-03-02 10:15:00,Customer Transfer from 0712000000 - DAIRY COOP,Completed,"12,500.00",,12500.00
+RA2,2024-03-03 08:00:00,Pay Bill to 400200 - UNGA FEEDS,Completed,,-3000.00,9500.00
+RA3,2024-03-03 09:00:00,Pay Bill to 888880 - KPLC,Failed,,-500.00,9500.00
+RA1,2024-03-02 10:15:00,Customer Transfer from 0712000000 - DAIRY COOP,Completed,"12,500.00",,12500.00
+RA4,yesterday,Pay Bill to 888880 - KPLC,Completed,,-500.00,9000.00
+,2024-03-04 09:00:00,Agent Withdrawal,Completed,,-100.00,8900.00
+"""
+
+
+class StatementImportTests(TestCase):
+    def setUp(self):
+        CategoryRule.objects.create(keyword='dairy coop', transaction_type='income', category='milk_sale')
+        CategoryRule.objects.create(keyword='feeds', category='feed')
+
+    def run_import(self, text=MPESA_STATEMENT, **kwargs):
+        return import_statement(StringIO(text), **kwargs)
+
+    def test_import_and_report(self):
+        result = self.run_import()
+        self.assertEqual((result['inserted'], result['skipped'], result['failed']), (2, 2, 2))
+        self.assertEqual([line for line, reason in result['errors']], [8, 9])
+
+        milk = Transaction.objects.get(reference='RA1')
+        self.assertEqual((milk.transaction_type, milk.category, milk.amount), ('income', 'milk_sale', Decimal('12500')))
+        self.assertEqual((milk.payment_method, milk.party_name), ('mpesa', 'DAIRY COOP'))
+        self.assertEqual(Transaction.objects.get(reference='RA2').category, 'feed')
+
+        # Bulk inserts still reach the rollup and the daily snapshots
+        self.assertEqual(report_totals(date(2024, 3, 31))['month']['profit'], Decimal('9500'))
+        self.assertEqual(DailyFarmSnapshot.objects.get(date=date(2024, 3, 3)).expense, Decimal('3000'))
+
+    def test_reimport_skips_existing_references(self):
+        self.run_import()
+        result = self.run_import(batch_size=1)
+        self.assertEqual((result['inserted'], result['skipped']), (0, 4))
+        self.assertEqual(Transaction.objects.count(), 2)
+
+    def test_dry_run_saves_nothing(self):
+        result = self.run_import(dry_run=True)
+        self.assertEqual(result['inserted'], 2)
+        self.assertFalse(Transaction.objects.exists())
+        self.assertFalse(MonthlyCategoryTotal.objects.exists())
+
+    def test_bank_statement(self):
+        text = "Date,Description,Reference,Debit,Credit\n05/03/2024,Vet visit,CHQ9,2000.00,\n"
+        self.run_import(text, statement_format='auto')
+        self.assertEqual(Transaction.objects.get(reference='CHQ9').payment_method, 'bank')
+
+    def test_not_a_statement(self):
+        with self.assertRaises(StatementError):
+            self.run_import('a,b,c\n1,2,3\n')
+
+    def test_upload_view(self):
+        user = get_user_model().objects.create_user('farmer', password='pass')
+        self.client.force_login(user)
+        upload = SimpleUploadedFile('statement.csv', MPESA_STATEMENT.encode())
+        response = self.client.post(reverse('finance:transaction_import'), {'statement': upload, 'format': 'mpesa'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['result']['inserted'], 2)
+        self.assertContains(response, 'Line 8: unrecognised date')
+
+
+class BalanceTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user('farmer', password='pass')
+        cls.today = timezone.localdate()
+        start = cls.today.replace(day=1) - timedelta(days=150)
+        for i in range(40):
+            Transaction.objects.create(
+                transaction_type='expense' if i % 3 == 0 else 'income',
+                category='other_expense' if i % 3 == 0 else 'other_income',
+                date=start + timedelta(days=i * 4), amount=100 + i, description=f'T{i}',
+                payment_method='mpesa' if i % 2 else 'cash',
+            )
+
+    def expected(self, method, day):
+        total = Decimal('0')
+        for t in Transaction.objects.filter(payment_method=method, date__lt=day):
+            total += t.amount if t.transaction_type == 'income' else -t.amount
+        for s in Settlement.objects.filter(date__lt=day):
+            if s.payment_method == method:
+                total += s.amount
+            elif method == 'credit':
+                total -= s.amount
+        return total
+
+    def assert_balances(self, days):
+        for day in days:
+            current = balances(day)
+            for method in ('cash', 'mpesa', 'bank', 'credit'):
+                self.assertEqual(current[method], self.expected(method, day), (method, day))
+
+    def test_checkpoints_written_on_read_and_kept_current(self):
+        days = [self.today - timedelta(days=n) for n in (0, 17, 45, 90, 160)]
+        self.assert_balances(days)
+        self.assertTrue(BalanceCheckpoint.objects.exists())
+
+        # Edits and deletes before existing checkpoints are carried forward
+        moved = Transaction.objects.order_by('date').first()
+        moved.payment_method = 'bank'
+        moved.amount = 999
+        moved.save()
+        Transaction.objects.order_by('date')[3].delete()
+        self.assert_balances(days)
+
+    def test_rebuild_and_query_count(self):
+        call_command('rebuild_balance_checkpoints', stdout=StringIO())
+        self.assert_balances([self.today - timedelta(days=n) for n in (0, 30, 100)])
+        with self.assertNumQueries(4):
+            balances(self.today)
+
+    def test_settlements_move_money_from_credit(self):
+        days = [self.today - timedelta(days=n) for n in (0, 17, 45, 90, 160)]
+        self.assert_balances(days)
+        sale = Transaction.objects.create(
+            transaction_type='income', category='milk_sale', payment_method='credit',
+            date=self.today - timedelta(days=120), amount=1000, description='Coop',
+        )
+        settle(sale, Decimal('300'), 'mpesa', self.today - timedelta(days=80))
+        settle(sale, Decimal('200'), 'cash', self.today - timedelta(days=10))
+        self.assertEqual(sale.amount_paid, 500)
+        self.assert_balances(days)
+        self.assertEqual(balances(self.today - timedelta(days=80))['credit'], 1000)
+
+        call_command('rebuild_balance_checkpoints', stdout=StringIO())
+        self.assert_balances(days)
+
+        rows = balance_ledger('mpesa', self.today - timedelta(days=100))
+        self.assertIn(sale.settlements.get(payment_method='mpesa'), rows)
+        self.assertEqual(
+            balances(self.today - timedelta(days=100))['mpesa'] + rows[-1].running,
+            self.expected('mpesa', self.today + timedelta(days=1)),
+        )
+
+        sale.settlements.filter(payment_method='cash').delete()
+        sale.refresh_from_db()
+        self.assertEqual(sale.amount_paid, 300)
+        self.assert_balances(days)
+
+    def test_running_balance(self):
+        start = self.today - timedelta(days=100)
+        opening = balances(start)['mpesa']
+        rows = list(balance_ledger('mpesa', start))
+        for row in rows:
+            self.assertEqual(opening + row.running, self.expected('mpesa', row.date) + sum(
+                r.signed for r in rows if r.date == row.date and r.pk <= row.pk
+            ))
+        self.assertEqual(opening + rows[-1].running, self.expected('mpesa', self.today + timedelta(days=1)))
+
+    def test_views(self):
+        self.client.force_login(self.user)
+        start = self.today - timedelta(days=120)
+        in_range = Transaction.objects.filter(payment_method='cash', date__gte=start).count()
+        params = {'payment_method': 'cash', 'start': start.isoformat()}
+        response = self.client.get(reverse('finance:ledger'), params)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['rows']), in_range)
+
+        with mock.patch('finance.views.LEDGER_PER_PAGE', 5):
+            data = self.client.get(reverse('finance:ledger_api'), params).json()
+        self.assertEqual((data['page'], data['num_pages'], len(data['rows'])), (1, -(-in_range // 5), 5))
+        self.assertIn('page=2', data['next'])
+        self.assertEqual(
+            Decimal(data['rows'][-1]['balance']),
+            Decimal(data['opening_balance']) + sum(Decimal(r['amount']) for r in data['rows']),
+        )
+
+
+class TimeSeriesTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user('farmer', password='pass')
+        for day, kind, category, amount in [
+            (date(2023, 1, 10), 'income', 'milk_sale', 100),
+            (date(2023, 3, 5), 'expense', 'feed', 30),
+            (date(2024, 1, 2), 'income', 'milk_sale', 150),
+            (date(2024, 1, 20), 'income', 'crop_sale', 50),
+            (date(2024, 1, 21), 'expense', 'feed', 40),
+            (date(2024, 3, 31), 'expense', 'labor', 60),
+        ]:
+            Transaction.objects.create(
+                transaction_type=kind, category=category, date=day, amount=amount, description='x',
+            )
+
+    def test_monthly_with_gaps_in_one_query(self):
+        with self.assertNumQueries(1):
+            points = series(date(2024, 1, 1), date(2024, 4, 30))
+        self.assertEqual([p['period'] for p in points], [date(2024, m, 1) for m in (1, 2, 3, 4)])
+        self.assertEqual([p['profit'] for p in points], [160, 0, -60, 0])
+        self.assertEqual(points[0]['income'], 200)
+
+    def test_by_category_week_and_quarter(self):
+        points = series(date(2024, 1, 1), date(2024, 1, 31), by_category=True)
+        self.assertEqual(points[0]['categories'], {'milk_sale': 150, 'crop_sale': 50, 'feed': 40})
+
+        weeks = series(date(2024, 1, 1), date(2024, 1, 21), period='week')
+        self.assertEqual([p['period'] for p in weeks], [date(2024, 1, 1), date(2024, 1, 8), date(2024, 1, 15)])
+        self.assertEqual([p['income'] for p in weeks], [150, 0, 50])
+
+        quarters = series(date(2023, 1, 1), date(2024, 3, 31), period='quarter')
+        self.assertEqual(len(quarters), 5)
+        self.assertEqual((quarters[0]['profit'], quarters[-1]['profit']), (70, 100))
+
+    def test_year_over_year(self):
+        with self.assertNumQueries(1):
+            points = year_over_year(date(2024, 1, 1), date(2024, 3, 31))
+        january, february, march = points
+        self.assertEqual(january['previous']['income'], 100)
+        self.assertEqual(january['change']['income'], 100)
+        self.assertIsNone(february['change']['income'])
+        self.assertEqual(march['change']['expense'], 100)
+
+        # A span starting mid-month compares with the same days a year back
+        january, = year_over_year(date(2024, 1, 15), date(2024, 1, 31))
+        self.assertEqual(january['income'], 50)
+        self.assertEqual(january['previous']['income'], 0)
+
+    def test_api(self):
+        self.client.force_login(self.user)
+        url = reverse('finance:report_series')
+        data = self.client.get(url, {'start': '2024-01-01', 'end': '2024-03-31', 'compare': 'yoy'}).json()
+        self.assertEqual(len(data['points']), 3)
+        self.assertEqual(Decimal(data['points'][0]['income']), 200)
+        self.assertEqual(Decimal(data['points'][0]['previous']['income']), 100)
+
+        response = self.client.get(url, {'period': 'day'})
+        self.assertEqual(response.status_code, 400)
+
+
+class PostingTests(TestCase):
+    def setUp(self):
+        farm = Farm.objects.create(name='Plot A', size_acres=2)
+        self.season = CropSeason.objects.create(
+            farm=farm, crop_type='maize', planting_date=date(2024, 3, 1),
+            expected_harvest_date=date(2024, 7, 1), area_planted_acres=2,
+        )
+        self.cow = Animal.objects.create(
+            animal_type='cow', tag_number='C1', gender='female',
+            date_acquired=date(2024, 1, 5), acquisition_cost=40000,
+        )
+
+    def posted(self, record):
+        source_type = posting.SOURCE_TYPES[type(record)]
+        return Transaction.objects.filter(source_type=source_type, source_id=record.pk).first()
+
+    def test_create_edit_delete(self):
+        self.assertEqual(self.posted(self.cow).category, 'livestock')
+
+        sale = CropSale.objects.create(
+            season=self.season, date=date(2024, 7, 10), quantity_kg=100, price_per_kg=40,
+            buyer='NCPB', payment_status='pending',
+        )
+        t = self.posted(sale)
+        self.assertEqual((t.transaction_type, t.amount, t.payment_method), ('income', 4000, 'credit'))
+
+        sale.payment_status = 'paid'
+        sale.quantity_kg = 150
+        sale.save()
+        t.refresh_from_db()
+        self.assertEqual((t.amount, t.payment_method), (6000, 'cash'))
+        self.assertEqual(MonthlyCategoryTotal.objects.get(year=2024, month=7).total, 6000)
+
+        sale.delete()
+        self.assertFalse(Transaction.objects.filter(source_type='crop_sale').exists())
+        self.assertEqual(MonthlyCategoryTotal.objects.get(year=2024, month=7).total, 0)
+
+    def test_zero_cost_and_cascade(self):
+        record = HealthRecord.objects.create(animal=self.cow, record_type='checkup', description='x')
+        self.assertIsNone(self.posted(record))
+        record.cost = 1500
+        record.save()
+        self.assertEqual(self.posted(record).category, 'veterinary')
+
+        self.cow.delete()
+        self.assertFalse(Transaction.objects.exclude(source_type='').exists())
+
+    def test_backfill_is_idempotent(self):
+        # Records written around the signals, as in older data
+        CropInput.objects.bulk_create([
+            CropInput(season=self.season, input_type='fertilizer', date=date(2024, 3, 2),
+                      description='DAP', quantity='50 kg', cost=3500),
+            CropInput(season=self.season, input_type='water', date=date(2024, 3, 9),
+                      description='Pump', quantity='1 day', cost=0),
+        ])
+        FeedRecord.objects.bulk_create([
+            FeedRecord(date=date(2024, 3, 2), feed_type='Hay', quantity_kg=200, cost=2000),
+        ])
+
+        self.assertEqual(posting.backfill(batch_size=1), {
+            'crop_input': 1, 'crop_sale': 0, 'health_record': 0, 'health_campaign': 0,
+            'feed_record': 1, 'animal': 0,
+        })
+        self.assertEqual(sum(posting.backfill().values()), 0)
+
+        march = MonthlyCategoryTotal.objects.filter(year=2024, month=3)
+        self.assertEqual({b.category: b.total for b in march}, {'fertilizer': 3500, 'feed': 2000})
+        self.assertEqual(DailyFarmSnapshot.objects.get(date=date(2024, 3, 2)).expense, 5500)
+        self.assertEqual(balances(date(2024, 4, 1))['cash'], -45500)
+
+        out = StringIO()
+        call_command('post_to_ledger', stdout=out)
+        self.assertIn('Posted 0', out.getvalue())
+
+
+class ReceivablesTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user('farmer', password='pass')
+        self.today = date(2024, 6, 30)
+        for days, party, amount in [(5, 'Coop', 1000), (45, 'Coop', 500), (75, '', 300), (200, 'Hotel', 700)]:
+            Transaction.objects.create(
+                transaction_type='income', category='milk_sale', payment_method='credit',
+                date=self.today - timedelta(days=days), amount=amount, party_name=party, description='x',
+            )
+        Transaction.objects.create(
+            transaction_type='income', category='milk_sale', payment_method='cash',
+            date=self.today, amount=900, party_name='Coop', description='x',
+        )
+
+    def test_buckets_in_one_query(self):
+        with self.assertNumQueries(1):
+            report = aging(self.today)
+        self.assertEqual([total for _, _, total in report['buckets']], [1000, 500, 300, 700])
+        self.assertEqual(report['total'], 2500)
+        self.assertEqual([p['party'] for p in report['parties']], ['Coop', 'Hotel', 'Unnamed'])
+        self.assertEqual([t for _, _, t in report['parties'][0]['buckets']], [1000, 500, 0, 0])
+
+    def test_part_and_full_settlement(self):
+        sale = Transaction.objects.get(party_name='Hotel')
+        received = self.today - timedelta(days=10)
+        before = balances(received)
+        settle(sale, Decimal('200'), 'mpesa', received)
+        self.assertEqual((sale.amount_paid, sale.payment_method), (200, 'credit'))
+        self.assertEqual(aging(self.today)['buckets'][3][2], 500)
+        # Earlier aging and balances are as they were
+        self.assertEqual(aging(received - timedelta(days=1))['buckets'][3][2], 700)
+        self.assertEqual(balances(received), before)
+        # The part payment reaches M-Pesa the day it was received
+        after = balances(received + timedelta(days=1))
+        self.assertEqual((after['mpesa'], after['credit']), (200, before['credit'] - 200))
+
+        settle(sale, Decimal('600'), 'mpesa', self.today)
+        self.assertEqual((sale.amount_paid, sale.payment_method), (700, 'credit'))
+        self.assertEqual(aging(self.today)['buckets'][3][2], 0)
+        self.assertEqual(balances(self.today + timedelta(days=1))['mpesa'], 700)
+
+    def test_posted_crop_sale(self):
+        farm = Farm.objects.create(name='Plot A', size_acres=2)
+        season = CropSeason.objects.create(
+            farm=farm, crop_type='beans', planting_date=date(2024, 3, 1),
+            expected_harvest_date=date(2024, 6, 1), area_planted_acres=1,
+        )
+        crop_sale = CropSale.objects.create(
+            season=season, date=self.today, quantity_kg=10, price_per_kg=100,
+            buyer='Market', payment_status='pending',
+        )
+        self.assertIn('Market', [p['party'] for p in aging(self.today)['parties']])
+
+        sale = Transaction.objects.get(source_type='crop_sale')
+        version = app_versions(['crops'])
+        settle(sale, Decimal('400'), day=self.today)
+        self.assertNotEqual(app_versions(['crops']), version)
+        crop_sale.refresh_from_db()
+        self.assertEqual(crop_sale.payment_status, 'partial')
+        crop_sale.save()
+        sale.refresh_from_db()
+        self.assertEqual((sale.amount_paid, sale.payment_method), (400, 'credit'))
+
+        # Once paid the sale stays on credit; the settlements carry the money
+        settle(sale, Decimal('600'), 'mpesa', self.today)
+        crop_sale.refresh_from_db()
+        self.assertEqual(crop_sale.payment_status, 'paid')
+        crop_sale.buyer = 'Market stall 4'
+        crop_sale.save()
+        sale.refresh_from_db()
+        self.assertEqual((sale.amount_paid, sale.payment_method, sale.party_name), (1000, 'credit', 'Market stall 4'))
+        after = balances(self.today + timedelta(days=1))
+        self.assertEqual((after['mpesa'], after['cash']), (600, 1300))
+
+    def test_views(self):
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('finance:receivables'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['aging']['total'], 2500)
+
+        sale = Transaction.objects.get(party_name='Hotel')
+        url = reverse('finance:transaction_settle', args=[sale.pk])
+        self.client.post(url, {'amount': '700', 'payment_method': 'bank', 'date': '2024-06-20'})
+        sale.refresh_from_db()
+        self.assertEqual((sale.amount_paid, sale.payment_method), (700, 'credit'))
+        self.assertEqual(
+            list(sale.settlements.values_list('date', 'payment_method')), [(date(2024, 6, 20), 'bank')],
+        )
+        self.assertEqual(self.client.post(url, {'amount': '1'}).status_code, 404)
@@ -1,17 +1,26 @@
+from django.conf import settings
 from django.urls import path
 from . import views
 
 app_name = 'finance'
 
 urlpatterns = [
-    path('', views.finance_home, name='home'),
+    path('', views.finance_home_async if settings.ASYNC_HOME_VIEWS else views.finance_home, name='home'),
     
     path('transactions/', views.transaction_list, name='transaction_list'),
     path('transactions/add/', views.transaction_add, name='transaction_add'),
+    path('transactions/import/', views.transaction_import, name='transaction_import'),
     path('transactions/<int:pk>/edit/', views.transaction_edit, name='transaction_edit'),
     path('transactions/<int:pk>/delete/', views.transaction_delete, name='transaction_delete'),
+    path('transactions/<int:pk>/settle/', views.transaction_settle, name='transaction_settle'),
+    
+    path('receivables/', views.receivables, name='receivables'),
+    
+    path('ledger/', views.ledger, name='ledger'),
+    path('ledger.json', views.ledger_api, name='ledger_api'),
     
     path('reports/', views.reports, name='reports'),
+    path('reports/series.json', views.report_series, name='report_series'),
     
     path('budgets/', views.budget_list, name='budget_list'),
     path('budgets/add/', views.budget_add, name='budget_add'),
@@ -1,93 +1,112 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
+from django.core.paginator import Paginator
+from django.http import JsonResponse
 from django.db.models import Sum, Q
+from django.utils import timezone
+from asgiref.sync import sync_to_async
 from datetime import date, timedelta
-from .models import Transaction, Budget
+from dateutil.relativedelta import relativedelta
+import io
+from .models import Transaction, Budget, attach_actuals
+from .aggregates import transaction_totals
+from .rollup import report_totals
+from .timeseries import series, year_over_year
+from .filters import LedgerFilterForm, SeriesFilterForm, SettlementForm, TransactionFilterForm, keyset_page
+from .receivables import aging, outstanding, settle
+from .balances import balances, ledger as balance_ledger
+from .importer import STATEMENT_FORMATS, StatementError, import_statement
+from dashboard.cache import cache_home_page
+from dashboard.concurrency import agather_sections, async_login_required, gather_sections
+
+
+TRANSACTIONS_PER_PAGE = 50
+
+LEDGER_PER_PAGE = 50
+
+
+def totals_section(today):
+    """This month and last 30 days totals"""
+    totals = transaction_totals(today, days=30)
+    return {
+        'today': today,
+        'month_income': totals['month_income'],
+        'month_expense': totals['month_expense'],
+        'month_profit': totals['month_profit'],
+        'income_30d': totals['income_30d'],
+        'expense_30d': totals['expense_30d'],
+        'profit_30d': totals['profit_30d'],
+    }
+
+
+def activity_section(today):
+    """Recent transactions and money owed, by age"""
+    return {
+        'recent_transactions': list(Transaction.objects.all()[:10]),
+        'receivables': aging(today, by_party=False),
+    }
+
+
+HOME_SECTIONS = [totals_section, activity_section]
 
 
 @login_required
+@cache_home_page('finance', 'dashboard')
 def finance_home(request):
     """Finance dashboard with key metrics"""
-    # Time periods
-    today = date.today()
-    this_month_start = today.replace(day=1)
-    last_30_days = today - timedelta(days=30)
-    
-    # This month totals
-    month_income = Transaction.objects.filter(
-        transaction_type='income',
-        date__gte=this_month_start
-    ).aggregate(Sum('amount'))['amount__sum'] or 0
-    
-    month_expense = Transaction.objects.filter(
-        transaction_type='expense',
-        date__gte=this_month_start
-    ).aggregate(Sum('amount'))['amount__sum'] or 0
-    
-    # Last 30 days totals
-    income_30d = Transaction.objects.filter(
-        transaction_type='income',
-        date__gte=last_30_days
-    ).aggregate(Sum('amount'))['amount__sum'] or 0
-    
-    expense_30d = Transaction.objects.filter(
-        transaction_type='expense',
-        date__gte=last_30_days
-    ).aggregate(Sum('amount'))['amount__sum'] or 0
-    
-    # Recent transactions
-    recent_transactions = Transaction.objects.all()[:10]
-    
-    # Pending payments (credit)
-    pending = Transaction.objects.filter(payment_method='credit', transaction_type='income')
-    
-    context = {
-        'month_income': month_income,
-        'month_expense': month_expense,
-        'month_profit': month_income - month_expense,
-        'income_30d': income_30d,
-        'expense_30d': expense_30d,
-        'profit_30d': income_30d - expense_30d,
-        'recent_transactions': recent_transactions,
-        'pending_payments': pending,
-    }
+    context = gather_sections(HOME_SECTIONS, timezone.localdate())
     return render(request, 'finance/home.html', context)
 
 
+@async_login_required
+@cache_home_page('finance', 'dashboard')
+async def finance_home_async(request):
+    """Finance dashboard for ASGI - sections run concurrently"""
+    context = await agather_sections(HOME_SECTIONS, timezone.localdate())
+    return await sync_to_async(render)(request, 'finance/home.html', context)
+
+
 @login_required
 def transaction_list(request):
-    """List all transactions with filters"""
-    trans_type = request.GET.get('type', '')
-    category = request.GET.get('category', '')
-    days = int(request.GET.get('days', 30))
+    """List transactions with filters, a page at a time"""
+    params = request.GET.copy()
+    if 'days' not in params and not (params.get('start') or params.get('end')):
+        params['days'] = '30'
+    form = TransactionFilterForm(params)
     
-    transactions = Transaction.objects.all()
+    transactions = form.filter(Transaction.objects.all(), today=timezone.localdate())
     
-    if trans_type:
-        transactions = transactions.filter(transaction_type=trans_type)
-    if category:
-        transactions = transactions.filter(category=category)
-    
-    # Date filter
-    if days:
-        cutoff = date.today() - timedelta(days=days)
-        transactions = transactions.filter(date__gte=cutoff)
-    
-    # Calculate totals
+    # Calculate totals over the whole filtered set
     totals = transactions.aggregate(
         total_income=Sum('amount', filter=Q(transaction_type='income')),
         total_expense=Sum('amount', filter=Q(transaction_type='expense')),
     )
     
+    page = keyset_page(
+        transactions,
+        after=request.GET.get('after'),
+        before=request.GET.get('before'),
+        size=TRANSACTIONS_PER_PAGE,
+    )
+    
+    # Filters to carry over into the next/previous links
+    filter_query = params.copy()
+    for key in ('after', 'before'):
+        filter_query.pop(key, None)
+    
     context = {
-        'transactions': transactions[:100],
+        'form': form,
+        'transactions': page['items'],
+        'next_cursor': page['next_cursor'],
+        'previous_cursor': page['previous_cursor'],
+        'filter_query': filter_query.urlencode(),
         'total_income': totals['total_income'] or 0,
         'total_expense': totals['total_expense'] or 0,
         'net_profit': (totals['total_income'] or 0) - (totals['total_expense'] or 0),
-        'selected_type': trans_type,
-        'selected_category': category,
-        'days': days,
+        'selected_type': form.cleaned_data.get('type', ''),
+        'selected_category': form.cleaned_data.get('category', ''),
+        'days': form.cleaned_data.get('days'),
     }
     return render(request, 'finance/transaction_list.html', context)
 
@@ -116,6 +135,26 @@ def transaction_add(request):
     return render(request, 'finance/transaction_form.html', context)
 
 
+@login_required
+def transaction_import(request):
+    """Bulk import an M-Pesa or bank statement CSV"""
+    result = None
+    if request.method == 'POST' and 'statement' in request.FILES:
+        statement_format = request.POST.get('format', 'auto')
+        if statement_format not in STATEMENT_FORMATS:
+            statement_format = 'auto'
+        stream = io.TextIOWrapper(
+            request.FILES['statement'].file, encoding='utf-8-sig', errors='replace', newline=''
+        )
+        try:
+            result = import_statement(stream, statement_format)
+        except StatementError as e:
+            messages.error(request, str(e))
+    
+    context = {'result': result}
+    return render(request, 'finance/transaction_import.html', context)
+
+
 @login_required
 def transaction_edit(request, pk):
     """Edit existing transaction"""
@@ -153,71 +192,173 @@ def transaction_delete(request, pk):
     return render(request, 'finance/transaction_confirm_delete.html', context)
 
 
-@login_required
-def reports(request):
-    """Financial reports and analytics"""
-    # Time periods
-    today = date.today()
-    this_month = today.replace(day=1)
-    last_month = (this_month - timedelta(days=1)).replace(day=1)
-    this_year = today.replace(month=1, day=1)
+def ledger_context(request):
+    """One page of a payment method's running balance, shared with the API"""
+    form = LedgerFilterForm(request.GET)
+    form.is_valid()
+    today = timezone.localdate()
+    payment_method = form.cleaned_data.get('payment_method') or 'cash'
+    start = form.cleaned_data.get('start') or today - timedelta(days=30)
+    end = form.cleaned_data.get('end')
     
-    # This month
-    month_data = Transaction.objects.filter(date__gte=this_month).aggregate(
-        income=Sum('amount', filter=Q(transaction_type='income')),
-        expense=Sum('amount', filter=Q(transaction_type='expense')),
-    )
+    # Balance brought forward, from the nearest checkpoint
+    opening = balances(start)[payment_method]
     
-    # Last month
-    last_month_data = Transaction.objects.filter(
-        date__gte=last_month,
-        date__lt=this_month
-    ).aggregate(
-        income=Sum('amount', filter=Q(transaction_type='income')),
-        expense=Sum('amount', filter=Q(transaction_type='expense')),
-    )
+    paginator = Paginator(balance_ledger(payment_method, start, end), LEDGER_PER_PAGE)
+    page = paginator.get_page(request.GET.get('page'))
+    rows = list(page)
+    for row in rows:
+        row.balance = opening + row.running
     
-    # This year
-    year_data = Transaction.objects.filter(date__gte=this_year).aggregate(
-        income=Sum('amount', filter=Q(transaction_type='income')),
-        expense=Sum('amount', filter=Q(transaction_type='expense')),
-    )
+    return {
+        'form': form,
+        'payment_method': payment_method,
+        'start': start,
+        'end': end,
+        'opening_balance': opening,
+        'page': page,
+        'rows': rows,
+    }
+
+
+@login_required
+def ledger(request):
+    """Running balance per payment method"""
+    context = ledger_context(request)
+    current = balances(timezone.localdate() + timedelta(days=1))
+    context['current_balances'] = [
+        (method, label, current[method]) for method, label in Transaction.PAYMENT_METHODS
+    ]
+    return render(request, 'finance/ledger.html', context)
+
+
+@login_required
+def ledger_api(request):
+    """JSON version of the ledger, a page at a time"""
+    context = ledger_context(request)
+    page = context['page']
+    next_url = None
+    if page.has_next():
+        query = request.GET.copy()
+        query['page'] = page.next_page_number()
+        next_url = f'{request.path}?{query.urlencode()}'
+    
+    return JsonResponse({
+        'payment_method': context['payment_method'],
+        'start': context['start'],
+        'end': context['end'],
+        'opening_balance': str(context['opening_balance']),
+        'page': page.number,
+        'num_pages': page.paginator.num_pages,
+        'next': next_url,
+        'rows': [
+            {
+                'id': row.pk,
+                'date': row.date,
+                'description': row.description,
+                'category': row.category,
+                # Settlements: the credit sale they pay
+                'sale': getattr(row, 'sale_id', None),
+                'amount': str(row.signed),
+                'balance': str(row.balance),
+            }
+            for row in context['rows']
+        ],
+    })
+
+
+@login_required
+def reports(request):
+    """Financial reports and analytics"""
+    today = timezone.localdate()
     
-    # Income by category (this month)
-    income_by_category = Transaction.objects.filter(
-        transaction_type='income',
-        date__gte=this_month
-    ).values('category').annotate(total=Sum('amount')).order_by('-total')
+    # This month, last month, this year, this month's categories and the last 12 months
+    totals = report_totals(today)
+    month_data = totals['month']
+    last_month_data = totals['last_month']
+    year_data = totals['year']
     
-    # Expense by category (this month)
-    expense_by_category = Transaction.objects.filter(
-        transaction_type='expense',
-        date__gte=this_month
-    ).values('category').annotate(total=Sum('amount')).order_by('-total')
+    # Scaled against the busiest month for the bars
+    trend = totals['trend']
+    peak = max([max(p['income'], p['expense']) for p in trend] + [1])
+    for point in trend:
+        point['income_width'] = point['income'] * 100 / peak
+        point['expense_width'] = point['expense'] * 100 / peak
     
     context = {
-        'month_income': month_data['income'] or 0,
-        'month_expense': month_data['expense'] or 0,
-        'month_profit': (month_data['income'] or 0) - (month_data['expense'] or 0),
+        'today': today,
+        'month_income': month_data['income'],
+        'month_expense': month_data['expense'],
+        'month_profit': month_data['profit'],
         
-        'last_month_income': last_month_data['income'] or 0,
-        'last_month_expense': last_month_data['expense'] or 0,
-        'last_month_profit': (last_month_data['income'] or 0) - (last_month_data['expense'] or 0),
+        'last_month_income': last_month_data['income'],
+        'last_month_expense': last_month_data['expense'],
+        'last_month_profit': last_month_data['profit'],
         
-        'year_income': year_data['income'] or 0,
-        'year_expense': year_data['expense'] or 0,
-        'year_profit': (year_data['income'] or 0) - (year_data['expense'] or 0),
+        'year_income': year_data['income'],
+        'year_expense': year_data['expense'],
+        'year_profit': year_data['profit'],
         
-        'income_by_category': income_by_category,
-        'expense_by_category': expense_by_category,
+        'income_by_category': totals['income_by_category'],
+        'expense_by_category': totals['expense_by_category'],
+        
+        'trend': trend,
     }
     return render(request, 'finance/reports.html', context)
 
 
+@login_required
+def report_series(request):
+    """JSON time series: ?period=month|week|quarter&start=&end=&by=category&compare=yoy"""
+    form = SeriesFilterForm(request.GET)
+    if not form.is_valid():
+        return JsonResponse({'errors': form.errors}, status=400)
+    
+    data = form.cleaned_data
+    today = timezone.localdate()
+    period = data['period'] or 'month'
+    end = data['end'] or today
+    # Default to the last 24 months
+    start = data['start'] or end.replace(day=1) - relativedelta(months=23)
+    
+    report = year_over_year if data['compare'] == 'yoy' else series
+    points = report(start, end, period, by_category=data['by'] == 'category')
+    return JsonResponse({'period': period, 'start': start, 'end': end, 'points': points})
+
+
+@login_required
+def receivables(request):
+    """Outstanding credit sales by customer and age"""
+    today = timezone.localdate()
+    context = {
+        'today': today,
+        'aging': aging(today),
+        'oldest': outstanding().order_by('date', 'created_at')[:20],
+        'form': SettlementForm(),
+    }
+    return render(request, 'finance/receivables.html', context)
+
+
+@login_required
+def transaction_settle(request, pk):
+    """Record a full or part payment against a credit sale"""
+    transaction = get_object_or_404(outstanding(), pk=pk)
+    if request.method == 'POST':
+        form = SettlementForm(request.POST)
+        if form.is_valid():
+            data = form.cleaned_data
+            settle(transaction, data['amount'], data['payment_method'], data['date'])
+            messages.success(request, 'Payment recorded!')
+        else:
+            messages.error(request, 'Enter the amount received and how it was paid.')
+    return redirect('finance:receivables')
+
+
 @login_required
 def budget_list(request):
     """List all budgets"""
-    budgets = Budget.objects.all()
+    # Actuals for every budget in one query
+    budgets = attach_actuals(Budget.objects.all())
     context = {'budgets': budgets}
     return render(request, 'finance/budget_list.html', context)
 
@@ -243,16 +384,17 @@ def budget_add(request):
 @login_required
 def budget_detail(request, pk):
     """View budget details with actual vs target"""
-    budget = get_object_or_404(Budget, pk=pk)
+    budget = get_object_or_404(Budget.objects.prefetch_related('lines'), pk=pk)
+    attach_actuals([budget])
     
-    # Get transactions in budget period
-    transactions = Transaction.objects.filter(
-        date__gte=budget.start_date,
-        date__lte=budget.end_date
-    )
+    # Transactions in budget period, a page at a time
+    paginator = Paginator(budget.transactions(), 50)
+    page = paginator.get_page(request.GET.get('page'))
     
     context = {
         'budget': budget,
-        'transactions': transactions,
+        'breakdown': budget.category_breakdown(),
+        'transactions': page,
+        'page': page,
     }
-    return render(request, 'finance/budget_detail.html', context)
\ No newline at end of file
+    return render(request, 'finance/budget_detail.html', context)